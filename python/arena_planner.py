@@ -0,0 +1,160 @@
+# arena_planner.py
+#
+# Offline tensor-arena planner for the TFLM wrapper
+#
+# Usage: python3 python/arena_planner.py [models/model.tflite] [--tensors]
+#                                        [--header target_m4/tensor_arena.h]
+#
+# Computes each non-constant tensor's lifetime from the operator order and
+# places the tensors with the same greedy first-fit planner TFLM uses
+# (GreedyMemoryPlanner: largest buffer first, lowest offset that does not
+# collide with a buffer whose lifetime overlaps). The planned size is the
+# nonpersistent "head" of the arena. TFLM also keeps persistent allocations
+# (eval tensors, nodes, op data) at the arena tail; those are estimated from
+# the tensor/operator counts and the target pointer size.
+
+import argparse
+import os
+
+from tflite_model import read_model
+
+# TFLM aligns every arena buffer to 16 bytes (kBufferAlignment)
+ALIGNMENT = 16
+
+
+def align(n, alignment=ALIGNMENT):
+    return (n+alignment-1)//alignment*alignment
+
+
+class Buffer:
+    __slots__ = ('tensor', 'size', 'first', 'last', 'offset')
+
+    def __init__(self, tensor, size, first, last):
+        self.tensor = tensor
+        self.size = size
+        self.first = first
+        self.last = last
+        self.offset = None
+
+    def overlaps(self, other):
+        return self.first <= other.last and other.first <= self.last
+
+
+# Lifetimes of the tensors that need arena memory, following TFLM's
+# AllocationInfoBuilder: graph inputs live from the first operator, graph
+# outputs to the last, every other tensor from the operator that writes it to
+# the last operator that reads it
+def lifetimes(model):
+    last_op = len(model.operators)-1
+    first, last = {}, {}
+    for i in model.inputs:
+        first[i] = 0
+    for op in model.operators:
+        for i in op.inputs:
+            if i >= 0:
+                first.setdefault(i, op.index)
+                last[i] = op.index
+        for i in op.outputs:
+            first.setdefault(i, op.index)
+            last.setdefault(i, op.index)
+    for i in model.outputs:
+        last[i] = last_op
+    buffers = []
+    for i in sorted(first):
+        t = model.tensors[i]
+        if t.is_constant or t.is_variable:
+            continue
+        buffers.append(Buffer(t, align(t.nbytes), first[i], last.get(i, first[i])))
+    return buffers
+
+
+# Greedy first-fit placement; returns the planned arena size
+def plan(buffers):
+    placed = []
+    for b in sorted(buffers, key=lambda b: -b.size):
+        offset = 0
+        for p in sorted((p for p in placed if p.overlaps(b)), key=lambda p: p.offset):
+            if p.offset >= offset+b.size:
+                break
+            offset = max(offset, p.offset+p.size)
+        b.offset = offset
+        placed.append(b)
+    return max((b.offset+b.size for b in buffers), default=0)
+
+
+# The operator at which the arena high-water mark is reached, with the live
+# bytes and the highest planned address at that operator
+def peak(model, buffers):
+    best = None
+    for op in model.operators:
+        live = [b for b in buffers if b.first <= op.index <= b.last]
+        high = max((b.offset+b.size for b in live), default=0)
+        if best is None or high > best[1]:
+            best = (op, high, sum(b.size for b in live))
+    return best
+
+
+# Rough size of TFLM's persistent allocations: one TfLiteEvalTensor per
+# tensor, a node/registration pair plus parsed options and op data per
+# operator, per-channel quantization arrays for convolutions and a fixed
+# allowance for the interpreter's own structures
+def persistent_estimate(model, pointer_size=4):
+    eval_tensor = 3*pointer_size
+    node = 8*pointer_size
+    op_data = 8*pointer_size
+    channels = 0
+    for op in model.operators:
+        if op.opcode in ('CONV_2D', 'DEPTHWISE_CONV_2D'):
+            channels += model.tensors[op.outputs[0]].shape[-1]
+    per_channel = 2*4*channels
+    fixed = 64*pointer_size
+    return align(len(model.tensors)*eval_tensor) + \
+           align(len(model.operators)*(node+op_data)) + align(per_channel) + fixed
+
+
+def write_header(path, model_path, planned, persistent, margin):
+    total = align(planned+persistent+margin, 1024)
+    guard = os.path.basename(path).upper().replace('.', '_')
+    with open(path, 'w') as f:
+        f.write('// Generated by python/arena_planner.py from '+model_path+'\n')
+        f.write('//   planned tensors: %d bytes, persistent estimate: %d bytes, margin: %d bytes\n\n'
+                % (planned, persistent, margin))
+        f.write('#ifndef '+guard+'\n#define '+guard+'\n\n')
+        f.write('#define TENSOR_ARENA_SIZE %d // %d KB\n\n' % (total, total//1024))
+        f.write('#endif // '+guard+'\n')
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plan the TFLM tensor arena for a .tflite model')
+    parser.add_argument('model', nargs='?', default='models/model.tflite', help='model (default: models/model.tflite)')
+    parser.add_argument('--tensors', action='store_true', help='print the per-tensor offset map')
+    parser.add_argument('--pointer-size', type=int, default=4, choices=(4, 8),
+                        help='target pointer size in bytes, 4 for the M4 and 8 for x86-64 (default: 4)')
+    parser.add_argument('--margin', type=int, default=2048, help='bytes added on top of the estimate in --header (default: 2048)')
+    parser.add_argument('--header', help='write a header defining TENSOR_ARENA_SIZE')
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    buffers = lifetimes(model)
+    planned = plan(buffers)
+    persistent = persistent_estimate(model, args.pointer_size)
+    op, high, live = peak(model, buffers)
+
+    if args.tensors:
+        print('{:>6} {:>7} {:>8} {:>5} {:>5} {:<8} {:<18} {}'.format(
+         'tensor', 'offset', 'size', 'first', 'last', 'type', 'shape', 'name'))
+        for b in sorted(buffers, key=lambda b: (b.offset, b.first)):
+            t = b.tensor
+            print('{:>6} {:>7} {:>8} {:>5} {:>5} {:<8} {:<18} {}'.format(
+             t.index, b.offset, b.size, b.first, b.last, t.type, str(list(t.shape)), t.name))
+        print()
+
+    print('model:               '+args.model)
+    print('planned tensors:     %d bytes (%d buffers)' % (planned, len(buffers)))
+    print('peak operator:       #%d %s (%d bytes live)' % (op.index, op.opcode, live))
+    print('persistent estimate: %d bytes (%d-bit pointers)' % (persistent, 8*args.pointer_size))
+    print('minimum arena:       %d bytes (%.1f KB)' % (planned+persistent, (planned+persistent)/1024))
+    if args.header:
+        total = write_header(args.header, args.model, planned, persistent, args.margin)
+        print('wrote %s: TENSOR_ARENA_SIZE %d' % (args.header, total))
@@ -1,30 +1,56 @@
-from tensorflow.keras import datasets
-import tensorflow as tf
-import matplotlib.pyplot as plt
-import sys
-
-file = int(sys.argv[1])
-
-(x_train,y_train),(x_test,y_test) = datasets.mnist.load_data()
-
-x_train = tf.pad(x_train, [[0, 0], [2,2], [2,2]])#/255
-x_test = tf.pad(x_test, [[0, 0], [2,2], [2,2]])#/255
-
-x_train = tf.expand_dims(x_train, axis=3, name=None)
-x_test = tf.expand_dims(x_test, axis=3, name=None)
-
-data = []
-
-for i in range(32):
-    for j in range(32):
-        data.append(int(x_test[file][i][j]))
-        #print("%3d" % int(x_test[file][i][j]), end=' ')
-    #print('\n', end='')
-
-with open('mnistData', 'wb') as f:
-  f.write(bytearray(data))
-
-#print(y_test[file])
-fig = plt.figure()
-plt.imshow(x_test[file], cmap='gray')
-plt.show()#block=False)
\ No newline at end of file
+# extract_mnist.py
+#
+# Export MNIST images for the x86 and M4 harnesses
+#
+# Usage: python3 python/extract_mnist.py 7                  (one raw 32x32 image -> mnistData)
+#        python3 python/extract_mnist.py --range 0 10000 --out test_vectors.bin
+#        python3 python/extract_mnist.py --indices 3 7 42 --out vectors.bin
+#        python3 python/extract_mnist.py --all --split val --out val_vectors.bin
+#
+# A single index keeps the old behaviour: 1024 raw bytes written to mnistData
+# and the image shown with matplotlib (skip with --headless). The bulk modes
+# are always headless and write one packed file (mnist_data.write_vectors:
+# header, labels, fixed-size records). Images come from the cached splits, so
+# neither TensorFlow nor matplotlib is imported.
+
+import argparse
+
+from mnist_data import load_split, write_vectors
+
+parser = argparse.ArgumentParser(description='Export MNIST images as raw bytes or packed test vectors')
+parser.add_argument('index', type=int, nargs='?', help='single image index, written raw to --out (default: mnistData)')
+parser.add_argument('--range', type=int, nargs=2, metavar=('START', 'STOP'), help='export images START..STOP-1')
+parser.add_argument('--indices', type=int, nargs='+', help='export these images')
+parser.add_argument('--all', action='store_true', help='export the whole split')
+parser.add_argument('--split', default='test', choices=('train', 'val', 'test'), help='split to read (default: test)')
+parser.add_argument('--out', help='output file (default: mnistData for one index, mnist_vectors.bin otherwise)')
+parser.add_argument('--headless', action='store_true', help='do not show the single image')
+args = parser.parse_args()
+
+modes = [args.index is not None, args.range is not None, args.indices is not None, args.all]
+if sum(modes) != 1:
+    parser.error('give exactly one of an index, --range, --indices or --all')
+
+x, y = load_split(args.split)
+
+if args.index is not None:
+    out = args.out or 'mnistData'
+    with open(out, 'wb') as f:
+        f.write(x[args.index].tobytes())
+    print('wrote %s: image %d, label %d' % (out, args.index, y[args.index]))
+    if not args.headless:
+        import matplotlib.pyplot as plt
+        fig = plt.figure()
+        plt.imshow(x[args.index], cmap='gray')
+        plt.show()
+else:
+    if args.range is not None:
+        selected = slice(*args.range)
+    elif args.indices is not None:
+        selected = args.indices
+    else:
+        selected = slice(None)
+    images, labels = x[selected], y[selected]
+    out = args.out or 'mnist_vectors.bin'
+    size = write_vectors(out, images, labels)
+    print('wrote %s: %d images from %s, %d bytes' % (out, len(images), args.split, size))
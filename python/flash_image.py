@@ -0,0 +1,120 @@
+# flash_image.py
+#
+# Build one QSPI flash image (IS25LP128F) with the model and test vectors
+#
+# Usage: python3 python/flash_image.py [--model models/model.tflite] [--vectors test_vectors.bin]
+#                                      [--split test] [--count 1000] [--out build/flash.bin]
+#
+# Lays out a header table, the labels, the .tflite model and the images, each
+# section starting on a 4 KB erase sector, and writes the image through an
+# mmap of the output file. The header format is shared with the firmware in
+# target_m4/flash_layout.h; the actual offsets of this image go to a JSON
+# manifest next to it. Unused bytes are 0xFF, the erased state of the flash.
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from mnist_data import load_split, read_vectors
+
+MAGIC = b'LNFI'
+VERSION = 1
+SECTOR_SIZE = 4096
+FLASH_SIZE = 16 << 20  # IS25LP128F: 128 Mbit
+
+## flash_image_header_t in target_m4/flash_layout.h, little endian; the CRC
+## covers every field before it
+HEADER = struct.Struct('<4sHHIIIIIIIIHH32s')
+CRC = struct.Struct('<I')
+
+
+def align(n, alignment=SECTOR_SIZE):
+    return (n+alignment-1)//alignment*alignment
+
+
+# Offsets of each section for a model of model_size bytes and count images of
+# image_size bytes
+def layout(model_size, count, image_size):
+    labels_offset = SECTOR_SIZE
+    model_offset = labels_offset + align(count)
+    images_offset = model_offset + align(model_size)
+    total_size = images_offset + align(count*image_size)
+    return {
+        'labels_offset': labels_offset,
+        'model_offset': model_offset,
+        'model_size': model_size,
+        'images_offset': images_offset,
+        'image_count': count,
+        'image_size': image_size,
+        'total_size': total_size,
+    }
+
+
+def build(path, tflite_model, images, labels):
+    images = np.asarray(images, dtype=np.uint8)
+    count, rows, cols = images.shape[:3]
+    image_size = images[0].size if count else rows*cols
+    sections = layout(len(tflite_model), count, image_size)
+    if sections['total_size'] > FLASH_SIZE:
+        raise ValueError('image needs %d bytes, the flash has %d' % (sections['total_size'], FLASH_SIZE))
+    digest = hashlib.sha256(tflite_model).digest()
+    header = HEADER.pack(MAGIC, VERSION, HEADER.size+CRC.size, SECTOR_SIZE, sections['total_size'],
+                         sections['model_offset'], sections['model_size'], sections['labels_offset'],
+                         sections['images_offset'], count, image_size, rows, cols, digest)
+    header += CRC.pack(zlib.crc32(header))
+
+    with open(path, 'w+b') as f:
+        f.truncate(sections['total_size'])
+        with mmap.mmap(f.fileno(), sections['total_size']) as mm:
+            erased = np.frombuffer(mm, dtype=np.uint8)
+            erased[:] = 0xFF
+            mm[0:len(header)] = header
+            o = sections['labels_offset']
+            erased[o:o+count] = labels
+            o = sections['model_offset']
+            mm[o:o+len(tflite_model)] = tflite_model
+            o = sections['images_offset']
+            erased[o:o+count*image_size] = images.reshape(-1)
+            del erased
+            mm.flush()
+
+    manifest = dict(sections, magic=MAGIC.decode(), version=VERSION, sector_size=SECTOR_SIZE,
+                    rows=rows, cols=cols, model_sha256=digest.hex(), header_crc32=zlib.crc32(header[:-CRC.size]))
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a QSPI flash image with the model and test images')
+    parser.add_argument('--model', default='models/model.tflite', help='model (default: models/model.tflite)')
+    parser.add_argument('--vectors', help='test-vector file from extract_mnist.py (default: read --split)')
+    parser.add_argument('--split', default='test', choices=('train', 'val', 'test'), help='split to read (default: test)')
+    parser.add_argument('--count', type=int, help='number of images (default: all)')
+    parser.add_argument('--out', default='build/flash.bin', help='flash image (default: build/flash.bin)')
+    parser.add_argument('--manifest', help='layout manifest (default: <out>.json)')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        tflite_model = f.read()
+    if args.vectors:
+        images, labels = read_vectors(args.vectors)
+    else:
+        images, labels = load_split(args.split)
+    images, labels = images[:args.count], labels[:args.count]
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    manifest = build(args.out, tflite_model, images, labels)
+    manifest['model'] = args.model
+    manifest_path = args.manifest or os.path.splitext(args.out)[0]+'.json'
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print('wrote %s: %d bytes (%d sectors)' % (args.out, manifest['total_size'], manifest['total_size']//SECTOR_SIZE))
+    for name in ('labels', 'model', 'images'):
+        print('  %-7s 0x%08x' % (name, manifest[name+'_offset']))
+    print('wrote '+manifest_path)
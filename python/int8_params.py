@@ -0,0 +1,63 @@
+# int8_params.py
+#
+# Input/output quantization parameters of a full-integer TFLite model
+#
+# representative_dataset() is the calibration sample of every int8 conversion
+# (lenet_convert.py, lenet_qat.py and lenet_compress.py), so their models are
+# quantized from the same images.
+#
+# write_int8_params() writes <base>.json and a C header <base>.h. The header's
+# lookup table maps a raw uint8 pixel straight to the model's int8 input, so
+# the firmware copy becomes
+#   input[i] = lenet_input_lut[input_data[i]];
+
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+
+# Representative dataset for full-integer calibration: a fixed random sample
+# of `samples` images of x, fed one at a time like the firmware does
+def representative_dataset(x, samples=500):
+    index = np.random.default_rng(0).permutation(len(x))[:samples]
+    def gen():
+        for i in np.sort(index):
+            yield [x[i:i+1].astype(np.float32)]
+    return gen
+
+
+def int8_params(tflite_model):
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    in_scale, in_zero_point = interpreter.get_input_details()[0]['quantization']
+    out_scale, out_zero_point = interpreter.get_output_details()[0]['quantization']
+    return {
+        'input_scale': float(in_scale), 'input_zero_point': int(in_zero_point),
+        'output_scale': float(out_scale), 'output_zero_point': int(out_zero_point),
+    }
+
+
+#   base: output path without extension, e.g. 'models/model_int8_params'
+#   model_path: the .tflite file the parameters belong to (for the comment)
+def write_int8_params(tflite_model, base, model_path):
+    params = int8_params(tflite_model)
+    lut = np.round(np.arange(256)/params['input_scale'])+params['input_zero_point']
+    lut = np.clip(lut, -128, 127).astype(np.int8)
+
+    with open(base+'.json', 'w') as f:
+        json.dump(params, f, indent=2)
+
+    guard = os.path.basename(base).upper()+'_H'
+    rows = [', '.join('%4d' % v for v in lut[i:i+16]) for i in range(0, 256, 16)]
+    with open(base+'.h', 'w') as f:
+        f.write('// Generated by python/int8_params.py for '+model_path+'\n\n')
+        f.write('#ifndef '+guard+'\n#define '+guard+'\n\n#include <stdint.h>\n\n')
+        f.write('#define LENET_INPUT_SCALE %.9ef\n' % params['input_scale'])
+        f.write('#define LENET_INPUT_ZERO_POINT (%d)\n' % params['input_zero_point'])
+        f.write('#define LENET_OUTPUT_SCALE %.9ef\n' % params['output_scale'])
+        f.write('#define LENET_OUTPUT_ZERO_POINT (%d)\n\n' % params['output_zero_point'])
+        f.write('// Raw uint8 pixel -> quantized int8 model input\n')
+        f.write('static const int8_t lenet_input_lut[256] = {\n  '+',\n  '.join(rows)+'\n};\n\n')
+        f.write('#endif // '+guard+'\n')
+    return params
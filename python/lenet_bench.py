@@ -0,0 +1,230 @@
+# lenet_bench.py
+#
+# Benchmark every LeNet-5 inference path on the same fixed input set
+#
+# Usage: python3 python/lenet_bench.py [--backends keras tflite numpy ...] [--images 1000]
+#                                      [--out build/bench.json] [--baseline bench_baseline.json]
+#
+# Each backend runs in its own child process, so cold start (interpreter
+# launch, imports and model load up to the first prediction) and peak RSS
+# are measured for that backend alone. In the child, every image is run once
+# at batch size 1 for latency percentiles, then the whole set at --batch-size
+# for throughput. Results are written as JSON. With --baseline, every metric
+# is compared with a saved run, and the script exits non-zero when a backend
+# regressed by more than --tolerance.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+## Backend name -> (kind, model). The tflite_* entries are skipped when the
+## model has not been converted.
+BACKENDS = {
+    'keras':          ('keras', 'models/model.keras'),
+    'tflite':         ('tflite', 'models/model.tflite'),
+    'tflite_dynamic': ('tflite', 'models/model_dynamic.tflite'),
+    'tflite_float16': ('tflite', 'models/model_float16.tflite'),
+    'tflite_int8':    ('tflite', 'models/model_int8.tflite'),
+    'tflite_qat':     ('tflite', 'models/model_qat_int8.tflite'),
+    'tflite_threads': ('parallel', 'models/model.tflite'),
+    'numpy':          ('numpy', 'models/model.tflite'),
+}
+
+## Metric -> True if higher is better
+METRICS = {
+    'cold_start_s': False,
+    'latency_p50_ms': False,
+    'latency_p90_ms': False,
+    'latency_p99_ms': False,
+    'images_per_s': True,
+    'peak_rss_mb': False,
+}
+
+
+# Returns (predict, predict_set) for one backend; runs in the child.
+# predict(x) scores one batch. predict_set(x) scores the whole input set, or
+# is None to call predict() per --batch-size chunk.
+def _load(kind, model_path, batch_size):
+    if kind in ('keras', 'tflite', 'parallel'):
+        os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    if kind == 'keras':
+        import tensorflow as tf
+        model = tf.keras.models.load_model(model_path)
+        return (lambda x: model.predict(x, batch_size=len(x), verbose=0)), None
+    if kind == 'tflite':
+        from tflite_runner import TFLiteRunner
+        runners = {}
+        def predict(x):
+            if len(x) not in runners:
+                runners[len(x)] = TFLiteRunner(model_path=model_path, batch_size=len(x))
+            return runners[len(x)].predict(x)
+        return predict, None
+    if kind == 'parallel':
+        # The pool and its interpreters are started here, so cold start
+        # includes them and throughput does not. Single images go through one
+        # plain interpreter: a pool shard is several batches
+        from lenet_parallel import ParallelRunner
+        from tflite_runner import TFLiteRunner
+        single = TFLiteRunner(model_path=model_path, batch_size=1, num_threads=1)
+        pool = ParallelRunner(model_path, os.cpu_count(), 'thread', batch_size).start()
+        return single.predict, pool.predict
+    if kind == 'numpy':
+        import lenet_numpy
+        model = lenet_numpy.load(model_path, batch_size)
+        return model.predict, None
+    raise ValueError('unknown backend kind '+kind)
+
+
+def _child(kind, model_path, input_path, batch_size, latency_images, launched):
+    import resource
+    x = np.load(input_path)
+    y = np.load(os.path.splitext(input_path)[0]+'_labels.npy')
+    predict, predict_set = _load(kind, model_path, batch_size)
+    predict(x[:1])
+    cold_start = time.time() - launched
+
+    latencies = []
+    for i in range(min(latency_images, len(x))):
+        t0 = time.perf_counter()
+        predict(x[i:i+1])
+        latencies.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    if predict_set is not None:
+        scores = predict_set(x)
+    else:
+        predict(x[:batch_size])
+        t0 = time.perf_counter()
+        scores = np.concatenate([predict(x[i:i+batch_size]) for i in range(0, len(x), batch_size)])
+    elapsed = time.perf_counter() - t0
+
+    lat_ms = 1000*np.asarray(latencies)
+    # ru_maxrss is in KB on Linux
+    return {
+        'cold_start_s': cold_start,
+        'latency_p50_ms': float(np.percentile(lat_ms, 50)),
+        'latency_p90_ms': float(np.percentile(lat_ms, 90)),
+        'latency_p99_ms': float(np.percentile(lat_ms, 99)),
+        'images_per_s': len(x)/elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+        'accuracy': float(np.mean(np.argmax(scores, axis=1) == y)),
+    }
+
+
+def run_backend(name, input_path, batch_size, latency_images):
+    kind, model_path = BACKENDS[name]
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', name, '--input', input_path,
+           '--batch-size', str(batch_size), '--latency-images', str(latency_images), '--launched', repr(time.time())]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'exit %d' % proc.returncode)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result.update(kind=kind, model=model_path)
+    return result
+
+
+# Relative change of every metric against the baseline; regressions are the
+# changes in the bad direction beyond tolerance, plus every selected baseline
+# backend that failed or did not run
+def compare(results, failures, baseline, tolerance, selected=None):
+    comparison, regressions = {}, []
+    for name in baseline.get('backends', {}):
+        if name in failures:
+            regressions.append('%s failed' % name)
+        elif name not in results and (selected is None or name in selected):
+            regressions.append('%s missing' % name)
+    for name, r in results.items():
+        base = baseline.get('backends', {}).get(name)
+        if base is None:
+            continue
+        comparison[name] = {}
+        for metric, higher_is_better in METRICS.items():
+            if not base.get(metric):
+                continue
+            change = r[metric]/base[metric] - 1
+            comparison[name][metric] = change
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append('%s %s %+.1f%%' % (name, metric, 100*change))
+    return comparison, regressions
+
+
+def print_table(results, comparison):
+    print('{:<15} {:>8} {:>8} {:>8} {:>8} {:>10} {:>8} {:>9}'.format(
+     'backend', 'cold_s', 'p50_ms', 'p90_ms', 'p99_ms', 'images/s', 'rss_MB', 'accuracy'))
+    for name, r in results.items():
+        print('{:<15} {:>8.2f} {:>8.3f} {:>8.3f} {:>8.3f} {:>10.1f} {:>8.1f} {:>9.4f}'.format(
+         name, r['cold_start_s'], r['latency_p50_ms'], r['latency_p90_ms'], r['latency_p99_ms'],
+         r['images_per_s'], r['peak_rss_mb'], r['accuracy']))
+        if name in comparison:
+            c = comparison[name]
+            print('{:<15} {:>8} {:>8} {:>8} {:>8} {:>10} {:>8}'.format('  vs baseline', *(
+             '%+.0f%%' % (100*c[m]) if m in c else '-' for m in METRICS)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the LeNet-5 inference backends')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), help='backends to run (default: all available)')
+    parser.add_argument('--images', type=int, default=1000, help='test images in the input set (default: 1000)')
+    parser.add_argument('--batch-size', type=int, default=100, help='batch size for throughput (default: 100)')
+    parser.add_argument('--latency-images', type=int, default=200, help='images timed one at a time (default: 200)')
+    parser.add_argument('--out', default='build/bench.json', help='results (default: build/bench.json)')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed regression vs the baseline (default: 0.10)')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--input', help=argparse.SUPPRESS)
+    parser.add_argument('--launched', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        kind, model_path = BACKENDS[args.child]
+        print(json.dumps(_child(kind, model_path, args.input, args.batch_size, args.latency_images, args.launched)))
+        sys.exit(0)
+
+    from mnist_data import load_split
+    x, y = load_split('test')
+    names = args.backends or [n for n, (_, path) in BACKENDS.items() if os.path.exists(path)]
+
+    results, failures = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # The same fixed input set, as a plain file every child loads
+        input_path = os.path.join(tmp, 'input.npy')
+        np.save(input_path, x[:args.images])
+        np.save(os.path.join(tmp, 'input_labels.npy'), y[:args.images])
+        for name in names:
+            print('running %s...' % name, file=sys.stderr)
+            try:
+                results[name] = run_backend(name, input_path, args.batch_size, args.latency_images)
+            except Exception as e:
+                failures[name] = str(e)
+                print('%s failed: %s' % (name, e), file=sys.stderr)
+
+    report = {
+        'settings': {'images': min(args.images, len(x)), 'batch_size': args.batch_size,
+                     'latency_images': args.latency_images, 'cpu_count': os.cpu_count()},
+        'backends': results,
+        'failures': failures,
+    }
+    comparison, regressions = {}, []
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison, regressions = compare(results, failures, json.load(f), args.tolerance, args.backends)
+        report['baseline'] = {'path': args.baseline, 'tolerance': args.tolerance,
+                              'change': comparison, 'regressions': regressions}
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print_table(results, comparison)
+    print('wrote '+args.out)
+    for name, error in failures.items():
+        print('%s failed: %s' % (name, error))
+    if regressions:
+        print('regressions (tolerance %.0f%%): %s' % (100*args.tolerance, ', '.join(regressions)))
+    if regressions or failures:
+        sys.exit(1)
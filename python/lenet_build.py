@@ -0,0 +1,138 @@
+# lenet_build.py
+#
+# Incremental train -> convert -> emit pipeline
+#
+# Usage: python3 python/lenet_build.py [train] [convert] [emit] [--force] [--dry-run]
+#
+# Each stage records the SHA-256 of its inputs (scripts, data, upstream models)
+# and outputs in build/stamps/<stage>.json and is skipped while those hashes
+# still match. Hashing contents rather than comparing mtimes means a checkout,
+# copy or re-save that leaves the bytes unchanged does not retrain, and an
+# output edited by hand is rebuilt.
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from mnist_data import source_path
+from model_to_c import write_c_array
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAMP_DIR = os.path.join(REPO_DIR, 'build', 'stamps')
+
+
+def sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _hashes(paths):
+    return {p: sha256(os.path.join(REPO_DIR, p)) if os.path.exists(os.path.join(REPO_DIR, p)) else None
+            for p in paths}
+
+
+def _emit():
+    with open(os.path.join(REPO_DIR, 'models/model.tflite'), 'rb') as f:
+        write_c_array(f.read(), os.path.join(REPO_DIR, 'target_x86/model_data'), 'models/model.tflite')
+
+
+## Stage name -> (inputs, outputs, action). An action is a command line run
+## from the repository root or a Python callable.
+STAGES = {
+    'train': (
+        ('python/lenet_training.py', 'python/lenet_model.py', 'python/train_pipeline.py',
+         'python/mnist_data.py', source_path()),
+        ('models/model.keras',),
+        [sys.executable, 'python/lenet_training.py'],
+    ),
+    'convert': (
+        ('python/lenet_convert.py', 'models/model.keras'),
+        ('models/model.tflite',),
+        [sys.executable, 'python/lenet_convert.py', '--mode', 'float32', '--no-eval', '--c-array', ''],
+    ),
+    'emit': (
+        ('python/model_to_c.py', 'models/model.tflite'),
+        ('target_x86/model_data.cc', 'target_x86/model_data.h'),
+        _emit,
+    ),
+}
+
+
+def _stamp_path(stage):
+    return os.path.join(STAMP_DIR, stage+'.json')
+
+
+def _read_stamp(stage):
+    try:
+        with open(_stamp_path(stage)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_stamp(stage, stamp):
+    os.makedirs(STAMP_DIR, exist_ok=True)
+    tmp = _stamp_path(stage)+'.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(stamp, f, indent=2)
+    os.replace(tmp, _stamp_path(stage))
+
+
+# Why a stage has to run, or None if it is up to date
+def outdated(stage):
+    inputs, outputs, _ = STAGES[stage]
+    stamp = _read_stamp(stage)
+    if stamp is None:
+        return 'no stamp'
+    current = _hashes(inputs)
+    for p, digest in current.items():
+        if stamp['inputs'].get(p) != digest:
+            return p+' changed'
+    for p, digest in _hashes(outputs).items():
+        if digest is None:
+            return p+' missing'
+        if stamp['outputs'].get(p) != digest:
+            return p+' modified'
+    return None
+
+
+def run(stage):
+    inputs, outputs, action = STAGES[stage]
+    start = time.perf_counter()
+    if callable(action):
+        action()
+    else:
+        subprocess.run(action, cwd=REPO_DIR, check=True)
+    _write_stamp(stage, {'inputs': _hashes(inputs), 'outputs': _hashes(outputs)})
+    return time.perf_counter()-start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train, convert and emit the model, skipping unchanged stages')
+    parser.add_argument('stages', nargs='*', default=list(STAGES),
+                        help='stages to bring up to date: %s (default: all)' % ', '.join(STAGES))
+    parser.add_argument('--force', action='store_true', help='run the stages even if they are up to date')
+    parser.add_argument('--dry-run', action='store_true', help='only report which stages would run')
+    args = parser.parse_args()
+    for stage in args.stages:
+        if stage not in STAGES:
+            parser.error('unknown stage '+stage)
+
+    for stage in STAGES:
+        if stage not in args.stages:
+            continue
+        reason = 'forced' if args.force else outdated(stage)
+        if reason is None:
+            print('%-8s up to date' % stage)
+        elif args.dry_run:
+            print('%-8s would run (%s)' % (stage, reason))
+        else:
+            print('%-8s running (%s)' % (stage, reason))
+            print('%-8s done in %.1f s' % (stage, run(stage)))
@@ -0,0 +1,146 @@
+# lenet_compress.py
+#
+# Magnitude pruning and weight clustering between training and conversion
+#
+# Usage: python3 python/lenet_compress.py [--sparsity 0.8] [--clusters 16]
+#        python3 python/lenet_compress.py --sweep --sparsity 0 0.5 0.8 0.9 --clusters 0 16 32
+#        python3 python/lenet_convert.py --model models/model_compressed.keras   (writes models/model_compressed.tflite)
+#
+# The large layers (Conv2D(120,5), Dense(84), ...) are pruned with a
+# polynomial sparsity schedule and/or clustered to a few shared weight values
+# while fine-tuning from models/model.keras. The tfmot wrappers are then
+# stripped. Sparse and clustered weights still take 4 bytes each in a float
+# flatbuffer. The win shows up in the compressed (zlib) size and, for
+# clustering, after int8 conversion, so both sizes are reported for every
+# configuration.
+
+import argparse
+import itertools
+import os
+import zlib
+
+parser = argparse.ArgumentParser(description='Prune and/or cluster models/model.keras')
+parser.add_argument('--sparsity', type=float, nargs='+', default=[0.8], help='final pruning sparsity, 0 disables (default: 0.8)')
+parser.add_argument('--clusters', type=int, nargs='+', default=[0], help='weight clusters per layer, 0 disables (default: 0)')
+parser.add_argument('--min-params', type=int, default=1000, help='only compress layers with at least this many weights (default: 1000)')
+parser.add_argument('--epochs', type=int, default=2, help='fine-tuning epochs per stage (default: 2)')
+parser.add_argument('--batch-size', type=int, default=64, help='batch size (default: 64)')
+parser.add_argument('--int8', action='store_true', help='report int8 TFLite sizes instead of float32')
+parser.add_argument('--sweep', action='store_true', help='try every sparsity x clusters combination and only report')
+parser.add_argument('--out', default='models/model_compressed.keras', help='compressed model (default: models/model_compressed.keras)')
+args = parser.parse_args()
+
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+import tensorflow as tf
+from int8_params import representative_dataset
+from lenet_model import load_into, save_keras3
+from mnist_data import load_mnist
+from tflite_runner import TFLiteRunner, evaluate
+
+# tensorflow_model_optimization only supports Keras 2 (see lenet_qat.py)
+import tf_keras
+import tensorflow_model_optimization as tfmot
+
+
+(x_train,y_train),(x_val,y_val),(x_test,y_test) = load_mnist()
+steps_per_epoch = -(-len(x_train)//args.batch_size)
+
+
+def _large(layer):
+    return isinstance(layer, (tf_keras.layers.Conv2D, tf_keras.layers.Dense)) and \
+           layer.count_params() >= args.min_params
+
+
+def _fine_tune(model, callbacks=()):
+    model.compile(optimizer=tf_keras.optimizers.Adam(1e-4),
+                  loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    model.fit(x_train, y_train, batch_size=args.batch_size, epochs=args.epochs,
+              validation_data=(x_val, y_val), callbacks=list(callbacks), verbose=2)
+
+
+def prune(model, sparsity):
+    # Reach the final sparsity one epoch before the end, so the last epoch
+    # recovers accuracy with a fixed mask
+    end_step = steps_per_epoch*max(args.epochs-1, 1)
+    schedule = tfmot.sparsity.keras.PolynomialDecay(
+     initial_sparsity=0.0, final_sparsity=sparsity,
+     begin_step=0, end_step=end_step, frequency=min(100, max(end_step//10, 1)))
+    def wrap(layer):
+        if _large(layer):
+            return tfmot.sparsity.keras.prune_low_magnitude(layer, pruning_schedule=schedule)
+        return layer
+    model = tf_keras.models.clone_model(model, clone_function=wrap)
+    _fine_tune(model, [tfmot.sparsity.keras.UpdatePruningStep()])
+    return tfmot.sparsity.keras.strip_pruning(model)
+
+
+def cluster(model, clusters, preserve_sparsity):
+    def wrap(layer):
+        if _large(layer):
+            return tfmot.clustering.keras.cluster_weights(
+             layer, number_of_clusters=clusters, preserve_sparsity=preserve_sparsity,
+             cluster_centroids_init=tfmot.clustering.keras.CentroidInitialization.KMEANS_PLUS_PLUS)
+        return layer
+    model = tf_keras.models.clone_model(model, clone_function=wrap)
+    _fine_tune(model)
+    return tfmot.clustering.keras.strip_clustering(model)
+
+
+def compress(sparsity, clusters):
+    model = load_into('models/model.keras', tf_keras)
+    if sparsity > 0:
+        model = prune(model, sparsity)
+    if clusters > 0:
+        model = cluster(model, clusters, preserve_sparsity=sparsity > 0)
+    return model
+
+
+def to_tflite(model):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if args.int8:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(x_train)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
+
+
+def measure(model, sparsity, clusters):
+    tflite_model = to_tflite(model)
+    result, _ = evaluate(TFLiteRunner(model_content=tflite_model, batch_size=100), x_test, y_test)
+    weights = np.concatenate([w.ravel() for l in model.layers if _large(l) for w in l.get_weights()[:1]])
+    return {
+        'sparsity': sparsity, 'clusters': clusters,
+        'zeros': float(np.mean(weights == 0)),
+        'unique': len(np.unique(weights)),
+        'accuracy': result['accuracy'],
+        'tflite_KB': len(tflite_model)/1024,
+        'zlib_KB': len(zlib.compress(tflite_model, 9))/1024,
+    }
+
+
+def print_table(rows):
+    print('{:>8} {:>8} {:>7} {:>8} {:>9} {:>10} {:>8}'.format(
+     'sparsity', 'clusters', 'zeros', 'unique', 'accuracy', 'tflite_KB', 'zlib_KB'))
+    for r in rows:
+        print('{:>8.2f} {:>8} {:>6.1f}% {:>8} {:>9.4f} {:>10.1f} {:>8.1f}'.format(
+         r['sparsity'], r['clusters'] or '-', 100*r['zeros'], r['unique'],
+         r['accuracy'], r['tflite_KB'], r['zlib_KB']))
+
+
+if args.sweep:
+    rows = []
+    for sparsity, clusters in itertools.product(args.sparsity, args.clusters):
+        rows.append(measure(compress(sparsity, clusters), sparsity, clusters))
+    print_table(rows)
+else:
+    model = compress(args.sparsity[0], args.clusters[0])
+    save_keras3(model, args.out)
+    rows = [measure(load_into('models/model.keras', tf_keras), 0.0, 0),
+            measure(model, args.sparsity[0], args.clusters[0])]
+    print_table(rows)
+    print('saved '+args.out)
@@ -1,33 +1,84 @@
+import argparse
 import os
 
+parser = argparse.ArgumentParser(description='Convert models/model.keras to TFLite')
+parser.add_argument('--model', default='models/model.keras', help='Keras model to convert (default: models/model.keras)')
+parser.add_argument('--mode', nargs='+', default=['float32'], choices=('float32', 'dynamic', 'float16', 'int8', 'all'),
+                    help='conversion modes (default: float32)')
+parser.add_argument('--calibration-samples', type=int, default=500,
+                    help='training images in the int8 representative dataset (default: 500)')
+parser.add_argument('--no-eval', action='store_true', help='skip the size/accuracy/latency table')
+parser.add_argument('--c-array',
+                    help='emit the float32 model as <C_ARRAY>.cc/.h, empty to skip '
+                         '(default: target_x86/model_data for models/model.keras, skipped for other models)')
+args = parser.parse_args()
+if args.c_array is None:
+    args.c_array = 'target_x86/model_data' if os.path.normpath(args.model) == os.path.normpath('models/model.keras') else ''
+
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
+import numpy as np
 import tensorflow as tf
-import matplotlib.pyplot as plt
-from tensorflow.keras import datasets, layers, models, losses
+from int8_params import representative_dataset, write_int8_params
+from mnist_data import load_mnist
+from model_to_c import write_c_array
+from tflite_runner import TFLiteRunner, evaluate
+
+# Output file suffix for each mode, after the stem of --model; float32 keeps
+# the plain stem, so models/model.keras converts to models/model.tflite and
+# models/model_compressed.keras to models/model_compressed.tflite
+MODE_SUFFIXES = {
+    'float32': '',
+    'dynamic': '_dynamic',
+    'float16': '_float16',
+    'int8':    '_int8',
+}
+MODEL_STEM = os.path.splitext(args.model)[0]
+MODEL_PATHS = {mode: MODEL_STEM+suffix+'.tflite' for mode, suffix in MODE_SUFFIXES.items()}
 
 
-(x_train,y_train),(x_test,y_test) = datasets.mnist.load_data()
+def convert(model, mode, x_calibration=None, samples=500):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif mode == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(x_calibration, samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
 
-x_train = tf.pad(x_train, [[0, 0], [2,2], [2,2]])/255
-x_test = tf.pad(x_test, [[0, 0], [2,2], [2,2]])/255
 
-x_train = tf.expand_dims(x_train, axis=3, name=None)
-x_test = tf.expand_dims(x_test, axis=3, name=None)
+(x_train,y_train),(x_val,y_val),(x_test,y_test) = load_mnist()
 
-x_val = x_train[-2000:,:,:,:] 
-y_val = y_train[-2000:] 
-x_train = x_train[:-2000,:,:,:] 
-y_train = y_train[:-2000]
+model = tf.keras.models.load_model(args.model)
 
-model = tf.keras.models.load_model("models/model.keras")
+modes = list(MODEL_PATHS) if 'all' in args.mode else args.mode
+results = []
+for mode in modes:
+    # Convert the model.
+    tflite_model = convert(model, mode, x_train, args.calibration_samples)
 
+    # Save the model.
+    with open(MODEL_PATHS[mode], 'wb') as f:
+      f.write(tflite_model)
+    if mode == 'int8':
+        write_int8_params(tflite_model, MODEL_STEM+'_int8_params', MODEL_PATHS[mode])
+    if mode == 'float32' and args.c_array:
+        if write_c_array(tflite_model, args.c_array, MODEL_PATHS[mode]):
+            print('wrote %s.cc/.h' % args.c_array)
 
-# Convert the model.
-converter = tf.lite.TFLiteConverter.from_keras_model(model)
-tflite_model = converter.convert()
+    if not args.no_eval:
+        accuracy, _ = evaluate(TFLiteRunner(model_content=tflite_model, batch_size=100), x_test, y_test)
+        latency, _ = evaluate(TFLiteRunner(model_content=tflite_model, batch_size=1), x_test[:1000], y_test[:1000])
+        results.append((mode, len(tflite_model), accuracy['accuracy'], latency['batch_p50_ms'], latency['batch_p99_ms']))
 
-# Save the model.
-with open('models/model.tflite', 'wb') as f:
-  f.write(tflite_model)
\ No newline at end of file
+if results:
+    print('{:<8} {:<30} {:>10} {:>9} {:>10} {:>10}'.format('mode', 'file', 'size_KB', 'accuracy', 'p50_ms', 'p99_ms'))
+    for mode, size, accuracy, p50, p99 in results:
+        print('{:<8} {:<30} {:>10.1f} {:>9.4f} {:>10.4f} {:>10.4f}'.format(mode, MODEL_PATHS[mode], size/1024, accuracy, p50, p99))
@@ -0,0 +1,188 @@
+# lenet_cost.py
+#
+# Static Cortex-M4 cost model of a TFLite model: MACs, flash, RAM and cycles
+#
+# Usage: python3 python/lenet_cost.py [models/model.tflite] [--clock-mhz 80] [--cost-table costs.json]
+#                                     [--flash-budget 1048576] [--ram-budget 327680] [--latency-budget-ms 50]
+#
+# Reads the flatbuffer only; nothing runs. Every operator gets its MACs, the
+# bytes of its constant inputs (weights and biases, in flash) and of its
+# activations (non-constant inputs and outputs, in the arena), and a cycle
+# estimate from a per-operator cost table:
+#
+#   cycles = mac*MACs + element*output elements + op
+#
+# The table is picked per operator from the type of its activations: float
+# operators use the TFLM reference kernels, int8 operators the CMSIS-NN
+# kernels. The built-in numbers are rough M4F figures at zero flash wait
+# states; --cost-table merges measured ones from a JSON file of the same
+# shape as COST_TABLES. Peak RAM is the planned arena (arena_planner.py) plus
+# the persistent estimate plus --reserved-ram for stack, heap and the
+# application. The default budgets are the STM32L496's 1 MB flash and 320 KB
+# RAM; the script exits non-zero when any budget is exceeded.
+
+import argparse
+import json
+import sys
+
+from arena_planner import lifetimes, peak, persistent_estimate, plan
+from tflite_model import macs, read_model
+
+## Kernel set -> operator -> cycles per MAC, per output element and per
+## invocation (interpreter dispatch and kernel setup). '_default' covers
+## operators not in the table.
+COST_TABLES = {
+    'reference_float': {
+        'CONV_2D':           {'mac': 12.0, 'element': 20, 'op': 1500},
+        'DEPTHWISE_CONV_2D': {'mac': 14.0, 'element': 20, 'op': 1500},
+        'FULLY_CONNECTED':   {'mac': 6.0,  'element': 20, 'op': 1000},
+        'AVERAGE_POOL_2D':   {'mac': 8.0,  'element': 20, 'op': 1000},
+        'MAX_POOL_2D':       {'mac': 8.0,  'element': 20, 'op': 1000},
+        'TANH':              {'mac': 0,    'element': 150, 'op': 500},
+        'LOGISTIC':          {'mac': 0,    'element': 120, 'op': 500},
+        'SOFTMAX':           {'mac': 0,    'element': 200, 'op': 800},
+        'RESHAPE':           {'mac': 0,    'element': 1, 'op': 300},
+        '_default':          {'mac': 0,    'element': 10, 'op': 500},
+    },
+    'cmsis_int8': {
+        'CONV_2D':           {'mac': 1.0, 'element': 10, 'op': 2000},
+        'DEPTHWISE_CONV_2D': {'mac': 2.0, 'element': 10, 'op': 2000},
+        'FULLY_CONNECTED':   {'mac': 0.8, 'element': 10, 'op': 1500},
+        'AVERAGE_POOL_2D':   {'mac': 2.0, 'element': 10, 'op': 1000},
+        'MAX_POOL_2D':       {'mac': 2.0, 'element': 10, 'op': 1000},
+        'TANH':              {'mac': 0,   'element': 20, 'op': 500},
+        'LOGISTIC':          {'mac': 0,   'element': 20, 'op': 500},
+        'SOFTMAX':           {'mac': 0,   'element': 60, 'op': 800},
+        'QUANTIZE':          {'mac': 0,   'element': 12, 'op': 500},
+        'DEQUANTIZE':        {'mac': 0,   'element': 12, 'op': 500},
+        'RESHAPE':           {'mac': 0,   'element': 1, 'op': 300},
+        '_default':          {'mac': 0,   'element': 10, 'op': 500},
+    },
+}
+
+## STM32L496
+FLASH_BUDGET = 1 << 20
+RAM_BUDGET = 320 << 10
+CLOCK_MHZ = 80
+
+
+# Merges a JSON cost table over the built-in one, per kernel set and operator
+def load_cost_table(path):
+    tables = {kernels: {op: dict(cost) for op, cost in ops.items()} for kernels, ops in COST_TABLES.items()}
+    with open(path) as f:
+        for kernels, ops in json.load(f).items():
+            if kernels not in tables:
+                raise ValueError('%s: unknown kernel set %r, expected one of %s' % (path, kernels, ', '.join(tables)))
+            for op, cost in ops.items():
+                tables[kernels].setdefault(op, {'mac': 0, 'element': 0, 'op': 0}).update(cost)
+    return tables
+
+
+def kernel_set(model, op):
+    activations = [model.tensors[i] for i in op.inputs if i >= 0 and not model.tensors[i].is_constant]
+    t = activations[0] if activations else model.tensors[op.outputs[0]]
+    return 'cmsis_int8' if t.type in ('INT8', 'INT16') else 'reference_float'
+
+
+def layer_costs(model, tables):
+    rows = []
+    for op in model.operators:
+        kernels = kernel_set(model, op)
+        known = op.opcode in tables[kernels]
+        cost = tables[kernels][op.opcode if known else '_default']
+        out = model.tensors[op.outputs[0]]
+        n_macs = macs(model, op)
+        inputs = [model.tensors[i] for i in op.inputs if i >= 0]
+        rows.append({
+            'index': op.index,
+            'op': op.opcode,
+            'kernels': kernels,
+            'known_cost': known,
+            'macs': n_macs,
+            'weight_bytes': sum(len(t.data) for t in inputs if t.is_constant),
+            'activation_bytes': sum(t.nbytes for t in inputs if not t.is_constant) +
+                                sum(model.tensors[i].nbytes for i in op.outputs),
+            'cycles': int(cost['mac']*n_macs + cost['element']*out.size + cost['op']),
+        })
+    return rows
+
+
+# Budget violations as readable strings; empty when the model fits
+def check_budgets(totals, flash_budget, ram_budget, latency_budget_ms):
+    errors = []
+    if totals['flash_bytes'] > flash_budget:
+        errors.append('flash %d bytes > budget %d bytes (%d over)' % (
+         totals['flash_bytes'], flash_budget, totals['flash_bytes']-flash_budget))
+    if totals['ram_bytes'] > ram_budget:
+        errors.append('RAM %d bytes > budget %d bytes (%d over)' % (
+         totals['ram_bytes'], ram_budget, totals['ram_bytes']-ram_budget))
+    if latency_budget_ms and totals['latency_ms'] > latency_budget_ms:
+        errors.append('latency %.2f ms > budget %.2f ms' % (totals['latency_ms'], latency_budget_ms))
+    return errors
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Static Cortex-M4 cost model and budget check of a .tflite model')
+    parser.add_argument('model', nargs='?', default='models/model.tflite', help='model (default: models/model.tflite)')
+    parser.add_argument('--cost-table', help='JSON cycle costs merged over the built-in table')
+    parser.add_argument('--clock-mhz', type=float, default=CLOCK_MHZ, help='core clock (default: %d)' % CLOCK_MHZ)
+    parser.add_argument('--code-bytes', type=int, default=128 << 10,
+                        help='flash for the firmware, TFLM and HAL; use the .text size of a real build (default: 131072)')
+    parser.add_argument('--reserved-ram', type=int, default=16 << 10,
+                        help='RAM for stack, heap and the application besides the arena (default: 16384)')
+    parser.add_argument('--flash-budget', type=int, default=FLASH_BUDGET, help='bytes (default: %d)' % FLASH_BUDGET)
+    parser.add_argument('--ram-budget', type=int, default=RAM_BUDGET, help='bytes (default: %d)' % RAM_BUDGET)
+    parser.add_argument('--latency-budget-ms', type=float, help='maximum estimated tflm_invoke() time')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    tables = load_cost_table(args.cost_table) if args.cost_table else COST_TABLES
+    rows = layer_costs(model, tables)
+
+    buffers = lifetimes(model)
+    planned = plan(buffers)
+    persistent = persistent_estimate(model)
+    peak_op, _, _ = peak(model, buffers)
+    cycles = sum(r['cycles'] for r in rows)
+    totals = {
+        'macs': sum(r['macs'] for r in rows),
+        'weight_bytes': sum(r['weight_bytes'] for r in rows),
+        'model_bytes': len(model.buf),
+        'flash_bytes': len(model.buf) + args.code_bytes,
+        'arena_bytes': planned + persistent,
+        'ram_bytes': planned + persistent + args.reserved_ram,
+        'cycles': cycles,
+        'latency_ms': cycles/(args.clock_mhz*1000),
+    }
+
+    print('{:>3} {:<18} {:<16} {:>9} {:>8} {:>11} {:>10} {:>8}'.format(
+     '#', 'op', 'kernels', 'MACs', 'weights', 'activations', 'cycles', 'ms'))
+    for r in rows:
+        print('{:>3} {:<18} {:<16} {:>9} {:>8} {:>11} {:>10} {:>8.3f}{}'.format(
+         r['index'], r['op'], r['kernels'], r['macs'] or '-', r['weight_bytes'] or '-', r['activation_bytes'],
+         r['cycles'], r['cycles']/(args.clock_mhz*1000), '' if r['known_cost'] else '  (default cost)'))
+    print('{:>3} {:<18} {:<16} {:>9} {:>8} {:>11} {:>10} {:>8.3f}'.format(
+     '', 'total', '', totals['macs'], totals['weight_bytes'], '', cycles, totals['latency_ms']))
+    print()
+    print('flash:   %7d bytes = model %d + code %d  (budget %d, %.0f%%)' % (
+     totals['flash_bytes'], totals['model_bytes'], args.code_bytes, args.flash_budget,
+     100*totals['flash_bytes']/args.flash_budget))
+    print('RAM:     %7d bytes = arena %d + persistent %d + reserved %d  (budget %d, %.0f%%)' % (
+     totals['ram_bytes'], planned, persistent, args.reserved_ram, args.ram_budget,
+     100*totals['ram_bytes']/args.ram_budget))
+    print('         arena peak at #%d %s' % (peak_op.index, peak_op.opcode))
+    print('latency: %7.2f ms at %g MHz (%d cycles)%s' % (
+     totals['latency_ms'], args.clock_mhz, cycles,
+     '  (budget %.2f ms)' % args.latency_budget_ms if args.latency_budget_ms else ''))
+
+    errors = check_budgets(totals, args.flash_budget, args.ram_budget, args.latency_budget_ms)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'model': args.model, 'clock_mhz': args.clock_mhz, 'totals': totals,
+                       'operators': rows, 'budget_errors': errors}, f, indent=2)
+    if errors:
+        print()
+        for e in errors:
+            print('budget exceeded: '+e)
+        sys.exit(1)
@@ -0,0 +1,65 @@
+# lenet_model.py
+#
+# The LeNet-5 architecture shared by the training, QAT and compression scripts
+#
+# build_model() takes the Keras module to build with, so the same layer stack
+# can be built with Keras 3 (tf.keras) for training and with tf_keras (Keras 2)
+# for the tensorflow_model_optimization wrappers.
+
+INPUT_SHAPE = (32, 32, 1)
+FILTERS = (6, 16, 120)
+UNITS = 84
+
+
+# Defaults give the LeNet-5 of lenet_training.py; the sweep runner varies them
+#   filters:         filters of the three Conv2D(5x5) layers
+#   units:           width of the hidden Dense layer
+#   activation:      activation of the convolutions and the hidden Dense layer
+#   pool_activation: activation applied after each average pool
+#   output_dtype:    dtype of the softmax layer, 'float32' keeps the output
+#                    stable when a mixed-precision policy is active
+def build_model(keras=None, input_shape=INPUT_SHAPE, output_dtype=None, filters=FILTERS, units=UNITS,
+                activation='tanh', pool_activation='sigmoid'):
+    if keras is None:
+        import tensorflow as tf
+        keras = tf.keras
+    layers = keras.layers
+    model = keras.models.Sequential()
+    model.add(layers.Conv2D(filters[0], 5, activation=activation, input_shape=input_shape))
+    model.add(layers.AveragePooling2D(2))
+    model.add(layers.Activation(pool_activation))
+    model.add(layers.Conv2D(filters[1], 5, activation=activation))
+    model.add(layers.AveragePooling2D(2))
+    model.add(layers.Activation(pool_activation))
+    model.add(layers.Conv2D(filters[2], 5, activation=activation))
+    model.add(layers.Flatten())
+    model.add(layers.Dense(units, activation=activation))
+    if output_dtype is None:
+        model.add(layers.Dense(10, activation='softmax'))
+    else:
+        model.add(layers.Dense(10, activation='softmax', dtype=output_dtype))
+    return model
+
+
+# Load a model saved by lenet_training.py (Keras 3 format) into a freshly
+# built copy of the architecture from another Keras module, e.g. tf_keras.
+# Keras 2 cannot deserialize the Keras 3 config, but the weights line up
+# layer by layer.
+def load_into(path, keras):
+    import keras as keras3
+    saved = keras3.models.load_model(path)
+    model = build_model(keras, saved.input_shape[1:])
+    for dst, src in zip(model.layers, saved.layers):
+        dst.set_weights(src.get_weights())
+    return model
+
+
+# Copy a model built by another Keras module (e.g. a stripped tf_keras model)
+# into a Keras 3 model and save it where lenet_convert.py can read it
+def save_keras3(model, path):
+    import keras as keras3
+    saved = build_model(keras3, model.input_shape[1:])
+    for dst, src in zip(saved.layers, model.layers):
+        dst.set_weights(src.get_weights())
+    saved.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    saved.save(path)
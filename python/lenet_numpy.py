@@ -0,0 +1,314 @@
+# lenet_numpy.py
+#
+# NumPy-only LeNet-5 inference
+#
+# Usage: python3 python/lenet_numpy.py [--model models/model.tflite] [--eval]
+#        python3 python/lenet_numpy.py --check [--images 1000]
+#
+# Runs the Conv2D(tanh) -> AveragePooling2D -> sigmoid -> ... -> Dense(softmax)
+# graph of lenet_training.py without TensorFlow, so ground tools and CI start
+# in milliseconds. Weights come from a float .tflite model (read with
+# tflite_model.py) or from a .keras archive (config.json + model.weights.h5,
+# read with h5py). Convolutions are one im2col GEMM per layer over the whole
+# batch. --check compares the scores with the TFLite interpreter.
+
+import json
+import time
+import zipfile
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _activation(name):
+    if name in (None, 'linear', 'NONE'):
+        return None
+    if name in ('tanh', 'TANH'):
+        return np.tanh
+    if name in ('sigmoid', 'LOGISTIC'):
+        return lambda x: 1/(1+np.exp(-x))
+    if name in ('relu', 'RELU'):
+        return lambda x: np.maximum(x, 0)
+    if name in ('softmax', 'SOFTMAX'):
+        def softmax(x):
+            e = np.exp(x - x.max(axis=-1, keepdims=True))
+            return e / e.sum(axis=-1, keepdims=True)
+        return softmax
+    raise ValueError('unsupported activation '+str(name))
+
+
+def _pad_same(x, kh, kw, sh, sw):
+    h, w = x.shape[1:3]
+    ph = max((-(-h//sh)-1)*sh+kh-h, 0)
+    pw = max((-(-w//sw)-1)*sw+kw-w, 0)
+    return np.pad(x, ((0, 0), (ph//2, ph-ph//2), (pw//2, pw-pw//2), (0, 0)))
+
+
+## Layers take and return NHWC (or NC) float32 batches
+
+class Conv2D:
+    # kernel: (KH, KW, C, O) as Keras stores it
+    def __init__(self, kernel, bias, strides=(1, 1), padding='valid', activation=None):
+        self.kh, self.kw, c, o = kernel.shape
+        self.kernel = np.ascontiguousarray(kernel.reshape(self.kh*self.kw*c, o), dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.strides = tuple(strides)
+        self.padding = padding.lower()
+        self.activation = _activation(activation)
+
+    def __call__(self, x):
+        sh, sw = self.strides
+        if self.padding == 'same':
+            x = _pad_same(x, self.kh, self.kw, sh, sw)
+        # (N, OH, OW, C, KH, KW) windows -> (N*OH*OW, KH*KW*C) rows in the
+        # kernel's (KH, KW, C) order, then one GEMM for the whole batch
+        windows = sliding_window_view(x, (self.kh, self.kw), axis=(1, 2))[:, ::sh, ::sw]
+        n, oh, ow = windows.shape[:3]
+        cols = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n*oh*ow, -1)
+        y = (cols @ self.kernel + self.bias).reshape(n, oh, ow, -1)
+        return self.activation(y) if self.activation else y
+
+
+class AveragePooling2D:
+    def __init__(self, pool_size=(2, 2), strides=None, padding='valid', activation=None):
+        self.pool_size = tuple(pool_size)
+        self.strides = tuple(strides or pool_size)
+        self.padding = padding.lower()
+        self.activation = _activation(activation)
+
+    def __call__(self, x):
+        ph, pw = self.pool_size
+        sh, sw = self.strides
+        if self.padding == 'same':
+            raise ValueError('SAME average pooling is not supported')
+        n, h, w, c = x.shape
+        oh, ow = (h-ph)//sh+1, (w-pw)//sw+1
+        if (ph, pw) == (sh, sw):
+            # Non-overlapping windows are a plain reshape
+            y = x[:, :oh*ph, :ow*pw].reshape(n, oh, ph, ow, pw, c).mean(axis=(2, 4))
+        else:
+            y = sliding_window_view(x, (ph, pw), axis=(1, 2))[:, ::sh, ::sw].mean(axis=(-2, -1))
+        return self.activation(y) if self.activation else y
+
+
+class Activation:
+    def __init__(self, activation):
+        self.activation = _activation(activation)
+
+    def __call__(self, x):
+        return self.activation(x)
+
+
+class Flatten:
+    def __call__(self, x):
+        return x.reshape(len(x), -1)
+
+
+class Reshape:
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+
+    def __call__(self, x):
+        return x.reshape((len(x),)+self.shape)
+
+
+class Dense:
+    # kernel: (in, out) as Keras stores it
+    def __init__(self, kernel, bias, activation=None):
+        self.kernel = np.ascontiguousarray(kernel, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.activation = _activation(activation)
+
+    def __call__(self, x):
+        y = x @ self.kernel + self.bias
+        return self.activation(y) if self.activation else y
+
+
+class NumpyModel:
+    # Same predict(x, latencies)/batch_size interface as TFLiteRunner
+    def __init__(self, layers, batch_size=1024):
+        self.layers = layers
+        self.batch_size = batch_size
+
+    def invoke(self, x):
+        y = np.asarray(x, dtype=np.float32)
+        for layer in self.layers:
+            y = layer(y)
+        return y
+
+    def predict(self, x, latencies=None):
+        out = []
+        for start in range(0, len(x), self.batch_size):
+            t0 = time.perf_counter()
+            out.append(self.invoke(x[start:start+self.batch_size]))
+            if latencies is not None:
+                latencies.append(time.perf_counter() - t0)
+        return np.concatenate(out)
+
+
+# Layers from a Keras 3 .keras archive
+def _from_keras(path):
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError('reading .keras weights needs h5py; use the .tflite model instead')
+    import io
+    with zipfile.ZipFile(path) as z:
+        config = json.loads(z.read('config.json'))
+        weights = h5py.File(io.BytesIO(z.read('model.weights.h5')), 'r')
+    layers = []
+    for layer in config['config']['layers']:
+        kind, cfg = layer['class_name'], layer['config']
+        variables = weights.get('layers/%s/vars' % cfg['name'])
+        w = [variables[str(i)][()] for i in range(len(variables))] if variables is not None else []
+        if kind == 'InputLayer':
+            continue
+        elif kind == 'Conv2D':
+            layers.append(Conv2D(w[0], w[1] if cfg['use_bias'] else np.zeros(w[0].shape[-1]),
+                                 cfg['strides'], cfg['padding'], cfg['activation']))
+        elif kind == 'AveragePooling2D':
+            layers.append(AveragePooling2D(cfg['pool_size'], cfg['strides'], cfg['padding']))
+        elif kind == 'Activation':
+            layers.append(Activation(cfg['activation']))
+        elif kind == 'Flatten':
+            layers.append(Flatten())
+        elif kind == 'Dense':
+            layers.append(Dense(w[0], w[1] if cfg['use_bias'] else np.zeros(w[0].shape[-1]),
+                                cfg['activation']))
+        else:
+            raise ValueError('unsupported Keras layer '+kind)
+    return layers
+
+
+# Layers from a float32 .tflite model (float16 or int8 weights are dequantized)
+def _from_tflite(path):
+    from tflite_model import read_model
+    model = read_model(path)
+    constants = {}
+    def const(i):
+        if i not in constants:
+            t = model.tensors[i]
+            value = np.frombuffer(t.data, dtype=t.dtype).reshape(t.shape).astype(np.float32)
+            if t.scale:
+                # Dynamic-range models keep int8 weights: (q - zero_point) * scale,
+                # per channel along the quantized dimension
+                shape = [1]*len(t.shape)
+                if len(t.scale) > 1:
+                    shape[t.quantized_dimension] = len(t.scale)
+                scale = np.asarray(t.scale, dtype=np.float32).reshape(shape)
+                zero_point = np.asarray(t.zero_point, dtype=np.float32).reshape(shape) \
+                    if len(t.zero_point) == len(t.scale) else np.float32(t.zero_point[0] if t.zero_point else 0)
+                value = (value - zero_point) * scale
+            constants[i] = value
+        return constants[i]
+    # Tensors that only compute the target shape of a RESHAPE (the converter
+    # emits SHAPE/STRIDED_SLICE/PACK for the dynamic batch dimension); the
+    # reshape itself keeps the batch axis, so those operators are skipped
+    shape_only = {op.inputs[1] for op in model.operators if op.opcode == 'RESHAPE' and len(op.inputs) > 1}
+    for op in reversed(model.operators):
+        # SHAPE is not followed: it reads the dimensions of its input, not the data
+        if op.opcode in ('STRIDED_SLICE', 'PACK') and set(op.outputs) <= shape_only:
+            shape_only.update(op.inputs)
+    layers = []
+    for op in model.operators:
+        o = op.options
+        if set(op.outputs) <= shape_only:
+            continue
+        elif op.opcode == 'DEQUANTIZE' and model.tensors[op.inputs[0]].is_constant:
+            # float16 models dequantize their weights once at load time
+            constants[op.outputs[0]] = const(op.inputs[0])
+        elif op.opcode == 'CONV_2D':
+            # TFLite stores OHWI filters
+            kernel = const(op.inputs[1]).transpose(1, 2, 3, 0)
+            bias = const(op.inputs[2]) if len(op.inputs) > 2 and op.inputs[2] >= 0 else np.zeros(kernel.shape[-1])
+            layers.append(Conv2D(kernel, bias, (o['stride_h'], o['stride_w']), o['padding'],
+                                 o['fused_activation_function']))
+        elif op.opcode == 'AVERAGE_POOL_2D':
+            layers.append(AveragePooling2D((o['filter_height'], o['filter_width']),
+                                           (o['stride_h'], o['stride_w']), o['padding'],
+                                           o['fused_activation_function']))
+        elif op.opcode in ('TANH', 'LOGISTIC', 'RELU'):
+            layers.append(Activation(op.opcode))
+        elif op.opcode == 'SOFTMAX':
+            if o.get('beta', 1.0) != 1.0:
+                raise ValueError('softmax beta %g is not supported' % o['beta'])
+            layers.append(Activation('SOFTMAX'))
+        elif op.opcode == 'RESHAPE':
+            layers.append(Reshape(model.tensors[op.outputs[0]].shape[1:]))
+        elif op.opcode == 'FULLY_CONNECTED':
+            # TFLite stores (out, in) weights
+            kernel = const(op.inputs[1]).T
+            bias = const(op.inputs[2]) if len(op.inputs) > 2 and op.inputs[2] >= 0 else np.zeros(kernel.shape[-1])
+            layers.append(Dense(kernel, bias, o['fused_activation_function']))
+        else:
+            raise ValueError('unsupported TFLite operator %s (only float models are supported)' % op.opcode)
+        if layers and not hasattr(layers[-1], 'op_index'):
+            # The TFLite operator a layer came from, for per-op timing
+            layers[-1].op_index = op.index
+    for i in model.inputs:
+        if model.tensors[i].type != 'FLOAT32':
+            raise ValueError('only float32-input models are supported')
+    return layers
+
+
+def load(path, batch_size=1024):
+    if path.endswith('.keras'):
+        return NumpyModel(_from_keras(path), batch_size)
+    return NumpyModel(_from_tflite(path), batch_size)
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    start = time.perf_counter()
+    parser = argparse.ArgumentParser(description='Run LeNet-5 with NumPy only')
+    parser.add_argument('image', type=int, nargs='?', help='index of a single test image to classify')
+    parser.add_argument('--model', default='models/model.tflite', help='.tflite or .keras model (default: models/model.tflite)')
+    parser.add_argument('--batch-size', type=int, default=1024, help='images per GEMM batch (default: 1024)')
+    parser.add_argument('--eval', action='store_true', help='evaluate the whole test split')
+    parser.add_argument('--check', action='store_true', help='compare the scores with the TFLite interpreter')
+    parser.add_argument('--images', type=int, default=1000, help='test images used by --check (default: 1000)')
+    parser.add_argument('--atol', type=float, default=1e-5, help='--check tolerance on the scores (default: 1e-5)')
+    args = parser.parse_args()
+    if args.image is None and not args.eval and not args.check:
+        parser.error('give an image index, --eval or --check')
+
+    from mnist_data import load_mnist
+
+    model = load(args.model, args.batch_size)
+    (_, _), (_, _), (x_test, y_test) = load_mnist()
+    print('startup:      %.1f ms' % (1000*(time.perf_counter()-start)))
+
+    if args.image is not None:
+        scores = model.predict(x_test[args.image:args.image+1])[0]
+        print(scores)
+        print('predicted %d, label %d' % (np.argmax(scores), y_test[args.image]))
+
+    if args.eval:
+        latencies = []
+        t0 = time.perf_counter()
+        scores = model.predict(x_test, latencies)
+        elapsed = time.perf_counter()-t0
+        print('model:        '+args.model)
+        print('images:       %d (batch size %d)' % (len(x_test), args.batch_size))
+        print('accuracy:     %.4f' % np.mean(np.argmax(scores, axis=1) == y_test))
+        print('images/sec:   %.1f' % (len(x_test)/elapsed))
+
+    if args.check:
+        import os
+        os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+        os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+        from tflite_runner import TFLiteRunner
+
+        tflite_path = args.model if args.model.endswith('.tflite') else 'models/model.tflite'
+        x = x_test[:args.images]
+        expected = TFLiteRunner(model_path=tflite_path, batch_size=100).predict(x)
+        scores = model.predict(x)
+        diff = float(np.max(np.abs(scores-expected)))
+        agree = float(np.mean(np.argmax(scores, axis=1) == np.argmax(expected, axis=1)))
+        print('check:        %s vs TFLite %s on %d images' % (args.model, tflite_path, len(x)))
+        print('max abs diff: %.3g (atol %.3g)' % (diff, args.atol))
+        print('argmax agree: %.4f' % agree)
+        if diff > args.atol:
+            sys.exit(1)
@@ -0,0 +1,235 @@
+# lenet_parallel.py
+#
+# Parallel TFLite inference over large image sets with a pool of interpreters
+#
+# Usage: python3 python/lenet_parallel.py [--workers N] [--mode thread|process]
+#                                         [--split test] [--scaling] [--out labels.npy]
+#
+# Thread mode keeps one interpreter per thread (the TFLite invoke releases the
+# GIL) and hands each thread a view of the input array. Process mode keeps one
+# interpreter per process; workers map a .npy file themselves or attach to a
+# shared-memory copy of an in-memory array, so shards are never pickled.
+# Shards are returned in input order either way. The workers and their
+# interpreters are created once by start() (spawning a process and importing
+# TensorFlow takes a while) and reused by every predict() until close().
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+from tflite_runner import TFLiteRunner
+
+# Images per shard handed to a worker; a few batches keeps the pool balanced
+SHARD_BATCHES = 4
+
+
+## Thread mode: one interpreter per pool thread
+
+_local = threading.local()
+
+def _thread_init(model_path, batch_size, num_threads):
+    _local.runner = TFLiteRunner(model_path=model_path, batch_size=batch_size, num_threads=num_threads)
+
+def _thread_shard(x, start, stop, out):
+    out[start:stop] = _local.runner.predict(x[start:stop])
+
+
+## Process mode: one interpreter per worker process
+
+_worker = {}
+
+# Attaches to the parent's segment without registering it with the resource
+# tracker: the parent owns and unlinks it, and a registration from a worker
+# gives a leak warning or a second unlink at exit. Spawned workers share the
+# parent's tracker, so unregistering after attaching would drop the parent's
+# own registration instead.
+def _attach_shm(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def _process_init(model_path, batch_size, num_threads):
+    _worker['runner'] = TFLiteRunner(model_path=model_path, batch_size=batch_size, num_threads=num_threads)
+
+def _process_ready():
+    pass
+
+# Maps the images of source, keeping the last mapping for the next shard
+def _process_source(source):
+    if _worker.get('source') != source:
+        if 'shm' in _worker:
+            del _worker['x']
+            _worker.pop('shm').close()
+        if source[0] == 'npy':
+            _worker['x'] = np.load(source[1], mmap_mode='r')
+        else:
+            _, name, shape, dtype = source
+            _worker['shm'] = _attach_shm(name)
+            _worker['x'] = np.ndarray(shape, dtype=dtype, buffer=_worker['shm'].buf)
+        _worker['source'] = source
+    return _worker['x']
+
+def _process_shard(source, start, stop):
+    return start, _worker['runner'].predict(_process_source(source)[start:stop])
+
+
+## Runs a model over many images with `workers` interpreters
+##   mode: 'thread' or 'process'
+##   num_threads: interpreter threads per worker (1 keeps workers from
+##   oversubscribing the cores)
+class ParallelRunner:
+    def __init__(self, model_path, workers=os.cpu_count(), mode='thread', batch_size=64, num_threads=1):
+        if mode not in ('thread', 'process'):
+            raise ValueError('mode must be "thread" or "process", not '+repr(mode))
+        self.model_path = model_path
+        self.workers = workers
+        self.mode = mode
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.pool = None
+
+    # Starts the workers and waits until every interpreter is loaded
+    def start(self):
+        if self.pool is not None:
+            return self
+        initargs = (self.model_path, self.batch_size, self.num_threads)
+        if self.mode == 'thread':
+            self.pool = ThreadPoolExecutor(self.workers, initializer=_thread_init, initargs=initargs)
+            # a thread pool starts a thread per task that finds no idle thread;
+            # the barrier holds every warm-up task until all threads are up
+            barrier = threading.Barrier(self.workers)
+            ready = [self.pool.submit(barrier.wait) for _ in range(self.workers)]
+        else:
+            # spawn: TensorFlow is not fork-safe once initialised
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_process_init, initargs=initargs)
+            # spawned pools start one process per task that finds no idle worker
+            ready = [self.pool.submit(_process_ready) for _ in range(self.workers)]
+        for f in ready:
+            f.result()
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _shards(self, n):
+        step = self.batch_size*SHARD_BATCHES
+        return [(start, min(start+step, n)) for start in range(0, n, step)]
+
+    # Scores for every image in source, in order
+    #   source: an (N,32,32,1) array, or the path of a .npy file holding one
+    def predict(self, source):
+        if self.mode == 'thread':
+            return self._predict_threads(source)
+        return self._predict_processes(source)
+
+    def _predict_threads(self, source):
+        x = np.load(source, mmap_mode='r') if isinstance(source, str) else source
+        out = np.empty((len(x), 10), dtype=np.float32)
+        self.start()
+        futures = [self.pool.submit(_thread_shard, x, start, stop, out) for start, stop in self._shards(len(x))]
+        for f in futures:
+            f.result()
+        return out
+
+    def _predict_processes(self, source):
+        shm = None
+        if isinstance(source, str):
+            n = len(np.load(source, mmap_mode='r'))
+            spec = ('npy', os.path.abspath(source))
+        else:
+            x = np.ascontiguousarray(source)
+            n = len(x)
+            shm = shared_memory.SharedMemory(create=True, size=max(x.nbytes, 1))
+            np.ndarray(x.shape, dtype=x.dtype, buffer=shm.buf)[:] = x
+            spec = ('shm', shm.name, x.shape, x.dtype.str)
+        out = np.empty((n, 10), dtype=np.float32)
+        try:
+            self.start()
+            shards = self._shards(n)
+            for start, scores in self.pool.map(_process_shard, [spec]*len(shards), *zip(*shards)):
+                out[start:start+len(scores)] = scores
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        return out
+
+
+# Throughput for 1, 2, 4, ... up to max_workers workers, not counting the
+# worker start-up
+def scaling(model_path, source, max_workers, mode='thread', batch_size=64, num_threads=1):
+    counts = sorted({1, max_workers} | {2**i for i in range(1, max_workers.bit_length()) if 2**i < max_workers})
+    rows = []
+    for workers in counts:
+        with ParallelRunner(model_path, workers, mode, batch_size, num_threads) as runner:
+            start = time.perf_counter()
+            scores = runner.predict(source)
+            elapsed = time.perf_counter() - start
+        rows.append({'workers': workers, 'seconds': elapsed, 'images_per_s': len(scores)/elapsed})
+    for row in rows:
+        row['speedup'] = row['images_per_s']/rows[0]['images_per_s']
+        row['efficiency'] = row['speedup']/row['workers']
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Label MNIST images with a pool of TFLite interpreters')
+    parser.add_argument('--model', default='models/model.tflite', help='TFLite model (default: models/model.tflite)')
+    parser.add_argument('--split', default='test', choices=('train', 'val', 'test'), help='cached MNIST split (default: test)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='pool size (default: CPU count)')
+    parser.add_argument('--mode', default='thread', choices=('thread', 'process'), help='worker type (default: thread)')
+    parser.add_argument('--batch-size', type=int, default=64, help='interpreter batch size (default: 64)')
+    parser.add_argument('--num-threads', type=int, default=1, help='threads per interpreter (default: 1)')
+    parser.add_argument('--scaling', action='store_true', help='report throughput from 1 to --workers workers')
+    parser.add_argument('--out', help='write predicted labels to this .npy file')
+    args = parser.parse_args()
+
+    from mnist_data import CACHE_DIR, load_mnist
+    splits = dict(zip(('train', 'val', 'test'), load_mnist()))
+    source = os.path.join(CACHE_DIR, 'x_'+args.split+'.npy')
+    y = splits[args.split][1]
+
+    if args.scaling:
+        rows = scaling(args.model, source, args.workers, args.mode, args.batch_size, args.num_threads)
+        print('{:>8} {:>9} {:>12} {:>8} {:>11}'.format('workers', 'seconds', 'images/sec', 'speedup', 'efficiency'))
+        for r in rows:
+            print('{:>8} {:>9.3f} {:>12.1f} {:>7.2f}x {:>10.0f}%'.format(
+             r['workers'], r['seconds'], r['images_per_s'], r['speedup'], 100*r['efficiency']))
+    else:
+        with ParallelRunner(args.model, args.workers, args.mode, args.batch_size, args.num_threads) as runner:
+            start = time.perf_counter()
+            scores = runner.predict(source)
+            elapsed = time.perf_counter() - start
+        labels = np.argmax(scores, axis=1)
+        print('images:     %d' % len(labels))
+        print('workers:    %d (%s)' % (args.workers, args.mode))
+        print('accuracy:   %.4f' % np.mean(labels == y))
+        print('images/sec: %.1f' % (len(labels)/elapsed))
+        if args.out:
+            np.save(args.out, labels)
@@ -0,0 +1,171 @@
+# lenet_profile.py
+#
+# Per-operator profile of a TFLite model
+#
+# Usage: python3 python/lenet_profile.py [models/model.tflite] [--runs 1000]
+#                                        [--benchmark-model path/to/benchmark_model] [--json out.json]
+#
+# With the TFLite benchmark_model tool (found through --benchmark-model, the
+# BENCHMARK_MODEL environment variable or PATH) the interpreter runs with
+# --enable_op_profiling and XNNPACK disabled, so every builtin kernel is
+# timed on its own; the "Run Order" table is parsed back per operator.
+# Without the tool, the Python interpreter (reference kernels, XNNPACK
+# disabled, 1 thread) is given one operator at a time: every operator is cut
+# out into a single-operator model whose inputs are the tensors it reads, fed
+# with the values of one full inference, and its invoke() is timed over --runs
+# calls, less the cost of invoking an empty model. The report marks which
+# source was used. Shapes and MACs come from the flatbuffer.
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+from tflite_model import macs, read_model
+
+# One row of benchmark_model's "Run Order" table:
+#   [node type] [first] [avg ms] [%] [cdf%] [mem KB] [times called] [Name]
+_ROW = re.compile(r'^\s*(\S+)\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)%\s+([\d.]+)%\s+([\d.]+)\s+(\d+)\s+\[(.*)\]:(\d+)\s*$')
+
+
+# Mean ms per operator index from benchmark_model --enable_op_profiling
+def profile_benchmark_model(tool, model_path, runs):
+    cmd = [tool, '--graph='+model_path, '--num_runs=%d' % runs, '--warmup_runs=10',
+           '--enable_op_profiling=true', '--use_xnnpack=false', '--num_threads=1']
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    text = out.stdout + out.stderr
+    start = text.find('Run Order')
+    if start < 0:
+        raise RuntimeError('no op profile in the benchmark_model output')
+    times = {}
+    for line in text[start:].splitlines()[2:]:
+        m = _ROW.match(line)
+        if m is None:
+            if times:
+                break
+            continue
+        times[int(m.group(9))] = float(m.group(3))
+    return times
+
+
+# Mean ms per operator index from the TFLite interpreter, one operator per
+# invoke
+def profile_interpreter(model_path, runs):
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    import tensorflow as tf
+    from tensorflow.lite.tools import flatbuffer_utils
+
+    def interpreter(content, **kwargs):
+        it = tf.lite.Interpreter(model_content=bytes(content), num_threads=1,
+                                 experimental_op_resolver_type=tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES,
+                                 **kwargs)
+        it.allocate_tensors()
+        return it
+
+    with open(model_path, 'rb') as f:
+        content = f.read()
+    # Every tensor of one full inference, as the inputs of the single operators
+    full = interpreter(content, experimental_preserve_all_tensors=True)
+    rng = np.random.default_rng(0)
+    for d in full.get_input_details():
+        if np.issubdtype(d['dtype'], np.integer):
+            info = np.iinfo(d['dtype'])
+            x = rng.integers(info.min, info.max+1, d['shape'])
+        else:
+            x = rng.integers(0, 256, d['shape'])
+        full.set_tensor(d['index'], x.astype(d['dtype']))
+    full.invoke()
+
+    fb = flatbuffer_utils.convert_bytearray_to_object(bytearray(content))
+    subgraph = fb.subgraphs[0]
+    operators = subgraph.operators
+    def constant(i):
+        data = fb.buffers[subgraph.tensors[i].buffer].data
+        return data is not None and len(data) > 0
+
+    def time_ms(ops, inputs, outputs):
+        subgraph.operators, subgraph.inputs, subgraph.outputs = ops, inputs, outputs
+        it = interpreter(flatbuffer_utils.convert_object_to_bytearray(fb))
+        for i in inputs:
+            it.set_tensor(i, full.get_tensor(i))
+        for _ in range(10):
+            it.invoke()
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            it.invoke()
+        return 1000*(time.perf_counter() - t0)/runs
+
+    model_inputs = list(subgraph.inputs)
+    overhead = time_ms([], model_inputs, model_inputs)
+    times = {}
+    for index, op in enumerate(operators):
+        inputs = [i for i in dict.fromkeys(op.inputs) if i >= 0 and not constant(i)]
+        times[index] = max(time_ms([op], inputs, list(op.outputs)) - overhead, 0.0)
+    return times
+
+
+def report(model, times):
+    total = sum(times.values())
+    rows = []
+    for op in model.operators:
+        if op.index not in times:
+            continue
+        inputs = [model.tensors[i] for i in op.inputs if i >= 0 and not model.tensors[i].is_constant]
+        rows.append({
+            'index': op.index,
+            'op': op.opcode,
+            'input_shape': list(inputs[0].shape) if inputs else [],
+            'output_shape': list(model.tensors[op.outputs[0]].shape),
+            'mean_ms': times[op.index],
+            'share': times[op.index]/total if total else 0.0,
+            'macs': macs(model, op),
+        })
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-operator timing, shapes and MACs of a TFLite model')
+    parser.add_argument('model', nargs='?', default='models/model.tflite', help='model (default: models/model.tflite)')
+    parser.add_argument('--runs', type=int, default=1000, help='timed invocations (default: 1000)')
+    parser.add_argument('--benchmark-model', default=os.environ.get('BENCHMARK_MODEL') or shutil.which('benchmark_model'),
+                        help='TFLite benchmark_model binary (default: $BENCHMARK_MODEL or PATH)')
+    parser.add_argument('--interpreter', action='store_true', help='time single operators in the Python interpreter even if benchmark_model is available')
+    parser.add_argument('--json', help='also write the table to this file')
+    args = parser.parse_args()
+
+    model = read_model(args.model)
+    if args.benchmark_model and not args.interpreter:
+        source = 'tflite benchmark_model (reference kernels, 1 thread)'
+        times = profile_benchmark_model(args.benchmark_model, args.model, args.runs)
+    else:
+        source = 'tflite interpreter, one operator per invoke (reference kernels, 1 thread)'
+        times = profile_interpreter(args.model, args.runs)
+    rows = report(model, times)
+
+    print('model:  %s' % args.model)
+    print('timing: %s, %d runs' % (source, args.runs))
+    print()
+    print('{:>3} {:<16} {:<16} {:<16} {:>9} {:>7} {:>9} {:>9}'.format(
+     '#', 'op', 'input', 'output', 'mean_ms', 'share', 'MACs', 'MMAC/s'))
+    for r in rows:
+        rate = r['macs']/r['mean_ms']/1000 if r['macs'] and r['mean_ms'] else 0
+        print('{:>3} {:<16} {:<16} {:<16} {:>9.4f} {:>6.1f}% {:>9} {:>9}'.format(
+         r['index'], r['op'], 'x'.join(map(str, r['input_shape'])), 'x'.join(map(str, r['output_shape'])),
+         r['mean_ms'], 100*r['share'], r['macs'] or '-', '%.0f' % rate if rate else '-'))
+    total_ms = sum(r['mean_ms'] for r in rows)
+    print('{:>3} {:<16} {:<16} {:<16} {:>9.4f} {:>6.1f}% {:>9}'.format(
+     '', 'total', '', '', total_ms, 100.0, sum(r['macs'] for r in rows)))
+    if rows:
+        hot = max(rows, key=lambda r: r['mean_ms'])
+        print()
+        print('hot op: #%d %s (%.1f%% of the time, %.1f%% of the MACs)' % (
+         hot['index'], hot['op'], 100*hot['share'], 100*hot['macs']/max(sum(r['macs'] for r in rows), 1)))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'model': args.model, 'source': source, 'runs': args.runs, 'operators': rows}, f, indent=2)
@@ -0,0 +1,72 @@
+# lenet_qat.py
+#
+# Quantization-aware fine-tuning of models/model.keras and int8 TFLite export
+#
+# Usage: python3 python/lenet_qat.py [--epochs 5] [--lr 1e-4]
+#
+# The trained float weights are loaded into the same LeNet-5 stack built with
+# tf_keras, wrapped with fake-quant nodes by tensorflow_model_optimization and
+# fine-tuned, so the tanh/sigmoid activations learn to tolerate int8 ranges.
+# The result is converted to a full-integer model with int8 input and output.
+
+import argparse
+import os
+
+parser = argparse.ArgumentParser(description='Quantization-aware fine-tuning of models/model.keras')
+parser.add_argument('--epochs', type=int, default=5, help='fine-tuning epochs (default: 5)')
+parser.add_argument('--batch-size', type=int, default=64, help='batch size (default: 64)')
+parser.add_argument('--lr', type=float, default=1e-4, help='Adam learning rate (default: 1e-4)')
+parser.add_argument('--calibration-samples', type=int, default=500,
+                    help='training images used to calibrate the int8 input/output (default: 500)')
+parser.add_argument('--out', default='models/model_qat_int8.tflite',
+                    help='int8 TFLite output (default: models/model_qat_int8.tflite)')
+args = parser.parse_args()
+
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+import tensorflow as tf
+from int8_params import representative_dataset, write_int8_params
+from lenet_model import load_into
+from mnist_data import load_mnist
+from tflite_runner import TFLiteRunner, evaluate
+
+# tensorflow_model_optimization only supports Keras 2, so the Keras 3 model is
+# rebuilt with tf_keras (load_into) before it is wrapped
+import tf_keras
+import tensorflow_model_optimization as tfmot
+
+
+(x_train,y_train),(x_val,y_val),(x_test,y_test) = load_mnist()
+
+model = load_into('models/model.keras', tf_keras)
+model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+_, float_accuracy = model.evaluate(x_test, y_test, verbose=0)
+
+qat_model = tfmot.quantization.keras.quantize_model(model)
+qat_model.compile(optimizer=tf_keras.optimizers.Adam(args.lr),
+                  loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+qat_model.summary()
+qat_model.fit(x_train, y_train, batch_size=args.batch_size, epochs=args.epochs, validation_data=(x_val, y_val))
+_, qat_accuracy = qat_model.evaluate(x_test, y_test, verbose=0)
+
+
+# The fake-quant ranges cover the weights and activations; the sample only
+# fixes the quantization of the int8 model input and output
+converter = tf.lite.TFLiteConverter.from_keras_model(qat_model)
+converter.optimizations = [tf.lite.Optimize.DEFAULT]
+converter.representative_dataset = representative_dataset(x_train, args.calibration_samples)
+converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+converter.inference_input_type = tf.int8
+converter.inference_output_type = tf.int8
+tflite_model = converter.convert()
+
+with open(args.out, 'wb') as f:
+  f.write(tflite_model)
+write_int8_params(tflite_model, os.path.splitext(args.out)[0]+'_params', args.out)
+
+result, _ = evaluate(TFLiteRunner(model_content=tflite_model, batch_size=100), x_test, y_test)
+print('float keras accuracy: %.4f' % float_accuracy)
+print('qat keras accuracy:   %.4f' % qat_accuracy)
+print('int8 tflite accuracy: %.4f (%s, %.1f KB)' % (result['accuracy'], args.out, len(tflite_model)/1024))
@@ -0,0 +1,146 @@
+# lenet_remote.py
+#
+# Batched LeNet-5 inference on a remote node over TAB COMMON_DATA frames
+#
+# Usage: python3 python/lenet_remote.py [--serial /dev/ttyUSB0 | --tcp host:port] [--images 200]
+#                                       [--window 8] [--baud 921600] [--model models/model.tflite]
+#
+# A 32x32 image is 1024 bytes and a COMMON_DATA payload holds 249, so every
+# image is split into chunks with the reassembly header of tab.py
+# (common_data_chunks) and the chunks of all images are streamed back to back,
+# up to --window frames in flight (tab_async.TabClient). The node acks each
+# chunk and answers the chunk that completes an image with a COMMON_DATA
+# message carrying the 10 class scores as little-endian float32.
+#
+# Without --serial or --tcp, a stand-in node in this process plays the payload
+# side: common_data_message_reply reassembles the images and the TFLite model
+# scores them, behind a simulated link of --baud. The report gives images/s
+# against the line-rate ceiling, the accuracy, and for the stand-in the largest
+# difference to local TFLite scores.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tab', 'python-implementation'))
+import tab
+from tab_async import StandInEndpoint, TabClient, UART_BITS_PER_BYTE
+
+SCORES_DTYPE = np.dtype('<f4')
+
+
+class RemoteLeNet:
+    def __init__(self, client):
+        self.client = client
+        self.msg_seq = 0
+
+    async def _send_chunk(self, payload):
+        cmd = self.client.cmd(tab.COMMON_DATA_OPCODE)
+        cmd.common_data(payload)
+        return await self.client.request(cmd)
+
+    # Sends one image and returns its scores
+    async def _score(self, image, msg_seq):
+        replies = await asyncio.gather(*(self._send_chunk(p) for p in tab.common_data_chunks(msg_seq, image.tobytes())))
+        for reply in replies:
+            if reply[tab.OPCODE_INDEX] == tab.COMMON_NACK_OPCODE:
+                raise RuntimeError('node rejected a chunk of image %d' % msg_seq)
+            if reply[tab.OPCODE_INDEX] == tab.COMMON_DATA_OPCODE:
+                payload = reply[tab.PLD_START_INDEX:reply[tab.MSG_LEN_INDEX]+0x03]
+                if payload[0] | (payload[1] << 8) == msg_seq:
+                    return np.frombuffer(payload[tab.COMMON_DATA_HEADER_LEN:], dtype=SCORES_DTYPE)
+        raise RuntimeError('no scores for image %d' % msg_seq)
+
+    # Scores (N, classes) for a batch of uint8 images
+    async def predict(self, images):
+        images = np.ascontiguousarray(images, dtype=np.uint8)
+        seqs = [(self.msg_seq+i) & 0xffff for i in range(len(images))]
+        self.msg_seq = (self.msg_seq+len(images)) & 0xffff
+        scores = await asyncio.gather(*(self._score(image, seq) for image, seq in zip(images, seqs)))
+        return np.stack(scores)
+
+
+# Stand-in payload node: reassembles images from COMMON_DATA chunks and runs
+# the TFLite model on each
+class InferenceNode(StandInEndpoint):
+    def __init__(self, model_path, **kwargs):
+        super().__init__(**kwargs)
+        from tflite_runner import TFLiteRunner
+        self.runner = TFLiteRunner(model_path=model_path, batch_size=1)
+        self.input_shape = tuple(self.runner.input_details['shape'][1:])
+        self.reply = tab.common_data_message_reply(self.infer)
+
+    def infer(self, msg_seq, data):
+        x = np.frombuffer(data, dtype=np.uint8).reshape((1,)+self.input_shape).astype(np.float32)
+        return self.runner.invoke(x)[0].astype(SCORES_DTYPE).tobytes()
+
+    def respond(self, cmd, tx_cmd_buff):
+        tx_cmd_buff.generate_reply(cmd)
+        if cmd.data[tab.OPCODE_INDEX] == tab.COMMON_DATA_OPCODE:
+            self.reply(tx_cmd_buff, cmd)
+        return True
+
+
+# Uplink bytes per image: its COMMON_DATA frames
+def uplink_bytes(image_size):
+    return sum(len(p)+0x09 for p in tab.common_data_chunks(0, bytes(image_size)))
+
+
+async def main(args):
+    from mnist_data import load_split
+    x, y = load_split(args.split)
+    x, y = np.asarray(x[:args.images]), np.asarray(y[:args.images])
+
+    node = None
+    options = {'window': args.window, 'timeout': args.timeout, 'retries': args.retries}
+    if args.serial:
+        client = await TabClient.open_serial(args.serial, args.baud, **options)
+    else:
+        if not args.tcp:
+            node = InferenceNode(args.model, latency=args.latency, baud=args.baud)
+            host, port = await node.start()
+            args.tcp = '%s:%d' % (host, port)
+            print('stand-in node: %s, %d baud, %.0f ms latency' % (args.model, args.baud, 1000*args.latency))
+        host, port = args.tcp.rsplit(':', 1)
+        client = await TabClient.open_tcp(host, int(port), **options)
+
+    async with client:
+        remote = RemoteLeNet(client)
+        t0 = time.perf_counter()
+        scores = await remote.predict(x)
+        elapsed = time.perf_counter() - t0
+
+    line_rate = args.baud/UART_BITS_PER_BYTE
+    ceiling = line_rate/uplink_bytes(x[0].size)
+    print('images:     %d in %.2f s' % (len(x), elapsed))
+    print('throughput: %.1f images/s, line-rate ceiling %.1f images/s (%.0f%%)' % (
+     len(x)/elapsed, ceiling, 100*len(x)/elapsed/ceiling))
+    print('frames:     %d sent, %d retransmits' % (client.sent, client.retransmits))
+    print('accuracy:   %.4f' % np.mean(np.argmax(scores, axis=1) == y))
+    if node is not None:
+        local = np.concatenate([node.runner.invoke(x[i:i+1].astype(np.float32)) for i in range(len(x))])
+        print('max |remote - local|: %.3g' % np.max(np.abs(scores - local)))
+        await node.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched LeNet-5 inference over TAB COMMON_DATA frames')
+    parser.add_argument('--serial', help='serial port or pty of the payload node')
+    parser.add_argument('--tcp', help='host:port of the payload node')
+    parser.add_argument('--baud', type=int, default=921600, help='line rate (default: 921600)')
+    parser.add_argument('--model', default='models/model.tflite', help='model of the stand-in node (default: models/model.tflite)')
+    parser.add_argument('--split', default='test', choices=('train', 'val', 'test'), help='images to send (default: test)')
+    parser.add_argument('--images', type=int, default=200, help='number of images (default: 200)')
+    parser.add_argument('--window', type=int, default=8, help='frames in flight (default: 8)')
+    parser.add_argument('--timeout', type=float, default=1.0, help='seconds before a retransmit (default: 1.0)')
+    parser.add_argument('--retries', type=int, default=3, help='retransmits per frame (default: 3)')
+    parser.add_argument('--latency', type=float, default=0.002, help='stand-in reply latency in seconds (default: 0.002)')
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -1,67 +1,66 @@
+import argparse
 import os
 
+parser = argparse.ArgumentParser(description='Run the LeNet-5 Keras and TFLite models on MNIST test images')
+parser.add_argument('image', type=int, nargs='?', help='index of a single test image to run and print')
+parser.add_argument('--eval', action='store_true', help='evaluate the whole test split instead of one image')
+parser.add_argument('--batch-size', type=int, default=100, help='interpreter batch size for --eval (default: 100)')
+parser.add_argument('--model', default='models/model.tflite', help='TFLite model (default: models/model.tflite)')
+parser.add_argument('--no-keras', action='store_true', help='skip the Keras agreement check in --eval')
+args = parser.parse_args()
+if args.image is None and not args.eval:
+    parser.error('give an image index or --eval')
+
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
 import tensorflow as tf
-import matplotlib.pyplot as plt
 import numpy as np
-import sys
-from tensorflow.keras import datasets
-
-image = int(sys.argv[1])
+from mnist_data import load_mnist
+from tflite_runner import TFLiteRunner, evaluate
 
 
-(x_train,y_train),(x_test,y_test) = datasets.mnist.load_data()
-print(x_train.shape)
-
-x_train = tf.pad(x_train, [[0, 0], [2,2], [2,2]])#/255
-x_test = tf.pad(x_test, [[0, 0], [2,2], [2,2]])#/255
+(x_train,y_train),(x_val,y_val),(x_test,y_test) = load_mnist()
 print(x_train.shape)
 
-x_train = tf.expand_dims(x_train, axis=3, name=None)
-x_test = tf.expand_dims(x_test, axis=3, name=None)
-print(x_train.shape)
-
-x_val = x_train[-2000:,:,:,:] 
-y_val = y_train[-2000:] 
-x_train = x_train[:-2000,:,:,:] 
-y_train = y_train[:-2000]
-
+if args.eval:
+    reference = None
+    if not args.no_keras:
+        model = tf.keras.models.load_model("models/model.keras")
+        reference = model.predict(x_test, batch_size=args.batch_size, verbose=0)
 
-model = tf.keras.models.load_model("models/model.keras")
+    runner = TFLiteRunner(model_path=args.model, batch_size=args.batch_size)
+    result, _ = evaluate(runner, x_test, y_test, reference)
 
-predictions = model.predict(x_test)
+    print('model:        '+args.model)
+    print('images:       %d (batch size %d)' % (result['images'], result['batch_size']))
+    print('accuracy:     %.4f' % result['accuracy'])
+    print('images/sec:   %.1f' % result['images_per_s'])
+    print('batch p50:    %.3f ms' % result['batch_p50_ms'])
+    print('batch p99:    %.3f ms' % result['batch_p99_ms'])
+    if reference is not None:
+        print('keras agree:  %.4f' % result['agreement'])
+else:
+    image = args.image
 
+    model = tf.keras.models.load_model("models/model.keras")
 
-interpreter = tf.lite.Interpreter(model_path="models/model.tflite")
-interpreter.allocate_tensors()
+    predictions = model.predict(x_test[image:image+1], verbose=0)
 
-# Get input and output tensors.
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
 
-input_data = np.array(np.random.random_sample(input_details[0]['shape']), dtype=np.float32)
-for i in range(32):
-    for j in range(32):
-        input_data[0][i][j][0] = x_test[image][i][j]
-        print(int(input_data[0][i][j][0]), end='\t')
-    print('\n', end='')
-print('\n')
-print(predictions[image])
-for i in range(32):
-    for j in range(32):
-        print(int(x_test[image][i][j]), end='\t')
-        test = 0
-    print('\n', end='')
+    # TFLiteRunner quantizes the input and dequantizes the output of int8
+    # models, so every converted variant prints comparable scores
+    runner = TFLiteRunner(model_path=args.model, batch_size=1)
 
-# Test model on random input data.
-input_shape = input_details[0]['shape']
-#input_data = x_test[0].numpy()
-interpreter.set_tensor(input_details[0]['index'], input_data)
+    input_data = x_test[image:image+1].astype(np.float32)
+    for row in input_data[0, :, :, 0].astype(int):
+        print('\t'.join(map(str, row)))
+    print('\n')
+    print(predictions[0])
+    for row in x_test[image, :, :, 0]:
+        print('\t'.join(map(str, row)))
 
-interpreter.invoke()
-output_data = interpreter.get_tensor(output_details[0]['index'])
-print(output_data)
+    output_data = runner.predict(input_data)
+    print(output_data)
 
-print(y_test[image])
\ No newline at end of file
+    print(y_test[image])
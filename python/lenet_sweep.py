@@ -0,0 +1,170 @@
+# lenet_sweep.py
+#
+# Parallel hyperparameter sweep over the LeNet-5 architecture and optimizer
+#
+# Usage: python3 python/lenet_sweep.py --filters 6,16,120 8,24,120 --activation tanh relu \
+#                                      --lr 1e-3 3e-4 --batch-size 64 128 [--workers 4] [--threads 2]
+#
+# Every combination of the grid is one trial. Trials run in a process pool;
+# each worker caps TensorFlow (and the BLAS/OpenMP pools) at --threads
+# threads, so workers x threads matches the cores instead of every trial
+# fighting for all of them. A trial checkpoints at the end of every epoch with
+# BackupAndRestore, appends its epochs with their wall time to a CSV log and
+# keeps the weights of its best epoch, so rerunning the same command after an
+# interruption resumes unfinished trials from their last epoch and skips
+# finished ones. The results of all trials go into one table (printed, and
+# written as results.json in --out).
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+RESULTS = 'results.json'
+
+
+# Stable directory name for a trial's parameters
+def trial_id(params):
+    key = json.dumps(params, sort_keys=True)
+    return '-'.join(str(params[k]).replace(',', '_') for k in sorted(params))[:60] + '-' + \
+           hashlib.sha1(key.encode()).hexdigest()[:8]
+
+
+# Runs in a fresh worker process; the thread caps have to be in place before
+# TensorFlow creates its thread pools
+def _init_worker(threads):
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+# Rows of a trial's CSV log, one per epoch. An epoch that ran again after an
+# interruption keeps its last row.
+def _read_log(log_path):
+    import csv
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        return list({r['epoch']: r for r in csv.DictReader(f)}.values())
+
+
+def run_trial(params, trial_dir, epochs, patience):
+    import tensorflow as tf
+    from lenet_model import build_model
+    from mnist_data import load_mnist
+
+    result_path = os.path.join(trial_dir, 'result.json')
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            return json.load(f)
+    os.makedirs(trial_dir, exist_ok=True)
+
+    (x_train, y_train), (x_val, y_val), (x_test, y_test) = load_mnist()
+    tf.keras.utils.set_random_seed(0)
+    model = build_model(input_shape=x_train.shape[1:], filters=[int(f) for f in params['filters'].split(',')],
+                        activation=params['activation'])
+    model.compile(optimizer=tf.keras.optimizers.Adam(params['lr']),
+                  loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    log_path = os.path.join(trial_dir, 'epochs.csv')
+    best_path = os.path.join(trial_dir, 'best.weights.h5')
+    # Epochs logged before an interruption; the checkpoint of the best epoch
+    # only gets replaced by a better one after a resume
+    rows = _read_log(log_path)
+    epoch_start = {}
+    callbacks = [tf.keras.callbacks.BackupAndRestore(os.path.join(trial_dir, 'backup')),
+                 tf.keras.callbacks.ModelCheckpoint(best_path, monitor='val_loss', save_best_only=True,
+                                                    save_weights_only=True, initial_value_threshold=min(
+                                                     (float(r['val_loss']) for r in rows), default=None)),
+                 # Adds the epoch's wall time to the logs before the CSVLogger
+                 # writes them, so wall_s covers the epochs of every run
+                 tf.keras.callbacks.LambdaCallback(
+                  on_epoch_begin=lambda epoch, logs: epoch_start.update(t=time.perf_counter()),
+                  on_epoch_end=lambda epoch, logs: logs.update(epoch_s=time.perf_counter()-epoch_start['t'])),
+                 tf.keras.callbacks.CSVLogger(log_path, append=True)]
+    if patience > 0:
+        # The patience counter is not part of the checkpoint, so a resumed
+        # trial waits up to `patience` more epochs
+        callbacks.append(tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience))
+    model.fit(x_train, y_train, batch_size=params['batch_size'], epochs=epochs,
+              validation_data=(x_val, y_val), callbacks=callbacks, verbose=0)
+    # The saved model is the best epoch of all runs of the trial
+    model.load_weights(best_path)
+    _, test_accuracy = model.evaluate(x_test, y_test, batch_size=1000, verbose=0)
+    model.save(os.path.join(trial_dir, 'model.keras'))
+
+    rows = _read_log(log_path)
+    best = min(rows, key=lambda r: float(r['val_loss']))
+    result = dict(params, trial=os.path.basename(trial_dir), params_count=model.count_params(),
+                  epochs=len(rows), best_epoch=int(best['epoch'])+1, val_loss=float(best['val_loss']),
+                  val_accuracy=float(best['val_accuracy']), test_accuracy=float(test_accuracy),
+                  wall_s=sum(float(r['epoch_s']) for r in rows))
+    with open(result_path, 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def print_table(results):
+    print('{:<12} {:<8} {:>8} {:>6} {:>8} {:>7} {:>5} {:>9} {:>8} {:>9} {:>8}'.format(
+     'filters', 'act', 'lr', 'batch', 'params', 'epochs', 'best', 'val_loss', 'val_acc', 'test_acc', 'wall_s'))
+    for r in sorted(results, key=lambda r: r['val_loss']):
+        print('{:<12} {:<8} {:>8.0e} {:>6} {:>8} {:>7} {:>5} {:>9.4f} {:>8.4f} {:>9.4f} {:>8.1f}'.format(
+         r['filters'], r['activation'], r['lr'], r['batch_size'], r['params_count'], r['epochs'],
+         r['best_epoch'], r['val_loss'], r['val_accuracy'], r['test_accuracy'], r['wall_s']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel LeNet-5 hyperparameter sweep with checkpoint/resume')
+    parser.add_argument('--filters', nargs='+', default=['6,16,120'], help='filter counts of the three convolutions (default: 6,16,120)')
+    parser.add_argument('--activation', nargs='+', default=['tanh'], help='convolution/dense activations (default: tanh)')
+    parser.add_argument('--lr', type=float, nargs='+', default=[1e-3], help='Adam learning rates (default: 1e-3)')
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[64], help='batch sizes (default: 64)')
+    parser.add_argument('--epochs', type=int, default=40, help='maximum epochs per trial (default: 40)')
+    parser.add_argument('--patience', type=int, default=5, help='early-stopping patience on val_loss, 0 disables (default: 5)')
+    parser.add_argument('--threads', type=int, default=1, help='threads per trial process (default: 1)')
+    parser.add_argument('--workers', type=int, default=0, help='trial processes, 0 = cores / threads (default: 0)')
+    parser.add_argument('--out', default='build/sweep', help='checkpoints, logs and results (default: build/sweep)')
+    args = parser.parse_args()
+
+    for f in args.filters:
+        if len(f.split(',')) != 3:
+            parser.error('--filters takes three comma-separated counts, e.g. 6,16,120')
+    grid = [{'filters': f, 'activation': a, 'lr': lr, 'batch_size': b}
+            for f, a, lr, b in itertools.product(args.filters, args.activation, args.lr, args.batch_size)]
+    workers = args.workers or max(1, (os.cpu_count() or 1)//args.threads)
+    workers = min(workers, len(grid))
+    print('%d trials, %d workers x %d threads' % (len(grid), workers, args.threads))
+
+    results = []
+    # spawn: TensorFlow is not fork-safe once initialised
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(args.threads,)) as pool:
+        futures = {pool.submit(run_trial, params, os.path.join(args.out, trial_id(params)),
+                               args.epochs, args.patience): params for params in grid}
+        try:
+            for future in as_completed(futures):
+                try:
+                    r = future.result()
+                except Exception as e:
+                    print('trial %s failed: %s' % (futures[future], e))
+                    continue
+                results.append(r)
+                print('done %-40s val_loss %.4f after %d epochs' % (r['trial'], r['val_loss'], r['epochs']))
+        except KeyboardInterrupt:
+            # Do not start the queued trials; rerunning resumes from the checkpoints
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise SystemExit('interrupted, rerun the same command to resume')
+
+    os.makedirs(args.out, exist_ok=True)
+    with open(os.path.join(args.out, RESULTS), 'w') as f:
+        json.dump(results, f, indent=2)
+    print()
+    print_table(results)
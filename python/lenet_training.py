@@ -1,47 +1,75 @@
+import argparse
 import os
 
+parser = argparse.ArgumentParser(description='Train LeNet-5 on MNIST and save models/model.keras')
+parser.add_argument('--pipeline', action='store_true', help='feed model.fit from a tf.data pipeline and report input timing')
+parser.add_argument('--shuffle-buffer', type=int, default=10000, help='tf.data shuffle buffer size (default: 10000)')
+parser.add_argument('--parallel-calls', type=int, default=0, help='tf.data parallel map calls, 0 = AUTOTUNE (default: 0)')
+parser.add_argument('--no-cache', action='store_true', help='do not cache() the tf.data pipeline')
+parser.add_argument('--batch-size', type=int, default=64, help='training batch size (default: 64)')
+parser.add_argument('--epochs', type=int, default=40, help='maximum number of epochs (default: 40)')
+parser.add_argument('--patience', type=int, default=5,
+                    help='stop after this many epochs without a val_loss improvement and restore the best weights, 0 disables (default: 5)')
+parser.add_argument('--jit', action='store_true', help='compile the training step with XLA (jit_compile=True)')
+parser.add_argument('--mixed-precision', nargs='?', const='mixed_float16', choices=('mixed_float16', 'mixed_bfloat16'),
+                    help='train under a mixed-precision policy (default policy: mixed_float16)')
+parser.add_argument('--timing-json', help='write the run settings and per-epoch timing to this file')
+args = parser.parse_args()
+
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
+import json
 import tensorflow as tf
 import matplotlib.pyplot as plt
-from tensorflow.keras import datasets, layers, models, losses
+from tensorflow.keras import losses
+from lenet_model import build_model
+from mnist_data import load_mnist
+from train_pipeline import EpochTimer, make_dataset, stamp_queue
 
 print()
 
-(x_train,y_train),(x_test,y_test) = datasets.mnist.load_data()
+(x_train,y_train),(x_val,y_val),(x_test,y_test) = load_mnist()
 print(x_train.shape)
 
-x_train = tf.pad(x_train, [[0, 0], [2,2], [2,2]])#/255
-x_test = tf.pad(x_test, [[0, 0], [2,2], [2,2]])#/255
-print(x_train.shape)
 
-x_train = tf.expand_dims(x_train, axis=3, name=None)
-x_test = tf.expand_dims(x_test, axis=3, name=None)
-print(x_train.shape)
-
-x_val = x_train[-2000:,:,:,:] 
-y_val = y_train[-2000:] 
-x_train = x_train[:-2000,:,:,:] 
-y_train = y_train[:-2000]
-
-
-model = models.Sequential()
-model.add(layers.Conv2D(6, 5, activation='tanh', input_shape=x_train.shape[1:]))
-model.add(layers.AveragePooling2D(2))
-model.add(layers.Activation('sigmoid'))
-model.add(layers.Conv2D(16, 5, activation='tanh'))
-model.add(layers.AveragePooling2D(2))
-model.add(layers.Activation('sigmoid'))
-model.add(layers.Conv2D(120, 5, activation='tanh'))
-model.add(layers.Flatten())
-model.add(layers.Dense(84, activation='tanh'))
-model.add(layers.Dense(10, activation='softmax'))
+# Under a mixed-precision policy the layers compute in float16/bfloat16 but
+# keep float32 variables; the softmax stays float32
+if args.mixed_precision:
+    tf.keras.mixed_precision.set_global_policy(args.mixed_precision)
+model = build_model(input_shape=x_train.shape[1:], output_dtype='float32' if args.mixed_precision else None)
 model.summary()
 
 
-model.compile(optimizer='adam', loss=losses.sparse_categorical_crossentropy, metrics=['accuracy'])
-history = model.fit(x_train, y_train, batch_size=64, epochs=40, validation_data=(x_val, y_val))
+model.compile(optimizer='adam', loss=losses.sparse_categorical_crossentropy, metrics=['accuracy'],
+              jit_compile=args.jit)
+# In pipeline mode the training batches are stamped as they become ready, so
+# the timer can tell how long each step waited for input
+stamps = stamp_queue() if args.pipeline else None
+timer = EpochTimer(samples=len(x_train), stamps=stamps)
+callbacks = [timer]
+if args.patience > 0:
+    callbacks.append(tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=args.patience,
+                                                      restore_best_weights=True, verbose=1))
+if args.pipeline:
+    train_ds = make_dataset(x_train, y_train, batch_size=args.batch_size, shuffle_buffer=args.shuffle_buffer,
+                            parallel_calls=args.parallel_calls, cache=not args.no_cache, stamps=stamps)
+    val_ds = make_dataset(x_val, y_val, batch_size=args.batch_size, parallel_calls=args.parallel_calls,
+                          cache=not args.no_cache)
+    history = model.fit(train_ds, epochs=args.epochs, validation_data=val_ds, callbacks=callbacks)
+else:
+    history = model.fit(x_train, y_train, batch_size=args.batch_size, epochs=args.epochs,
+                        validation_data=(x_val, y_val), callbacks=callbacks)
+timer.report()
+
+# Save a plain float32 model so conversion and the firmware see the same graph
+# whatever policy was used for training
+if args.mixed_precision:
+    tf.keras.mixed_precision.set_global_policy('float32')
+    trained = model
+    model = build_model(input_shape=x_train.shape[1:])
+    model.set_weights(trained.get_weights())
+    model.compile(optimizer='adam', loss=losses.sparse_categorical_crossentropy, metrics=['accuracy'])
 
 
 
@@ -55,6 +83,10 @@ axs[1].plot(history.history['val_accuracy'])
 axs[1].title.set_text('Training Accuracy vs Validation Accuracy')
 axs[1].legend(['Train', 'Val'])
 
-model.evaluate(x_test, y_test)
+_, test_accuracy = model.evaluate(x_test, y_test)
+
+if args.timing_json:
+    with open(args.timing_json, 'w') as f:
+        json.dump({'settings': vars(args), 'test_accuracy': test_accuracy, 'epochs': timer.epochs}, f, indent=2)
 
 tf.keras.models.save_model(model, "models/model.keras")
\ No newline at end of file
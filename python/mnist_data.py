@@ -0,0 +1,214 @@
+# mnist_data.py
+#
+# Shared, cached MNIST splits for the LeNet-5 scripts
+#
+# The padded 32x32x1 train/val/test splits are built once from the Keras MNIST
+# archive and stored as .npy files. Every script then maps the same files with
+# np.load(mmap_mode='r') instead of re-running tf.pad/tf.expand_dims on all
+# 70k images. The cache is rebuilt when the source archive or the split
+# settings change; without the archive, a cache with matching settings is used
+# as is, so the scripts run offline.
+#
+# Usage: from mnist_data import load_mnist
+#        (x_train,y_train),(x_val,y_val),(x_test,y_test) = load_mnist()
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+# Split settings (must match the model input: 28x28 padded to 32x32)
+PAD = 2
+VAL_SIZE = 2000
+
+# Bump when the on-disk layout of the cache changes
+CACHE_FORMAT = 1
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get('MNIST_CACHE_DIR', os.path.join(REPO_DIR, 'data', 'mnist'))
+
+SPLITS = ('x_train', 'y_train', 'x_val', 'y_val', 'x_test', 'y_test')
+MANIFEST = 'manifest.json'
+
+
+# Location of the archive written by tf.keras.datasets.mnist.load_data()
+def source_path():
+    keras_home = os.environ.get('KERAS_HOME', os.path.join(os.path.expanduser('~'), '.keras'))
+    return os.path.join(keras_home, 'datasets', 'mnist.npz')
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# Make sure the Keras archive exists, downloading it through TensorFlow only
+# when it is missing
+def _ensure_source():
+    path = source_path()
+    if not os.path.exists(path):
+        from tensorflow.keras import datasets
+        datasets.mnist.load_data()
+    return path
+
+
+def _settings(pad, val_size):
+    return {'format': CACHE_FORMAT, 'pad': pad, 'val_size': val_size}
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, obj):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+# Returns True if the cache in cache_dir was built from the current source
+# with the requested settings. A changed mtime alone does not force a rebuild
+# as long as the archive contents hash the same.
+def _cache_valid(cache_dir, src, pad, val_size):
+    manifest = _read_manifest(cache_dir)
+    if manifest is None or manifest.get('settings') != _settings(pad, val_size):
+        return False
+    if not all(os.path.exists(os.path.join(cache_dir, s + '.npy')) for s in SPLITS):
+        return False
+    st = os.stat(src)
+    source = manifest.get('source', {})
+    if source.get('size') == st.st_size and source.get('mtime_ns') == st.st_mtime_ns:
+        return True
+    if source.get('sha256') != _sha256(src):
+        return False
+    source['size'] = st.st_size
+    source['mtime_ns'] = st.st_mtime_ns
+    _write_json(os.path.join(cache_dir, MANIFEST), manifest)
+    return True
+
+
+def _pad(images, pad):
+    # (N,28,28) uint8 -> (N,28+2*pad,28+2*pad,1) uint8
+    return np.pad(images, ((0, 0), (pad, pad), (pad, pad)))[..., np.newaxis]
+
+
+# Build the padded splits from the source archive and write them to cache_dir
+def build_cache(cache_dir=CACHE_DIR, pad=PAD, val_size=VAL_SIZE):
+    src = _ensure_source()
+    os.makedirs(cache_dir, exist_ok=True)
+    with np.load(src) as f:
+        x_train, y_train = f['x_train'], f['y_train']
+        x_test, y_test = f['x_test'], f['y_test']
+    arrays = {
+        'x_train': _pad(x_train[:-val_size], pad),
+        'y_train': y_train[:-val_size],
+        'x_val': _pad(x_train[-val_size:], pad),
+        'y_val': y_train[-val_size:],
+        'x_test': _pad(x_test, pad),
+        'y_test': y_test,
+    }
+    # The manifest is written last, so an interrupted build is never valid
+    manifest_path = os.path.join(cache_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for name, array in arrays.items():
+        tmp = os.path.join(cache_dir, name + '.tmp.npy')
+        np.save(tmp, np.ascontiguousarray(array))
+        os.replace(tmp, os.path.join(cache_dir, name + '.npy'))
+    st = os.stat(src)
+    _write_json(manifest_path, {
+        'settings': _settings(pad, val_size),
+        'source': {
+            'path': src,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': _sha256(src),
+        },
+    })
+
+
+# Build the cache unless it is valid. Without the source archive the cache is
+# trusted as long as its settings match, so TensorFlow is only imported (and
+# the archive downloaded) when there is no usable cache.
+def _ensure_cache(cache_dir, pad, val_size):
+    src = source_path()
+    if os.path.exists(src):
+        valid = _cache_valid(cache_dir, src, pad, val_size)
+    else:
+        manifest = _read_manifest(cache_dir)
+        valid = manifest is not None and manifest.get('settings') == _settings(pad, val_size) and \
+                all(os.path.exists(os.path.join(cache_dir, s + '.npy')) for s in SPLITS)
+    if not valid:
+        build_cache(cache_dir, pad, val_size)
+
+
+# Load the cached splits, building them first if needed. Arrays are uint8
+# images of shape (N,32,32,1) and uint8 labels of shape (N,), read-only and
+# memory-mapped unless mmap_mode=None.
+def load_mnist(cache_dir=CACHE_DIR, pad=PAD, val_size=VAL_SIZE, mmap_mode='r'):
+    _ensure_cache(cache_dir, pad, val_size)
+    a = {s: np.load(os.path.join(cache_dir, s + '.npy'), mmap_mode=mmap_mode) for s in SPLITS}
+    return (a['x_train'], a['y_train']), (a['x_val'], a['y_val']), (a['x_test'], a['y_test'])
+
+
+# Load one cached split, e.g. load_split('test') -> (x_test, y_test)
+def load_split(split='test', cache_dir=CACHE_DIR, pad=PAD, val_size=VAL_SIZE, mmap_mode='r'):
+    if 'x_'+split not in SPLITS:
+        raise ValueError('unknown split %r' % split)
+    _ensure_cache(cache_dir, pad, val_size)
+    return tuple(np.load(os.path.join(cache_dir, s + split + '.npy'), mmap_mode=mmap_mode) for s in ('x_', 'y_'))
+
+
+## Packed test-vector files for the C harnesses (see write_vectors)
+VECTORS_MAGIC = b'MNVX'
+VECTORS_VERSION = 1
+_VECTORS_HEADER = struct.Struct('<4sHHHHII')
+
+
+# Write images (N,H,W,C) uint8 and labels (N,) into one file:
+#   header  magic 'MNVX', u16 version, u16 rows, u16 cols, u16 channels,
+#           u32 count, u32 records offset (all little endian, 20 bytes)
+#   labels  count bytes
+#   records count fixed-size H*W*C byte images, starting 16-byte aligned
+# The file is assembled in memory and written with a single write().
+def write_vectors(path, images, labels):
+    images = np.asarray(images, dtype=np.uint8)
+    n, rows, cols, channels = images.shape
+    offset = (_VECTORS_HEADER.size + n + 15)//16*16
+    buf = np.zeros(offset + images.size, dtype=np.uint8)
+    buf[:_VECTORS_HEADER.size] = np.frombuffer(_VECTORS_HEADER.pack(
+     VECTORS_MAGIC, VECTORS_VERSION, rows, cols, channels, n, offset), dtype=np.uint8)
+    buf[_VECTORS_HEADER.size:_VECTORS_HEADER.size+n] = labels
+    buf[offset:] = images.reshape(-1)
+    with open(path, 'wb') as f:
+        f.write(buf)
+    return len(buf)
+
+
+# Memory-map a file written by write_vectors() -> (images, labels)
+def read_vectors(path):
+    with open(path, 'rb') as f:
+        header = f.read(_VECTORS_HEADER.size)
+    magic, version, rows, cols, channels, n, offset = _VECTORS_HEADER.unpack(header)
+    if magic != VECTORS_MAGIC or version != VECTORS_VERSION:
+        raise ValueError('%s is not a version %d test-vector file' % (path, VECTORS_VERSION))
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+    labels = raw[_VECTORS_HEADER.size:_VECTORS_HEADER.size+n]
+    images = raw[offset:offset+n*rows*cols*channels].reshape(n, rows, cols, channels)
+    return images, labels
+
+
+if __name__ == '__main__':
+    (x_train, y_train), (x_val, y_val), (x_test, y_test) = load_mnist()
+    print('cache:', os.path.abspath(CACHE_DIR))
+    print('train:', x_train.shape, 'val:', x_val.shape, 'test:', x_test.shape)
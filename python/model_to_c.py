@@ -0,0 +1,80 @@
+# model_to_c.py
+#
+# Emit a .tflite model as the C array the firmware links against
+#
+# Usage: python3 python/model_to_c.py [models/model.tflite] [target_x86/model_data]
+#        python3 python/model_to_c.py --check
+#
+# Writes <base>.cc with the model bytes in a 16-byte aligned array and <base>.h
+# with its length and the SHA-256 of the model, so a firmware image can always
+# be traced back to the .tflite it was built from. The files are only rewritten
+# when the model changed, which keeps make from rebuilding the object for
+# nothing. --check exits non-zero if the array is stale.
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+NAME = 'lenet_model_tflite'
+BYTES_PER_LINE = 12
+
+
+# SHA-256 recorded in an emitted header, or None if there is none
+def header_sha256(h_path):
+    try:
+        with open(h_path) as f:
+            m = re.search(r'_SHA256 "([0-9a-f]{64})"', f.read())
+    except OSError:
+        return None
+    return m.group(1) if m else None
+
+
+def write_c_array(tflite_model, base, model_path, name=NAME):
+    digest = hashlib.sha256(tflite_model).hexdigest()
+    cc_path, h_path = base+'.cc', base+'.h'
+    if header_sha256(h_path) == digest and os.path.exists(cc_path):
+        return False
+    guard = os.path.basename(h_path).upper().replace('.', '_')
+    macro = name.upper()
+    with open(h_path, 'w') as f:
+        f.write('// Generated by python/model_to_c.py from '+model_path+'\n\n')
+        f.write('#ifndef '+guard+'\n#define '+guard+'\n\n')
+        f.write('#define %s_SHA256 "%s"\n\n' % (macro, digest))
+        f.write('const unsigned int %s_len = %d;\n' % (name, len(tflite_model)))
+        f.write('extern const unsigned char %s[];\n\n' % name)
+        f.write('#endif // '+guard+'\n')
+    lines = []
+    for i in range(0, len(tflite_model), BYTES_PER_LINE):
+        lines.append('  '+', '.join('0x%02x' % b for b in tflite_model[i:i+BYTES_PER_LINE]))
+    with open(cc_path, 'w') as f:
+        f.write('// Generated by python/model_to_c.py from '+model_path+'\n\n')
+        f.write('#include "'+os.path.basename(h_path)+'"\n\n')
+        f.write('alignas(16) extern const unsigned char %s[] = {\n' % name)
+        f.write(',\n'.join(lines))
+        f.write('\n};\n')
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Emit a .tflite model as a C array')
+    parser.add_argument('model', nargs='?', default='models/model.tflite', help='model (default: models/model.tflite)')
+    parser.add_argument('base', nargs='?', default='target_x86/model_data',
+                        help='output path without extension (default: target_x86/model_data)')
+    parser.add_argument('--check', action='store_true', help='only check that the array matches the model')
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        tflite_model = f.read()
+    digest = hashlib.sha256(tflite_model).hexdigest()
+    if args.check:
+        current = header_sha256(args.base+'.h')
+        if current != digest:
+            print('%s.cc is stale: %s has sha256 %s, array has %s' % (args.base, args.model, digest, current))
+            sys.exit(1)
+        print('%s.cc matches %s (%s)' % (args.base, args.model, digest))
+    elif write_c_array(tflite_model, args.base, args.model):
+        print('wrote %s.cc/.h (%d bytes, sha256 %s)' % (args.base, len(tflite_model), digest))
+    else:
+        print('%s.cc/.h up to date' % args.base)
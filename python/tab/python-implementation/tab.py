@@ -10,6 +10,7 @@
 # import Python modules
 import datetime # datetime
 import enum     # Enum
+import json     # dumps
 import math     # floor
 
 # "constants"
@@ -93,15 +94,26 @@ class RxCmdBuffState(enum.Enum):
   PLD          = 0x09
   COMPLETE     = 0x0a
 
+## Zero-filled frames copied into the buffers by clear()
+CMD_ZEROS = bytes(CMD_MAX_LEN)
+PLD_ZEROS = bytes(PLD_MAX_LEN)
+
 ## Common Data buffer
+##   data is a preallocated bytearray that clear() zeroes in place
 class CommonDataBuff:
+  __slots__ = ('end_index', 'data')
+
   def __init__(self):
     self.end_index = 0
-    self.data = [0x00]*PLD_MAX_LEN
+    self.data = bytearray(PLD_MAX_LEN)
 
   def clear(self):
     self.end_index = 0
-    self.data = [0x00]*PLD_MAX_LEN
+    self.data[:] = PLD_ZEROS
+
+  ## Zero-copy view of the received bytes, data[:end_index]
+  def payload(self):
+    return memoryview(self.data)[:self.end_index]
 
 ## CommonDataBuff instantiation
 common_data_buff = CommonDataBuff()
@@ -110,19 +122,79 @@ common_data_buff = CommonDataBuff()
 def handle_common_data(common_data_buff):
   return False
 
+## Messages longer than one COMMON_DATA payload are split into chunks, each
+## payload starting with a reassembly header:
+##   msg_seq (16 bits, little endian), chunk_index, chunk_count
+COMMON_DATA_HEADER_LEN = 4
+COMMON_DATA_CHUNK_LEN  = PLD_MAX_LEN-COMMON_DATA_HEADER_LEN
+
+## Splits data into COMMON_DATA payloads of message msg_seq
+def common_data_chunks(msg_seq, data):
+  count = max(1, (len(data)+COMMON_DATA_CHUNK_LEN-1)//COMMON_DATA_CHUNK_LEN)
+  if count > 0xff:
+    raise ValueError('message of '+str(len(data))+' bytes needs more than 255 chunks')
+  for i in range(count):
+    yield bytes([msg_seq & 0xff, (msg_seq >> 8) & 0xff, i, count]) + \
+     bytes(data[i*COMMON_DATA_CHUNK_LEN:(i+1)*COMMON_DATA_CHUNK_LEN])
+
+## Reassembly buffer for chunked COMMON_DATA messages
+##   Chunks may arrive out of order or more than once (retransmits). At most
+##   max_messages incomplete messages are kept; the oldest is dropped first.
+class CommonDataReassembly:
+  __slots__ = ('max_messages', 'messages')
+
+  def __init__(self, max_messages=16):
+    self.max_messages = max_messages
+    self.messages = {}
+
+  ## Adds one payload; returns (msg_seq, data) when it completes a message,
+  ## None otherwise, and raises ValueError for a malformed header
+  def add(self, payload):
+    if len(payload) < COMMON_DATA_HEADER_LEN:
+      raise ValueError('COMMON_DATA payload shorter than the reassembly header')
+    msg_seq = payload[0] | (payload[1] << 8)
+    index, count = payload[2], payload[3]
+    if index >= count:
+      raise ValueError('chunk '+str(index)+' of '+str(count))
+    chunks = self.messages.get(msg_seq)
+    if chunks is None or len(chunks) != count:
+      if len(self.messages) >= self.max_messages:
+        del self.messages[next(iter(self.messages))]
+      chunks = self.messages[msg_seq] = [None]*count
+    chunks[index] = bytes(payload[COMMON_DATA_HEADER_LEN:])
+    if None in chunks:
+      return None
+    del self.messages[msg_seq]
+    return msg_seq, b''.join(chunks)
+
 ## RX command buffer
+##   data is a preallocated bytearray that clear() zeroes in place; frame() and
+##   payload() are views of it, so they change with the next received frame
 class RxCmdBuff:
+  __slots__ = ('state', 'start_index', 'end_index', 'data')
+
   def __init__(self):
     self.state = RxCmdBuffState.START_BYTE_0
     self.start_index = 0
     self.end_index = 0
-    self.data = [0x00]*CMD_MAX_LEN
+    self.data = bytearray(CMD_MAX_LEN)
 
   def clear(self):
     self.state = RxCmdBuffState.START_BYTE_0
     self.start_index = 0
     self.end_index = 0
-    self.data = [0x00]*CMD_MAX_LEN
+    self.data[:] = CMD_ZEROS
+
+  def get_byte_count(self):
+    return self.data[MSG_LEN_INDEX]+0x03
+
+  ## Zero-copy view of the frame, data[:get_byte_count()]
+  def frame(self):
+    return memoryview(self.data)[:self.get_byte_count()]
+
+  ## Zero-copy view of the payload
+  def payload(self):
+    return memoryview(self.data)[PLD_START_INDEX:self.get_byte_count()]
 
   def append_byte(self, b):
     if self.state == RxCmdBuffState.START_BYTE_0:
@@ -173,6 +245,78 @@ class RxCmdBuff:
     elif self.state == RxCmdBuffState.COMPLETE:
       pass
 
+  ## Parses a chunk of received bytes and yields self once per complete frame
+  ##   buffer: bytes, bytearray, memoryview, or anything else of 8-bit values
+  ## The frame is valid until the generator resumes, at which point the buffer
+  ## is cleared and parsing continues; copy data to keep a frame. Frames split
+  ## across chunks are carried over in the buffer state, so feed and
+  ## append_byte can be mixed. Resynchronization is the same as append_byte:
+  ## a wrong second start byte or a message length below 0x06 drops the bytes
+  ## read so far, including the offending byte, and the search restarts after
+  ## it.
+  def feed(self, buffer):
+    if not isinstance(buffer, (bytes, bytearray)):
+      buffer = bytes(buffer)
+    view = memoryview(buffer)
+    n = len(buffer)
+    i = 0
+    if self.state == RxCmdBuffState.COMPLETE:
+      yield self
+      self.clear()
+    # finish a frame started in an earlier chunk
+    while i < n and self.state != RxCmdBuffState.START_BYTE_0:
+      i += self._append_partial(view[i:])
+      if self.state == RxCmdBuffState.COMPLETE:
+        yield self
+        self.clear()
+    while i < n:
+      i = buffer.find(START_BYTE_0, i)
+      if i < 0:
+        break
+      if i+MSG_LEN_INDEX >= n:
+        # start of a frame at the end of the chunk
+        i += self._append_partial(view[i:])
+        continue
+      if buffer[i+START_BYTE_1_INDEX] != START_BYTE_1:
+        i += START_BYTE_1_INDEX+1
+        continue
+      msg_len = buffer[i+MSG_LEN_INDEX]
+      if msg_len < 0x06:
+        i += MSG_LEN_INDEX+1
+        continue
+      end = i+msg_len+0x03
+      if end > n:
+        # the rest of the chunk is the start of this frame
+        i += self._append_partial(view[i:])
+        continue
+      self.data[0:end-i] = view[i:end]
+      self.start_index = msg_len+0x03
+      self.end_index = msg_len+0x03
+      self.state = RxCmdBuffState.COMPLETE
+      yield self
+      self.clear()
+      i = end
+
+  ## Appends the bytes of view up to the end of the current frame, or up to a
+  ## resynchronization, copying the payload in one slice; returns the number
+  ## of bytes consumed
+  def _append_partial(self, view):
+    i = 0
+    while i < len(view) and self.state != RxCmdBuffState.COMPLETE:
+      if self.state == RxCmdBuffState.PLD:
+        count = min(self.end_index-self.start_index, len(view)-i)
+        self.data[self.start_index:self.start_index+count] = view[i:i+count]
+        self.start_index += count
+        i += count
+        if self.start_index == self.end_index:
+          self.state = RxCmdBuffState.COMPLETE
+      else:
+        self.append_byte(view[i])
+        i += 1
+        if self.state == RxCmdBuffState.START_BYTE_0:
+          break
+    return i
+
   def __str__(self):
     if self.state == RxCmdBuffState.COMPLETE:
       return cmd_bytes_to_str(self.data)
@@ -180,18 +324,33 @@ class RxCmdBuff:
       pass
 
 ## TX command buffer
+##   data is a preallocated bytearray that clear() zeroes in place
 class TxCmdBuff:
+  __slots__ = ('empty', 'start_index', 'end_index', 'data')
+
   def __init__(self):
     self.empty = True
     self.start_index = 0
     self.end_index = 0
-    self.data = [0x00]*CMD_MAX_LEN
+    self.data = bytearray(CMD_MAX_LEN)
 
   def clear(self):
     self.empty = True
     self.start_index = 0
     self.end_index = 0
-    self.data = [0x00]*CMD_MAX_LEN
+    self.data[:] = CMD_ZEROS
+
+  def get_byte_count(self):
+    return self.data[MSG_LEN_INDEX]+0x03
+
+  ## Zero-copy view of the frame, data[:get_byte_count()]; write it to the
+  ## serial port as is
+  def frame(self):
+    return memoryview(self.data)[:self.get_byte_count()]
+
+  ## Zero-copy view of the payload
+  def payload(self):
+    return memoryview(self.data)[PLD_START_INDEX:self.get_byte_count()]
 
   def generate_reply(self, rx_cmd_buff):
     if rx_cmd_buff.state==RxCmdBuffState.COMPLETE and self.empty:
@@ -204,94 +363,9 @@ class TxCmdBuff:
       self.data[ROUTE_INDEX] = \
        (0x0f & rx_cmd_buff.data[ROUTE_INDEX]) << 4 | \
        (0xf0 & rx_cmd_buff.data[ROUTE_INDEX]) >> 4;
-      if rx_cmd_buff.data[OPCODE_INDEX] == COMMON_ACK_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_ACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == COMMON_NACK_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == COMMON_DEBUG_OPCODE:
-        self.data[MSG_LEN_INDEX] = rx_cmd_buff.data[MSG_LEN_INDEX]
-        self.data[OPCODE_INDEX] = COMMON_DEBUG_OPCODE
-        for i in range(PLD_START_INDEX,rx_cmd_buff.end_index):
-          self.data[i] = rx_cmd_buff.data[i]
-      elif rx_cmd_buff.data[OPCODE_INDEX] == COMMON_DATA_OPCODE:
-        # handle common data
-        for i in range(PLD_START_INDEX,rx_cmd_buff.end_index):
-          common_data_buff.data[i-PLD_START_INDEX] = rx_cmd_buff.data[i]
-        common_data_buff.end_index = rx_cmd_buff.end_index-PLD_START_INDEX
-        success = handle_common_data(common_data_buff)
-        # reply
-        if success:
-          self.data[MSG_LEN_INDEX] = 0x06
-          self.data[OPCODE_INDEX] = COMMON_ACK_OPCODE
-        else:
-          self.data[MSG_LEN_INDEX] = 0x06
-          self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == COMMON_WRITE_EXT_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == COMMON_ERASE_SECTOR_EXT_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == COMMON_READ_EXT_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_ACK_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_NACK_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_PING_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_ERASE_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_ADDR32_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_JUMP_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == BOOTLOADER_POWER_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x07
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-        self.data[PLD_START_INDEX] = 0x01
-      elif rx_cmd_buff.data[OPCODE_INDEX] == APP_GET_TELEM_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x54
-        self.data[OPCODE_INDEX] = APP_TELEM_OPCODE
-        for i in range(0,self.data[MSG_LEN_INDEX]-0x06):
-          self.data[PLD_START_INDEX+i] = 0x00
-      elif rx_cmd_buff.data[OPCODE_INDEX] == APP_GET_TIME_OPCODE:
-        td  = datetime.datetime.now(tz=datetime.timezone.utc) - J2000
-        sec = math.floor(td.total_seconds())
-        ns  = td.microseconds * 1000
-        sec_bytes = bytearray(sec.to_bytes(4,'little'))
-        ns_bytes  = bytearray( ns.to_bytes(4,"little"))
-        self.data[MSG_LEN_INDEX] = 0x0e
-        self.data[OPCODE_INDEX] = APP_SET_TIME_OPCODE
-        self.data[PLD_START_INDEX+0] = sec_bytes[0]
-        self.data[PLD_START_INDEX+1] = sec_bytes[1]
-        self.data[PLD_START_INDEX+2] = sec_bytes[2]
-        self.data[PLD_START_INDEX+3] = sec_bytes[3]
-        self.data[PLD_START_INDEX+4] =  ns_bytes[0]
-        self.data[PLD_START_INDEX+5] =  ns_bytes[1]
-        self.data[PLD_START_INDEX+6] =  ns_bytes[2]
-        self.data[PLD_START_INDEX+7] =  ns_bytes[3]
-      elif rx_cmd_buff.data[OPCODE_INDEX] == APP_REBOOT_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == APP_SET_TIME_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
-      elif rx_cmd_buff.data[OPCODE_INDEX] == APP_TELEM_OPCODE:
-        self.data[MSG_LEN_INDEX] = 0x06
-        self.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
+      entry = OPCODES.get(rx_cmd_buff.data[OPCODE_INDEX])
+      if entry is not None and entry.reply is not None:
+        entry.reply(self, rx_cmd_buff)
 
 # Helper functions
 
@@ -326,6 +400,266 @@ def route_to_str(route,node):
   else:
     return '???'
 
+## Route nibble -> route_to_str name
+ROUTE_NAMES = tuple(route_to_str(nibble,Route.DST) for nibble in range(16))
+
+# Opcode registry
+
+## Registry entry for one opcode
+##   name: command name used by cmd_bytes_to_str
+##   msg_len: MSG_LEN of a new TxCmd with this opcode
+##   encode: fills the default payload of a new TxCmd, encode(data)
+##   decode: payload string for cmd_bytes_to_str, decode(data)
+##   parse: payload fields of a CmdRecord as a dict, parse(payload)
+##   reply: writes MSG_LEN, OPCODE and payload of the reply generated by
+##    TxCmdBuff.generate_reply, reply(tx_cmd_buff, rx_cmd_buff)
+class Opcode:
+  __slots__ = ('opcode', 'name', 'msg_len', 'encode', 'decode', 'parse', 'reply')
+
+  def __init__(self, opcode, name, msg_len, encode, decode, parse, reply):
+    self.opcode = opcode
+    self.name = name
+    self.msg_len = msg_len
+    self.encode = encode
+    self.decode = decode
+    self.parse = parse
+    self.reply = reply
+
+## Opcode value -> Opcode
+OPCODES = {}
+
+## Adds or replaces the registry entry of an opcode
+def register_opcode(opcode, name, msg_len=0x06, encode=None, decode=None, parse=None, reply=None):
+  OPCODES[opcode] = Opcode(opcode, name, msg_len, encode, decode, parse, reply)
+  return OPCODES[opcode]
+
+## Replaces the reply handler of a registered opcode
+def register_reply(opcode, reply):
+  OPCODES[opcode].reply = reply
+
+## Big-endian 32-bit address at data[index:index+4]
+def addr_from_bytes(data, index):
+  return (data[index+0]<<24)|(data[index+1]<<16)|(data[index+2]<<8)|(data[index+3]<<0)
+
+## Bytes as ' 0x..' per byte, formatted in bulk
+def hex_bytes_to_str(data):
+  if not data:
+    return ''
+  return ' 0x'+bytes(data).hex(' ').replace(' ',' 0x')
+
+## Payload decoders
+
+def decode_common_debug(data):
+  return ' "'+bytes(data[PLD_START_INDEX:PLD_START_INDEX+data[MSG_LEN_INDEX]-0x06]).decode('latin-1')+'"'
+
+def decode_common_data(data):
+  return ' Data:'+hex_bytes_to_str(data[PLD_START_INDEX:PLD_START_INDEX+data[MSG_LEN_INDEX]-0x06])
+
+def decode_common_write_ext(data):
+  return ' Address: 0x{:08x}'.format(addr_from_bytes(data,PLD_START_INDEX+1))+' Data:'+\
+   hex_bytes_to_str(data[PLD_START_INDEX+5:PLD_START_INDEX+5+data[MSG_LEN_INDEX]-0x0b])
+
+def decode_common_erase_sector_ext(data):
+  return ' Address: 0x{:08x}'.format(addr_from_bytes(data,PLD_START_INDEX+1))
+
+def decode_common_read_ext(data):
+  return ' Address: 0x{:08x}'.format(addr_from_bytes(data,PLD_START_INDEX+1))+\
+   ' Length: 0x{:02x}'.format(data[PLD_START_INDEX+5])
+
+def decode_bootloader_ack(data):
+  pld_str = ''
+  if data[MSG_LEN_INDEX] == 0x07:
+    pld_str += ' reason:'+'0x{:02x}'.format(data[PLD_START_INDEX])+\
+     '('+bootloader_ack_reason_to_str(data[PLD_START_INDEX])+')'
+  if data[MSG_LEN_INDEX] == 0x0a:
+    pld_str += ' reason:'+'0x{:08x}'.format(addr_from_bytes(data,PLD_START_INDEX))+'(addr)'
+  return pld_str
+
+def decode_bootloader_write_page(data):
+  pld_str = ' subpage_id:'+str(data[PLD_START_INDEX])
+  if data[MSG_LEN_INDEX] == 0x87:
+    pld_str += ' hex_data:'+bytes(data[PLD_START_INDEX+1:PLD_START_INDEX+1+0x80]).hex()
+  return pld_str
+
+def decode_bootloader_write_page_addr32(data):
+  pld_str = ' Address: 0x{:08x}'.format(addr_from_bytes(data,PLD_START_INDEX))
+  if data[MSG_LEN_INDEX] == 0x8a:
+    pld_str += ' hex_data:'+bytes(data[PLD_START_INDEX+4:PLD_START_INDEX+4+0x80]).hex()
+  return pld_str
+
+def decode_app_set_time(data):
+  sec = (data[PLD_START_INDEX+0]<<0)|(data[PLD_START_INDEX+1]<<8)|\
+        (data[PLD_START_INDEX+2]<<16)|(data[PLD_START_INDEX+3]<<24)
+  ns  = (data[PLD_START_INDEX+4]<<0)|(data[PLD_START_INDEX+5]<<8)|\
+        (data[PLD_START_INDEX+6]<<16)|(data[PLD_START_INDEX+7]<<24)
+  return ' sec:'+str(sec)+' ns:'+str(ns)
+
+## Payload parsers; payload is the bytes after OPCODE, data fields are bytes
+
+def parse_common_debug(payload):
+  return {'text': payload.decode('latin-1')}
+
+def parse_common_data(payload):
+  return {'data': payload}
+
+def parse_common_write_ext(payload):
+  return {'address': int.from_bytes(payload[1:5],'big'), 'data': payload[5:]}
+
+def parse_common_erase_sector_ext(payload):
+  return {'address': int.from_bytes(payload[1:5],'big')}
+
+def parse_common_read_ext(payload):
+  return {'address': int.from_bytes(payload[1:5],'big'), 'length': payload[5]}
+
+def parse_bootloader_ack(payload):
+  if len(payload) == 0x01:
+    return {'reason': payload[0], 'reason_str': bootloader_ack_reason_to_str(payload[0])}
+  if len(payload) == 0x04:
+    return {'address': int.from_bytes(payload,'big')}
+  return {}
+
+def parse_bootloader_write_page(payload):
+  return {'subpage_id': payload[0], 'data': payload[1:]}
+
+def parse_bootloader_write_page_addr32(payload):
+  return {'address': int.from_bytes(payload[0:4],'big'), 'data': payload[4:]}
+
+def parse_app_set_time(payload):
+  return {'sec': int.from_bytes(payload[0:4],'little'), 'ns': int.from_bytes(payload[4:8],'little')}
+
+## Default payload encoders
+
+def encode_common_write_ext(data):
+  data[PLD_START_INDEX+5] = 0x01
+
+## Reply handlers
+
+def reply_ack(tx_cmd_buff, rx_cmd_buff):
+  tx_cmd_buff.data[MSG_LEN_INDEX] = 0x06
+  tx_cmd_buff.data[OPCODE_INDEX] = COMMON_ACK_OPCODE
+
+def reply_nack(tx_cmd_buff, rx_cmd_buff):
+  tx_cmd_buff.data[MSG_LEN_INDEX] = 0x06
+  tx_cmd_buff.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
+
+def reply_common_debug(tx_cmd_buff, rx_cmd_buff):
+  tx_cmd_buff.data[MSG_LEN_INDEX] = rx_cmd_buff.data[MSG_LEN_INDEX]
+  tx_cmd_buff.data[OPCODE_INDEX] = COMMON_DEBUG_OPCODE
+  tx_cmd_buff.data[PLD_START_INDEX:rx_cmd_buff.end_index] = \
+   rx_cmd_buff.data[PLD_START_INDEX:rx_cmd_buff.end_index]
+
+## Reply handler for COMMON_DATA that copies the payload to common_data_buff
+## and acks if handler(common_data_buff) returns True, e.g.
+##   register_reply(COMMON_DATA_OPCODE, common_data_reply(my_handler))
+## Without a handler, the module-global handle_common_data is called
+def common_data_reply(handler=None):
+  def reply(tx_cmd_buff, rx_cmd_buff):
+    common_data_buff.end_index = rx_cmd_buff.end_index-PLD_START_INDEX
+    common_data_buff.data[0:common_data_buff.end_index] = \
+     rx_cmd_buff.data[PLD_START_INDEX:rx_cmd_buff.end_index]
+    if (handler or handle_common_data)(common_data_buff):
+      reply_ack(tx_cmd_buff, rx_cmd_buff)
+    else:
+      reply_nack(tx_cmd_buff, rx_cmd_buff)
+  return reply
+
+## Reply handler for COMMON_DATA carrying chunked messages. Each payload goes
+## through common_data_buff into reassembly; when a message is complete,
+## handler(msg_seq, data) runs and its return value, if not None, is sent back
+## as a one-chunk COMMON_DATA message with the same msg_seq (so at most
+## COMMON_DATA_CHUNK_LEN bytes). Other chunks are
+## acked, malformed ones nacked. The last max_replies replies are kept and
+## sent again if the chunk that completed a message is retransmitted; a new
+## message that reuses the msg_seq is reassembled as usual.
+def common_data_message_reply(handler, reassembly=None, max_replies=16):
+  reassembly = reassembly if reassembly is not None else CommonDataReassembly()
+  replies = {}
+  def reply(tx_cmd_buff, rx_cmd_buff):
+    common_data_buff.end_index = rx_cmd_buff.end_index-PLD_START_INDEX
+    common_data_buff.data[0:common_data_buff.end_index] = \
+     rx_cmd_buff.data[PLD_START_INDEX:rx_cmd_buff.end_index]
+    payload = common_data_buff.payload()
+    msg_seq = payload[0] | (payload[1] << 8) if len(payload) >= 2 else None
+    cached = replies.get(msg_seq)
+    if cached is not None and cached[0] == payload:
+      answer = cached[1]
+    else:
+      answer = None
+      try:
+        message = reassembly.add(payload)
+      except ValueError:
+        reply_nack(tx_cmd_buff, rx_cmd_buff)
+        return
+      if message is not None:
+        result = handler(*message)
+        if result is not None and len(result) > COMMON_DATA_CHUNK_LEN:
+          raise ValueError('reply of '+str(len(result))+' bytes does not fit one COMMON_DATA payload')
+        answer = None if result is None else next(common_data_chunks(msg_seq, result))
+        replies.pop(msg_seq, None)
+        if len(replies) >= max_replies:
+          del replies[next(iter(replies))]
+        replies[msg_seq] = (bytes(payload), answer)
+    if answer is None:
+      reply_ack(tx_cmd_buff, rx_cmd_buff)
+    else:
+      tx_cmd_buff.data[MSG_LEN_INDEX] = 0x06+len(answer)
+      tx_cmd_buff.data[OPCODE_INDEX] = COMMON_DATA_OPCODE
+      tx_cmd_buff.data[PLD_START_INDEX:PLD_START_INDEX+len(answer)] = answer
+  return reply
+
+def reply_bootloader_power(tx_cmd_buff, rx_cmd_buff):
+  tx_cmd_buff.data[MSG_LEN_INDEX] = 0x07
+  tx_cmd_buff.data[OPCODE_INDEX] = COMMON_NACK_OPCODE
+  tx_cmd_buff.data[PLD_START_INDEX] = 0x01
+
+def reply_app_get_telem(tx_cmd_buff, rx_cmd_buff):
+  tx_cmd_buff.data[MSG_LEN_INDEX] = 0x54
+  tx_cmd_buff.data[OPCODE_INDEX] = APP_TELEM_OPCODE
+  tx_cmd_buff.data[PLD_START_INDEX:PLD_START_INDEX+0x54-0x06] = bytes(0x54-0x06)
+
+def reply_app_get_time(tx_cmd_buff, rx_cmd_buff):
+  td  = datetime.datetime.now(tz=datetime.timezone.utc) - J2000
+  sec = math.floor(td.total_seconds())
+  ns  = td.microseconds * 1000
+  tx_cmd_buff.data[MSG_LEN_INDEX] = 0x0e
+  tx_cmd_buff.data[OPCODE_INDEX] = APP_SET_TIME_OPCODE
+  tx_cmd_buff.data[PLD_START_INDEX+0:PLD_START_INDEX+4] = sec.to_bytes(4,'little')
+  tx_cmd_buff.data[PLD_START_INDEX+4:PLD_START_INDEX+8] =  ns.to_bytes(4,'little')
+
+## Built-in opcodes
+register_opcode(COMMON_ACK_OPCODE, 'common_ack', reply=reply_ack)
+register_opcode(COMMON_NACK_OPCODE, 'common_nack', reply=reply_nack)
+register_opcode(COMMON_DEBUG_OPCODE, 'common_debug',\
+ decode=decode_common_debug, parse=parse_common_debug, reply=reply_common_debug)
+register_opcode(COMMON_DATA_OPCODE, 'common_data',\
+ decode=decode_common_data, parse=parse_common_data, reply=common_data_reply())
+register_opcode(COMMON_WRITE_EXT_OPCODE, 'common_write_ext', 0x0b,\
+ encode=encode_common_write_ext, decode=decode_common_write_ext,\
+ parse=parse_common_write_ext, reply=reply_nack)
+register_opcode(COMMON_ERASE_SECTOR_EXT_OPCODE, 'common_erase_sector_ext', 0x0b,\
+ decode=decode_common_erase_sector_ext,\
+ parse=parse_common_erase_sector_ext, reply=reply_nack)
+register_opcode(COMMON_READ_EXT_OPCODE, 'common_read_ext', 0x0b,\
+ decode=decode_common_read_ext, parse=parse_common_read_ext, reply=reply_nack)
+register_opcode(BOOTLOADER_ACK_OPCODE, 'bootloader_ack',\
+ decode=decode_bootloader_ack, parse=parse_bootloader_ack, reply=reply_nack)
+register_opcode(BOOTLOADER_NACK_OPCODE, 'bootloader_nack', reply=reply_nack)
+register_opcode(BOOTLOADER_PING_OPCODE, 'bootloader_ping', reply=reply_nack)
+register_opcode(BOOTLOADER_ERASE_OPCODE, 'bootloader_erase', reply=reply_nack)
+register_opcode(BOOTLOADER_WRITE_PAGE_OPCODE, 'bootloader_write_page', 0x07,\
+ decode=decode_bootloader_write_page, parse=parse_bootloader_write_page, reply=reply_nack)
+register_opcode(BOOTLOADER_WRITE_PAGE_ADDR32_OPCODE, 'bootloader_write_page_addr32', 0x0a,\
+ decode=decode_bootloader_write_page_addr32,\
+ parse=parse_bootloader_write_page_addr32, reply=reply_nack)
+register_opcode(BOOTLOADER_JUMP_OPCODE, 'bootloader_jump', reply=reply_nack)
+register_opcode(BOOTLOADER_POWER_OPCODE, 'bootloader_power', 0x07, reply=reply_bootloader_power)
+register_opcode(APP_GET_TELEM_OPCODE, 'app_get_telem', reply=reply_app_get_telem)
+register_opcode(APP_GET_TIME_OPCODE, 'app_get_time', reply=reply_app_get_time)
+register_opcode(APP_REBOOT_OPCODE, 'app_reboot', reply=reply_nack)
+register_opcode(APP_SET_TIME_OPCODE, 'app_set_time', 0x0e,\
+ decode=decode_app_set_time, parse=parse_app_set_time, reply=reply_nack)
+register_opcode(APP_TELEM_OPCODE, '', reply=reply_nack) # unnamed in cmd_bytes_to_str
+
 ## Converts a list of command bytes (ints) to a human-readable string
 ##   data: a list of 8-bit, unsigned integers
 def cmd_bytes_to_str(data):
@@ -333,95 +667,11 @@ def cmd_bytes_to_str(data):
   cmd_str = ''
   pld_str = ''
   # command-specific string construction
-  if data[OPCODE_INDEX] == COMMON_ACK_OPCODE:
-    cmd_str += 'common_ack'
-  elif data[OPCODE_INDEX] == COMMON_NACK_OPCODE:
-    cmd_str += 'common_nack'
-  elif data[OPCODE_INDEX] == COMMON_DEBUG_OPCODE:
-    cmd_str += 'common_debug'
-    pld_str = ' "'
-    for i in range(0,data[MSG_LEN_INDEX]-0x06):
-      pld_str += chr(data[PLD_START_INDEX+i])
-    pld_str += '"'
-  elif data[OPCODE_INDEX] == COMMON_DATA_OPCODE:
-    cmd_str += 'common_data'
-    pld_str += ' Data:'
-    for i in range(0,data[MSG_LEN_INDEX]-0x06):
-      pld_str += ' 0x{:02x}'.format(data[PLD_START_INDEX+i])
-  elif data[OPCODE_INDEX] == COMMON_WRITE_EXT_OPCODE:
-    cmd_str += 'common_write_ext'
-    pld_str += ' Address: 0x{:08x}'.format(\
-     (data[PLD_START_INDEX+1]<<24)|(data[PLD_START_INDEX+2]<<16)|\
-     (data[PLD_START_INDEX+3]<< 8)|(data[PLD_START_INDEX+4]<< 0)\
-    ) 
-    pld_str += ' Data:'
-    for i in range(0,data[MSG_LEN_INDEX]-0x0b):
-        pld_str += ' 0x{:02x}'.format(data[PLD_START_INDEX+5+i])
-  elif data[OPCODE_INDEX] == COMMON_ERASE_SECTOR_EXT_OPCODE:
-    cmd_str += 'common_erase_sector_ext'
-    pld_str += ' Address: 0x{:08x}'.format(\
-     (data[PLD_START_INDEX+1]<<24)|(data[PLD_START_INDEX+2]<<16)|\
-     (data[PLD_START_INDEX+3]<< 8)|(data[PLD_START_INDEX+4]<< 0)\
-    ) 
-  elif data[OPCODE_INDEX] == COMMON_READ_EXT_OPCODE:
-    cmd_str += 'common_read_ext'
-    pld_str += ' Address: 0x{:08x}'.format(\
-     (data[PLD_START_INDEX+1]<<24)|(data[PLD_START_INDEX+2]<<16)|\
-     (data[PLD_START_INDEX+3]<< 8)|(data[PLD_START_INDEX+4]<< 0)\
-    ) 
-    pld_str += ' Length: 0x{:02x}'.format(data[PLD_START_INDEX+5])
-  elif data[OPCODE_INDEX] == BOOTLOADER_ACK_OPCODE:
-    cmd_str += 'bootloader_ack'
-    if (data[MSG_LEN_INDEX] == 0x07):
-      pld_str += ' reason:'+'0x{:02x}'.format(data[PLD_START_INDEX])+\
-       '('+bootloader_ack_reason_to_str(data[PLD_START_INDEX])+')'
-    if (data[MSG_LEN_INDEX] == 0x0a):
-      addr = (data[PLD_START_INDEX+0]<<24)| \
-             (data[PLD_START_INDEX+1]<<16)| \
-             (data[PLD_START_INDEX+2]<< 8)| \
-             (data[PLD_START_INDEX+3]<< 0)
-      pld_str += ' reason:'+'0x{:08x}'.format(addr)+'(addr)'
-  elif data[OPCODE_INDEX] == BOOTLOADER_NACK_OPCODE:
-    cmd_str += 'bootloader_nack'
-  elif data[OPCODE_INDEX] == BOOTLOADER_PING_OPCODE:
-    cmd_str += 'bootloader_ping'
-  elif data[OPCODE_INDEX] == BOOTLOADER_ERASE_OPCODE:
-    cmd_str += 'bootloader_erase'
-  elif data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_OPCODE:
-    cmd_str += 'bootloader_write_page'
-    pld_str += ' subpage_id:'+str(data[PLD_START_INDEX])
-    if data[MSG_LEN_INDEX] == 0x87:
-      pld_str += ' hex_data:'
-      for i in range(0,data[MSG_LEN_INDEX]-0x07):
-        pld_str += '{:02x}'.format(data[PLD_START_INDEX+1+i])
-  elif data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_ADDR32_OPCODE:
-    cmd_str += 'bootloader_write_page_addr32'
-    addr = (data[PLD_START_INDEX+0]<<24)| \
-           (data[PLD_START_INDEX+1]<<16)| \
-           (data[PLD_START_INDEX+2]<< 8)| \
-           (data[PLD_START_INDEX+3]<< 0)
-    pld_str += ' Address: 0x{:08x}'.format(addr)
-    if data[MSG_LEN_INDEX] == 0x8a:
-      pld_str += ' hex_data:'
-      for i in range(0,data[MSG_LEN_INDEX]-0x0a):
-        pld_str += '{:02x}'.format(data[PLD_START_INDEX+4+i])
-  elif data[OPCODE_INDEX] == BOOTLOADER_JUMP_OPCODE:
-    cmd_str += 'bootloader_jump'
-  elif data[OPCODE_INDEX] == BOOTLOADER_POWER_OPCODE:
-    cmd_str += 'bootloader_power'
-  elif data[OPCODE_INDEX] == APP_GET_TELEM_OPCODE:
-    cmd_str += 'app_get_telem'
-  elif data[OPCODE_INDEX] == APP_GET_TIME_OPCODE:
-    cmd_str += 'app_get_time'
-  elif data[OPCODE_INDEX] == APP_REBOOT_OPCODE:
-    cmd_str += 'app_reboot'
-  elif data[OPCODE_INDEX] == APP_SET_TIME_OPCODE:
-    cmd_str += 'app_set_time'
-    sec = (data[PLD_START_INDEX+0]<<0)|(data[PLD_START_INDEX+1]<<8)|\
-          (data[PLD_START_INDEX+2]<<16)|(data[PLD_START_INDEX+3]<<24)
-    ns  = (data[PLD_START_INDEX+4]<<0)|(data[PLD_START_INDEX+5]<<8)|\
-          (data[PLD_START_INDEX+6]<<16)|(data[PLD_START_INDEX+7]<<24)
-    pld_str += ' sec:'+str(sec)+' ns:'+str(ns)
+  entry = OPCODES.get(data[OPCODE_INDEX])
+  if entry is not None:
+    cmd_str += entry.name
+    if entry.decode is not None:
+      pld_str += entry.decode(data)
   # string construction common to all commands
   cmd_str += ' hw_id:0x{:04x}'.format(\
    (data[HWID_MSB_INDEX]<<8)|(data[HWID_LSB_INDEX]<<0)\
@@ -433,15 +683,108 @@ def cmd_bytes_to_str(data):
   cmd_str += ' dst:'+route_to_str(data[ROUTE_INDEX],Route.DST)
   return (cmd_str+pld_str)
 
+## Decoded command; the text of cmd_bytes_to_str is only built by str() and
+## the payload fields only by parse() (both e.g. for logging on demand)
+##   opcode, hw_id, msg_id, route: integers
+##   name: registry name of the opcode, '' if unknown
+##   src, dst: route_to_str names of the route nibbles
+##   payload: bytes after OPCODE
+class CmdRecord:
+  __slots__ = ('opcode', 'name', 'hw_id', 'msg_id', 'route', 'src', 'dst', 'payload', 'fields')
+
+  def __init__(self, opcode, name, hw_id, msg_id, route, payload):
+    self.opcode = opcode
+    self.name = name
+    self.hw_id = hw_id
+    self.msg_id = msg_id
+    self.route = route
+    self.src = ROUTE_NAMES[(route>>4) & 0x0f]
+    self.dst = ROUTE_NAMES[(route>>0) & 0x0f]
+    self.payload = payload
+    self.fields = None
+
+  ## Payload fields from the opcode's parser (cached); {} if it has none
+  def parse(self):
+    if self.fields is None:
+      entry = OPCODES.get(self.opcode)
+      self.fields = {}
+      if entry is not None and entry.parse is not None:
+        try:
+          self.fields = entry.parse(self.payload)
+        except IndexError:
+          # payload too short for this opcode
+          pass
+    return self.fields
+
+  ## The frame bytes in a CMD_MAX_LEN buffer
+  def frame(self):
+    data = bytearray(CMD_MAX_LEN)
+    data[START_BYTE_0_INDEX] = START_BYTE_0
+    data[START_BYTE_1_INDEX] = START_BYTE_1
+    data[MSG_LEN_INDEX]      = 0x06+len(self.payload)
+    data[HWID_LSB_INDEX]     = (self.hw_id  >> 0) & 0xff
+    data[HWID_MSB_INDEX]     = (self.hw_id  >> 8) & 0xff
+    data[MSG_ID_LSB_INDEX]   = (self.msg_id >> 0) & 0xff
+    data[MSG_ID_MSB_INDEX]   = (self.msg_id >> 8) & 0xff
+    data[ROUTE_INDEX]        = self.route
+    data[OPCODE_INDEX]       = self.opcode
+    data[PLD_START_INDEX:PLD_START_INDEX+len(self.payload)] = self.payload
+    return data
+
+  def __str__(self):
+    return cmd_bytes_to_str(self.frame())
+
+  ## One JSON line (no newline); bytes fields are hex strings, and the raw
+  ## payload is included as hex for opcodes without a parser
+  def to_json(self):
+    parts = ['{"opcode":', json_str(self.name) if self.name else str(self.opcode),
+     ',"hw_id":', str(self.hw_id), ',"msg_id":', str(self.msg_id),
+     ',"src":"', self.src, '","dst":"', self.dst, '"']
+    fields = self.parse()
+    if not fields and self.payload:
+      fields = {'payload': self.payload}
+    for key, value in fields.items():
+      parts.append(',"'+key+'":')
+      if type(value) is bytes:
+        parts.append('"'+value.hex()+'"')
+      elif type(value) is int:
+        parts.append(str(value))
+      elif type(value) is str:
+        parts.append(json_str(value))
+      else:
+        parts.append(json.dumps(value))
+    parts.append('}')
+    return ''.join(parts)
+
+## JSON string literal of a Python string
+json_str = json.encoder.encode_basestring
+
+## Decodes a command into a CmdRecord
+##   data: the frame, e.g. RxCmdBuff.frame() or a bytes object
+def decode_cmd(data):
+  opcode = data[OPCODE_INDEX]
+  entry = OPCODES.get(opcode)
+  return CmdRecord(
+   opcode,
+   entry.name if entry is not None else '',
+   (data[HWID_MSB_INDEX]<<8)|(data[HWID_LSB_INDEX]<<0),
+   (data[MSG_ID_MSB_INDEX]<<8)|(data[MSG_ID_LSB_INDEX]<<0),
+   data[ROUTE_INDEX],
+   bytes(data[PLD_START_INDEX:data[MSG_LEN_INDEX]+0x03])
+  )
+
 ## A Python class for easily constructing commands to be placed in a TX buffer
 ##   TODO: a "valid" state variable indicating whether data is a valid command
 ##   This valid state variable is important for commands with payloads that are
 ##   constructed in two steps, because between the two steps they can have an
 ##   invalid message length (i.e. length 6 when the payload must be at least 1)
+##   data is a preallocated bytearray that clear() zeroes in place
 class TxCmd:
+  __slots__ = ('data',)
+
   def __init__(self, opcode, hw_id, msg_id, src, dst):
     # set up data buffer
-    self.data = [0x00]*CMD_MAX_LEN
+    self.data = bytearray(CMD_MAX_LEN)
     # set command header bytes
     self.data[START_BYTE_0_INDEX] = START_BYTE_0
     self.data[START_BYTE_1_INDEX] = START_BYTE_1
@@ -452,68 +795,11 @@ class TxCmd:
     self.data[ROUTE_INDEX]        = (src << 4) | (dst << 0)
     self.data[OPCODE_INDEX]       = opcode
     # set opcode-specific bytes
-    if self.data[OPCODE_INDEX] == COMMON_ACK_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == COMMON_NACK_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == COMMON_DEBUG_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == COMMON_DATA_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == COMMON_WRITE_EXT_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-      self.data[MSG_LEN_INDEX] = 0x0b
-      self.data[PLD_START_INDEX+0] = 0x00
-      self.data[PLD_START_INDEX+1] = 0x00
-      self.data[PLD_START_INDEX+2] = 0x00
-      self.data[PLD_START_INDEX+3] = 0x00
-      self.data[PLD_START_INDEX+4] = 0x00
-      self.data[PLD_START_INDEX+5] = 0x01
-    elif self.data[OPCODE_INDEX] == COMMON_ERASE_SECTOR_EXT_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-      self.data[MSG_LEN_INDEX] = 0x0b
-      self.data[PLD_START_INDEX+0] = 0x00
-      self.data[PLD_START_INDEX+1] = 0x00
-      self.data[PLD_START_INDEX+2] = 0x00
-      self.data[PLD_START_INDEX+3] = 0x00
-      self.data[PLD_START_INDEX+4] = 0x00
-    elif self.data[OPCODE_INDEX] == COMMON_READ_EXT_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x0b
-      self.data[PLD_START_INDEX+0] = 0x00
-      self.data[PLD_START_INDEX+1] = 0x00
-      self.data[PLD_START_INDEX+2] = 0x00
-      self.data[PLD_START_INDEX+3] = 0x00
-      self.data[PLD_START_INDEX+4] = 0x00
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_ACK_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_NACK_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_PING_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_ERASE_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x07
-      self.data[PLD_START_INDEX] = 0x00
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_ADDR32_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x0a
-      self.data[PLD_START_INDEX+0] = 0x00
-      self.data[PLD_START_INDEX+1] = 0x00
-      self.data[PLD_START_INDEX+2] = 0x00
-      self.data[PLD_START_INDEX+3] = 0x00
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_JUMP_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == BOOTLOADER_POWER_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x07
-      self.data[PLD_START_INDEX] = 0x00
-    elif self.data[OPCODE_INDEX] == APP_GET_TELEM_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == APP_GET_TIME_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == APP_REBOOT_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x06
-    elif self.data[OPCODE_INDEX] == APP_SET_TIME_OPCODE:
-      self.data[MSG_LEN_INDEX] = 0x0e
+    entry = OPCODES.get(self.data[OPCODE_INDEX])
+    if entry is not None:
+      self.data[MSG_LEN_INDEX] = entry.msg_len
+      if entry.encode is not None:
+        entry.encode(self.data)
     else:
       self.data[MSG_LEN_INDEX] = 0x06
 
@@ -521,18 +807,17 @@ class TxCmd:
     if self.data[OPCODE_INDEX] == COMMON_DEBUG_OPCODE:
       if len(ascii)<=PLD_MAX_LEN:
         self.data[MSG_LEN_INDEX] = 0x06+len(ascii)
-        for i in range(0,len(ascii)):
-          self.data[PLD_START_INDEX+i] = ord(ascii[i])
+        self.data[PLD_START_INDEX:PLD_START_INDEX+len(ascii)] = ascii.encode('latin-1')
 
   def common_data(self, bytes):
     if self.data[OPCODE_INDEX] == COMMON_DATA_OPCODE:
       if len(bytes)<=PLD_MAX_LEN:
         self.data[MSG_LEN_INDEX] = 0x06+len(bytes)
-        for i in range(0,len(bytes)):
-          self.data[PLD_START_INDEX+i] = bytes[i]
+        self.data[PLD_START_INDEX:PLD_START_INDEX+len(bytes)] = bytes
           
   def common_write_ext(self, addr, data=[], flashid=0x00):
-    if self.data[OPCODE_INDEX] == COMMON_WRITE_EXT_OPCODE:
+    if self.data[OPCODE_INDEX] == COMMON_WRITE_EXT_OPCODE and \
+       len(data)<=PLD_MAX_LEN-0x05:
       addr_bytes = addr.to_bytes(4,byteorder='big')
       self.data[MSG_LEN_INDEX] = 0x0b+len(data)
       self.data[PLD_START_INDEX+0] = flashid
@@ -540,8 +825,7 @@ class TxCmd:
       self.data[PLD_START_INDEX+2] = addr_bytes[1]
       self.data[PLD_START_INDEX+3] = addr_bytes[2]
       self.data[PLD_START_INDEX+4] = addr_bytes[3]
-      for i in range(0,len(data)):
-        self.data[PLD_START_INDEX+5+i] = data[i]
+      self.data[PLD_START_INDEX+5:PLD_START_INDEX+5+len(data)] = bytes(data)
 
   def common_erase_sector_ext(self, addr, flashid=0x00):
     if self.data[OPCODE_INDEX] == COMMON_ERASE_SECTOR_EXT_OPCODE:
@@ -569,8 +853,7 @@ class TxCmd:
       self.data[PLD_START_INDEX] = page_number
       if len(page_data)==128:
         self.data[MSG_LEN_INDEX] = 0x87
-        for i in range(0,len(page_data)):
-          self.data[PLD_START_INDEX+1+i] = page_data[i]
+        self.data[PLD_START_INDEX+1:PLD_START_INDEX+1+128] = bytes(page_data)
   
   def bootloader_write_page_addr32(self, addr, page_data=[]):
     if self.data[OPCODE_INDEX] == BOOTLOADER_WRITE_PAGE_ADDR32_OPCODE:
@@ -581,8 +864,7 @@ class TxCmd:
       self.data[PLD_START_INDEX+3] = addr_bytes[3]
       if len(page_data)==128:
         self.data[MSG_LEN_INDEX] = 0x8a
-        for i in range(0,len(page_data)):
-          self.data[PLD_START_INDEX+4+i] = page_data[i]
+        self.data[PLD_START_INDEX+4:PLD_START_INDEX+4+128] = bytes(page_data)
   def bootloader_power_select(self, mode):
     if self.data[OPCODE_INDEX] == BOOTLOADER_POWER_OPCODE:
       self.data[MSG_LEN_INDEX] = 0x07
@@ -627,8 +909,17 @@ class TxCmd:
   def get_byte_count(self):
     return self.data[MSG_LEN_INDEX]+0x03
 
+  ## Zero-copy view of the frame, data[:get_byte_count()]; write it to the
+  ## serial port as is
+  def frame(self):
+    return memoryview(self.data)[:self.get_byte_count()]
+
+  ## Zero-copy view of the payload
+  def payload(self):
+    return memoryview(self.data)[PLD_START_INDEX:self.get_byte_count()]
+
   def clear(self):
-    self.data = [0x00]*CMD_MAX_LEN
+    self.data[:] = CMD_ZEROS
 
   def __str__(self):
     return cmd_bytes_to_str(self.data)
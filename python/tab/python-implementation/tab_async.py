@@ -0,0 +1,299 @@
+# tab_async.py
+#
+# Usage: python3 tab_async.py [--requests 200] [--window 8] [--drop 0.05]
+#        python3 tab_async.py --serial /dev/ttyUSB0 [--baud 38400] [--requests 20]
+#        python3 tab_async.py --tcp 127.0.0.1:5000 [--requests 20]
+# Parameters:
+#  --serial, --tcp: TAB endpoint to ping with common_debug commands; without
+#   either, the client is tested against an in-process stand-in endpoint
+#  --requests: number of commands
+#  --window: commands in flight at once
+#  --drop: fraction of commands the stand-in endpoint ignores
+# Output:
+#  Prints the command rate, round-trip times and retransmits
+#
+# Asyncio transport for TAB. TabClient wraps an asyncio stream (serial port
+# or pty through pyserial-asyncio, or a TCP socket) and keeps up to window
+# commands in flight. Each command gets a free msg_id; replies are parsed with
+# RxCmdBuff.feed and matched to the pending command by their MSG_ID bytes. A
+# command without a reply is retransmitted after timeout seconds, up to
+# retries times, before its request fails with TimeoutError.
+#
+# StandInEndpoint answers every command with TxCmdBuff.generate_reply, like
+# the simulated endpoint of tab.py. It can delay replies by a link latency,
+# serialize them at a baud rate and drop a fraction of commands.
+#
+# See the top-level LICENSE file for the license.
+
+# import Python modules
+import argparse # argument parsing
+import asyncio  # streams, futures
+import random   # dropped commands
+import time     # perf_counter
+
+# import TAB
+from tab import *
+
+## Bits per byte on the wire: start bit, 8 data bits, stop bit
+UART_BITS_PER_BYTE = 10
+
+## Asyncio TAB client with a window of pending commands matched by msg_id
+class TabClient:
+  def __init__(self, reader, writer, hw_id=0x0012, src=GND, dst=CDH, window=8, timeout=1.0, retries=3):
+    self.reader = reader
+    self.writer = writer
+    self.hw_id = hw_id
+    self.src = src
+    self.dst = dst
+    self.window = asyncio.Semaphore(window)
+    self.timeout = timeout
+    self.retries = retries
+    self.pending = {}
+    self.msg_id = 0x0000
+    self.sent = 0
+    self.retransmits = 0
+    self.unmatched = 0
+    self.rtts = []
+    self.error = None
+    self.rx_task = None
+
+  ## Connects to a TCP endpoint, e.g. a serial-to-TCP bridge or a stand-in
+  @classmethod
+  async def open_tcp(cls, host, port, **kwargs):
+    reader, writer = await asyncio.open_connection(host, port)
+    return cls(reader, writer, **kwargs).start()
+
+  ## Opens a serial port or pty; needs pyserial-asyncio
+  @classmethod
+  async def open_serial(cls, url, baudrate=38400, **kwargs):
+    try:
+      import serial_asyncio
+    except ImportError:
+      raise RuntimeError('serial ports need the pyserial-asyncio package (pip install pyserial-asyncio)') from None
+    reader, writer = await serial_asyncio.open_serial_connection(url=url, baudrate=baudrate)
+    return cls(reader, writer, **kwargs).start()
+
+  def start(self):
+    if self.rx_task is None:
+      self.rx_task = asyncio.get_running_loop().create_task(self._receive())
+    return self
+
+  async def close(self):
+    if self.rx_task is not None:
+      self.rx_task.cancel()
+      try:
+        await self.rx_task
+      except asyncio.CancelledError:
+        pass
+      self.rx_task = None
+    self.writer.close()
+    try:
+      await self.writer.wait_closed()
+    except ConnectionError:
+      pass
+
+  async def __aenter__(self):
+    return self.start()
+
+  async def __aexit__(self, *exc):
+    await self.close()
+
+  ## A new TxCmd addressed from src to dst; request() sets its msg_id
+  def cmd(self, opcode):
+    return TxCmd(opcode, self.hw_id, 0x0000, self.src, self.dst)
+
+  ## Next 16-bit msg_id that is not in flight
+  def _next_msg_id(self):
+    while True:
+      msg_id = self.msg_id
+      self.msg_id = (self.msg_id+1) & 0xffff
+      if msg_id not in self.pending:
+        return msg_id
+
+  ## Sends cmd and returns the reply frame as bytes
+  ##   cmd: a TxCmd; its MSG_ID bytes are overwritten with a free msg_id
+  ##   timeout, retries: override the client defaults for this command
+  async def request(self, cmd, timeout=None, retries=None):
+    timeout = self.timeout if timeout is None else timeout
+    retries = self.retries if retries is None else retries
+    async with self.window:
+      if self.error is not None:
+        raise self.error
+      msg_id = self._next_msg_id()
+      cmd.data[MSG_ID_LSB_INDEX] = (msg_id >> 0) & 0xff
+      cmd.data[MSG_ID_MSB_INDEX] = (msg_id >> 8) & 0xff
+      # the transport may hold on to the buffer, so send a copy
+      frame = bytes(cmd.frame())
+      future = asyncio.get_running_loop().create_future()
+      self.pending[msg_id] = future
+      t0 = time.perf_counter()
+      try:
+        for attempt in range(retries+1):
+          if attempt > 0:
+            self.retransmits += 1
+          self.writer.write(frame)
+          self.sent += 1
+          await self.writer.drain()
+          try:
+            reply = await asyncio.wait_for(asyncio.shield(future), timeout)
+          except asyncio.TimeoutError:
+            continue
+          self.rtts.append(time.perf_counter()-t0)
+          return reply
+        raise TimeoutError('no reply to msg_id 0x{:04x} after {} attempts'.format(msg_id, retries+1))
+      finally:
+        self.pending.pop(msg_id, None)
+
+  async def _receive(self):
+    rx_cmd_buff = RxCmdBuff()
+    try:
+      while True:
+        chunk = await self.reader.read(4096)
+        if not chunk:
+          raise ConnectionError('TAB endpoint closed the connection')
+        for reply in rx_cmd_buff.feed(chunk):
+          msg_id = (reply.data[MSG_ID_MSB_INDEX]<<8)|(reply.data[MSG_ID_LSB_INDEX]<<0)
+          future = self.pending.get(msg_id)
+          if future is None or future.done():
+            # late reply to a retransmitted or abandoned command
+            self.unmatched += 1
+          else:
+            future.set_result(bytes(reply.frame()))
+    except Exception as e:
+      self.error = e
+      for future in self.pending.values():
+        if not future.done():
+          future.set_exception(e)
+      if not isinstance(e, ConnectionError):
+        raise
+
+## In-process endpoint replying with TxCmdBuff.generate_reply
+##   latency: seconds between receiving a command and starting its reply
+##   baud: line rate in each direction, 0 for no limit; a command counts as
+##    received once all its bytes would have arrived at this rate
+##   drop: fraction of commands that get no reply
+## Subclasses answer other commands by overriding respond()
+class StandInEndpoint:
+  def __init__(self, latency=0.0, baud=0, drop=0.0, seed=0):
+    self.latency = latency
+    self.baud = baud
+    self.drop = drop
+    self.rng = random.Random(seed)
+    self.received = 0
+    self.dropped = 0
+    self.server = None
+
+  async def start(self, host='127.0.0.1', port=0):
+    self.server = await asyncio.start_server(self.handle, host, port)
+    return self.server.sockets[0].getsockname()[:2]
+
+  async def close(self):
+    self.server.close()
+    await self.server.wait_closed()
+
+  ## Writes the reply to cmd into tx_cmd_buff; returns False for no reply
+  def respond(self, cmd, tx_cmd_buff):
+    tx_cmd_buff.generate_reply(cmd)
+    return True
+
+  ## Seconds to send count bytes at the line rate
+  def wire_time(self, count):
+    return count*UART_BITS_PER_BYTE/self.baud if self.baud else 0.0
+
+  def _send(self, writer, reply):
+    if not writer.is_closing():
+      writer.write(reply)
+
+  async def handle(self, reader, writer):
+    loop = asyncio.get_running_loop()
+    rx_cmd_buff = RxCmdBuff()
+    tx_cmd_buff = TxCmdBuff()
+    rx_free = 0.0
+    tx_free = 0.0
+    try:
+      while True:
+        chunk = await reader.read(4096)
+        if not chunk:
+          break
+        for cmd in rx_cmd_buff.feed(chunk):
+          self.received += 1
+          rx_free = max(loop.time(), rx_free)+self.wire_time(cmd.get_byte_count())
+          if self.rng.random() < self.drop:
+            self.dropped += 1
+            continue
+          if not self.respond(cmd, tx_cmd_buff):
+            tx_cmd_buff.clear()
+            continue
+          reply = bytes(tx_cmd_buff.frame())
+          tx_cmd_buff.clear()
+          # the reply leaves after the latency, once the line is free
+          tx_free = max(rx_free+self.latency, tx_free)+self.wire_time(len(reply))
+          loop.call_at(tx_free, self._send, writer, reply)
+    except ConnectionError:
+      pass
+    finally:
+      writer.close()
+
+## Sends count common_debug commands and checks every echo; returns the
+## elapsed seconds
+async def ping(client, count):
+  async def one(i):
+    text = 'ping {:05d}'.format(i)
+    cmd = client.cmd(COMMON_DEBUG_OPCODE)
+    cmd.common_debug(text)
+    reply = await client.request(cmd)
+    if reply[OPCODE_INDEX] != COMMON_DEBUG_OPCODE or \
+       reply[PLD_START_INDEX:PLD_START_INDEX+len(text)] != text.encode():
+      raise RuntimeError('wrong reply to "'+text+'": '+cmd_bytes_to_str(reply))
+  t0 = time.perf_counter()
+  await asyncio.gather(*(one(i) for i in range(count)))
+  return time.perf_counter()-t0
+
+## Round-trip times are from the first transmission to the reply
+def print_result(label, client, count, elapsed):
+  rtts = sorted(client.rtts)
+  print('{:<12} {:8.1f} cmd/s  rtt p50 {:7.2f} ms  p99 {:7.2f} ms  sent {:5d}  retransmits {:4d}'.format(
+   label, count/elapsed, 1000*rtts[len(rtts)//2], 1000*rtts[min(len(rtts)-1, len(rtts)*99//100)],
+   client.sent, client.retransmits))
+
+## Pings a stand-in endpoint one command at a time and with the window
+async def self_test(args):
+  baud = args.baud or 38400
+  endpoint = StandInEndpoint(latency=args.latency, baud=baud, drop=args.drop)
+  host, port = await endpoint.start()
+  print('stand-in endpoint: {:.0f} ms latency, {} baud, {:.0%} dropped'.format(1000*args.latency, baud, args.drop))
+  for window in (1, args.window):
+    client = await TabClient.open_tcp(host, port, window=window, timeout=args.timeout, retries=args.retries)
+    elapsed = await ping(client, args.requests)
+    await client.close()
+    print_result('window {}'.format(window), client, args.requests, elapsed)
+  await endpoint.close()
+
+async def main(args):
+  if not args.serial and not args.tcp:
+    await self_test(args)
+    return
+  if args.serial:
+    client = await TabClient.open_serial(args.serial, args.baud or 38400, window=args.window,
+     timeout=args.timeout, retries=args.retries)
+  else:
+    host, port = args.tcp.rsplit(':', 1)
+    client = await TabClient.open_tcp(host, int(port), window=args.window,
+     timeout=args.timeout, retries=args.retries)
+  async with client:
+    elapsed = await ping(client, args.requests)
+  print_result('window {}'.format(args.window), client, args.requests, elapsed)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Pipelined TAB commands over asyncio')
+  parser.add_argument('--serial', help='serial port or pty of the TAB endpoint')
+  parser.add_argument('--tcp', help='host:port of the TAB endpoint')
+  parser.add_argument('--baud', type=int, help='serial baud rate, or the stand-in line rate (default: 38400)')
+  parser.add_argument('--requests', type=int, default=200, help='commands to send (default: 200)')
+  parser.add_argument('--window', type=int, default=8, help='commands in flight (default: 8)')
+  parser.add_argument('--timeout', type=float, default=0.5, help='seconds before a retransmit (default: 0.5)')
+  parser.add_argument('--retries', type=int, default=3, help='retransmits per command (default: 3)')
+  parser.add_argument('--latency', type=float, default=0.02, help='stand-in reply latency in seconds (default: 0.02)')
+  parser.add_argument('--drop', type=float, default=0.02, help='fraction the stand-in ignores (default: 0.02)')
+  args = parser.parse_args()
+  asyncio.run(main(args))
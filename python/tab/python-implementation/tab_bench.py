@@ -0,0 +1,118 @@
+# tab_bench.py
+#
+# Usage: python3 tab_bench.py [--frames 20000] [--chunk-size 4096] [--seed 0]
+# Parameters:
+#  --frames: number of TAB frames in the synthetic stream
+#  --chunk-size: bytes per RxCmdBuff.feed call
+#  --seed: random seed of the stream
+# Output:
+#  Prints the parse throughput of RxCmdBuff.append_byte and RxCmdBuff.feed,
+#  and the log throughput of cmd_bytes_to_str and decode_cmd
+#
+# Builds a stream of random frames with random noise between them (the noise
+# contains stray start bytes and bad lengths, so resynchronization is
+# exercised), parses it byte by byte with append_byte and in chunks with feed,
+# and checks that both return the same frames. The stream is also fed in a
+# few odd chunk sizes to check frames split across chunks. For logging, the
+# frames are given registered opcodes and formatted with cmd_bytes_to_str, and
+# decoded with decode_cmd and written as JSON lines.
+#
+# See the top-level LICENSE file for the license.
+
+# import Python modules
+import argparse # argument parsing
+import random   # stream generation
+import time     # perf_counter
+
+# import TAB
+from tab import *
+
+## Random stream of frames and noise; returns the stream and the frames
+def make_stream(frame_count, seed):
+  rng = random.Random(seed)
+  stream = bytearray()
+  frames = []
+  for _ in range(frame_count):
+    noise = rng.randrange(0, 8)
+    stream += bytes(rng.choice((START_BYTE_0, START_BYTE_1, 0x00, 0x03, rng.randrange(256))) for _ in range(noise))
+    msg_len = rng.randrange(0x06, 0x100)
+    frame = bytes([START_BYTE_0, START_BYTE_1, msg_len]) + rng.randbytes(msg_len)
+    stream += frame
+    frames.append(frame)
+  return bytes(stream), frames
+
+## The frames with their OPCODE byte replaced by registered opcodes
+def with_registered_opcodes(frames, seed):
+  rng = random.Random(seed)
+  opcodes = sorted(OPCODES)
+  return [frame[:OPCODE_INDEX]+bytes([rng.choice(opcodes)])+frame[OPCODE_INDEX+1:] for frame in frames]
+
+## Frames parsed one byte at a time
+def parse_append_byte(stream):
+  rx_cmd_buff = RxCmdBuff()
+  frames = []
+  for b in stream:
+    rx_cmd_buff.append_byte(b)
+    if rx_cmd_buff.state == RxCmdBuffState.COMPLETE:
+      frames.append(bytes(rx_cmd_buff.data[:rx_cmd_buff.data[MSG_LEN_INDEX]+0x03]))
+      rx_cmd_buff.clear()
+  return frames
+
+## Frames parsed chunk_size bytes at a time
+def parse_feed(stream, chunk_size):
+  rx_cmd_buff = RxCmdBuff()
+  frames = []
+  for i in range(0, len(stream), chunk_size):
+    for frame in rx_cmd_buff.feed(stream[i:i+chunk_size]):
+      frames.append(bytes(frame.data[:frame.data[MSG_LEN_INDEX]+0x03]))
+  return frames
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='RxCmdBuff parse throughput')
+  parser.add_argument('--frames', type=int, default=20000, help='frames in the stream (default: 20000)')
+  parser.add_argument('--chunk-size', type=int, default=4096, help='bytes per feed call (default: 4096)')
+  parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+  args = parser.parse_args()
+
+  stream, stream_frames = make_stream(args.frames, args.seed)
+  t0 = time.perf_counter()
+  expected = parse_append_byte(stream)
+  t_append = time.perf_counter()-t0
+  t0 = time.perf_counter()
+  frames = parse_feed(stream, args.chunk_size)
+  t_feed = time.perf_counter()-t0
+  if frames != expected:
+    raise SystemExit('feed returned different frames than append_byte')
+  for chunk_size in (1, 2, 3, 7, 255, 259):
+    if parse_feed(stream[:1<<16], chunk_size) != parse_append_byte(stream[:1<<16]):
+      raise SystemExit('feed returned different frames at chunk size '+str(chunk_size))
+
+  log_frames = with_registered_opcodes(stream_frames, args.seed)
+  buffers = []
+  for frame in log_frames:
+    buffers.append(bytearray(CMD_MAX_LEN))
+    buffers[-1][:len(frame)] = frame
+  t0 = time.perf_counter()
+  for data in buffers:
+    cmd_bytes_to_str(data)
+  t_str = time.perf_counter()-t0
+  t0 = time.perf_counter()
+  for frame in log_frames:
+    decode_cmd(frame)
+  t_decode = time.perf_counter()-t0
+  t0 = time.perf_counter()
+  for frame in log_frames:
+    decode_cmd(frame).to_json()
+  t_json = time.perf_counter()-t0
+  for frame, data in zip(log_frames[:1000], buffers):
+    if str(decode_cmd(frame)) != cmd_bytes_to_str(data):
+      raise SystemExit('str(decode_cmd()) differs from cmd_bytes_to_str')
+
+  mb = len(stream)/1e6
+  print('stream:      {:.2f} MB, {} frames'.format(mb, len(expected)))
+  print('append_byte: {:8.3f} s {:8.2f} MB/s {:10.0f} frames/s'.format(t_append, mb/t_append, len(expected)/t_append))
+  print('feed:        {:8.3f} s {:8.2f} MB/s {:10.0f} frames/s'.format(t_feed, mb/t_feed, len(expected)/t_feed))
+  print('speedup:     {:.1f}x'.format(t_append/t_feed))
+  print('cmd_bytes_to_str:     {:8.3f} s {:10.0f} frames/s'.format(t_str, len(log_frames)/t_str))
+  print('decode_cmd:           {:8.3f} s {:10.0f} frames/s'.format(t_decode, len(log_frames)/t_decode))
+  print('decode_cmd+to_json:   {:8.3f} s {:10.0f} frames/s'.format(t_json, len(log_frames)/t_json))
@@ -0,0 +1,546 @@
+# tab_capture.py
+#
+# Usage: python3 tab_capture.py record CAPTURE (--serial /dev/ttyUSB0 [--baud 38400] | --tcp host:port)
+#        python3 tab_capture.py convert DUMP CAPTURE [--baud 38400]
+#        python3 tab_capture.py query CAPTURE [--opcode app_telem] [--src cdh] [--msg-id 0x100:0x1ff] [--text]
+#        python3 tab_capture.py replay CAPTURE [--tcp host:port | --serial PORT] [--speed 10] [filters]
+#        python3 tab_capture.py bench [--frames 1000000]
+# Parameters:
+#  record: captures the frames received from a serial port or TCP endpoint
+#   until the connection closes or Ctrl-C
+#  convert: turns a raw serial dump into a capture; the frames are timed by
+#   their wire time at --baud
+#  query: prints the matching frames as JSON lines (or as text with --text)
+#  replay: sends the matching frames to --tcp or --serial, or prints them,
+#   with their original spacing divided by --speed (0 for no delay)
+#  bench: compares an indexed query with re-parsing a raw dump
+#  Filters: --opcode (name such as app_telem, or number), --src, --dst (gnd,
+#   com, cdh, pld), --msg-id and --hw-id (N or FIRST:LAST, FIRST > LAST wraps
+#   around), --start and --end (seconds after the first frame)
+# Output:
+#  CAPTURE and its index CAPTURE.idx, or frames on stdout
+#
+# A capture holds one record per received frame: the receive time in ns
+# (little-endian u64) followed by the frame bytes. The index is a table of
+# fixed INDEX_ROW rows (offset of the frame in the capture, receive time,
+# msg_id, hw_id, opcode, route, frame length) appended alongside. Capture
+# reads both with mmap: time ranges are found by binary search, since times
+# never decrease, and each filter turns its byte columns of the index into a
+# 0/1 row mask with bytes.translate; the masks are combined as integers and
+# the matching rows found with bytes.find. Frames are memoryviews into the
+# capture map, so iterating, filtering and replaying do not copy payloads. A
+# missing or short index (e.g. after a crash) is rebuilt from the capture
+# when it is opened; the index header records how much of the capture it
+# covers, so a truncated last record is only skipped once.
+#
+# See the top-level LICENSE file for the license.
+
+# import Python modules
+import argparse # argument parsing
+import asyncio  # record
+import mmap     # mmap
+import os       # path, size
+import struct   # Struct
+import sys      # stdout
+import tempfile # bench
+import time     # time_ns, perf_counter, sleep
+
+# import TAB
+from tab import *
+
+## File magic numbers
+CAPTURE_MAGIC = b'TABCAP01'
+INDEX_MAGIC   = b'TABIDX02'
+
+## Index header: magic, capture bytes covered by the index (0 while a writer
+## appends; the rows then show how far it got)
+INDEX_HEADER = struct.Struct('<8sQ')
+
+## Capture record header: receive time in ns
+RECORD_TIME = struct.Struct('<Q')
+
+## Index row: offset, t_ns, msg_id, hw_id, opcode, route, length
+INDEX_ROW = struct.Struct('<QQHHBBH')
+INDEX_MSG_ID_COLUMN = 16
+INDEX_HW_ID_COLUMN  = 18
+INDEX_OPCODE_COLUMN = 20
+INDEX_ROUTE_COLUMN  = 21
+
+## Sidecar index of a capture
+def index_path(path):
+  return path+'.idx'
+
+## Appends frames to a capture and its index
+class CaptureWriter:
+  def __init__(self, path):
+    self.capture = open(path, 'wb')
+    self.index = open(index_path(path), 'wb')
+    self.capture.write(CAPTURE_MAGIC)
+    self.index.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+    self.offset = len(CAPTURE_MAGIC)
+    self.t_ns = 0
+    self.count = 0
+
+  ## Appends one frame
+  ##   frame: frame bytes, e.g. RxCmdBuff.frame()
+  ##   t_ns: receive time in ns (default: now); earlier times are raised to
+  ##    the previous one so that the index stays sorted
+  def append(self, frame, t_ns=None):
+    t_ns = max(time.time_ns() if t_ns is None else t_ns, self.t_ns)
+    length = frame[MSG_LEN_INDEX]+0x03
+    self.capture.write(RECORD_TIME.pack(t_ns))
+    self.capture.write(frame[:length])
+    self.index.write(INDEX_ROW.pack(
+     self.offset+RECORD_TIME.size, t_ns,
+     (frame[MSG_ID_MSB_INDEX]<<8)|(frame[MSG_ID_LSB_INDEX]<<0),
+     (frame[HWID_MSB_INDEX]<<8)|(frame[HWID_LSB_INDEX]<<0),
+     frame[OPCODE_INDEX], frame[ROUTE_INDEX], length
+    ))
+    self.offset += RECORD_TIME.size+length
+    self.t_ns = t_ns
+    self.count += 1
+
+  def flush(self):
+    self.capture.flush()
+    self.index.flush()
+
+  def close(self):
+    self.capture.close()
+    self.index.seek(0)
+    self.index.write(INDEX_HEADER.pack(INDEX_MAGIC, self.offset))
+    self.index.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+## Rewrites the index of a capture from its records, reading the capture
+## through mmap; a truncated last record is left out but counted as covered.
+## Returns the number of frames.
+def build_index(path):
+  with open(path, 'rb') as f:
+    if os.fstat(f.fileno()).st_size < len(CAPTURE_MAGIC):
+      raise ValueError(path+' is not a TAB capture')
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+      if data[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC:
+        raise ValueError(path+' is not a TAB capture')
+      count = 0
+      offset = len(CAPTURE_MAGIC)
+      with open(index_path(path), 'wb') as index:
+        index.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+        while offset+RECORD_TIME.size+MSG_LEN_INDEX < len(data):
+          start = offset+RECORD_TIME.size
+          length = data[start+MSG_LEN_INDEX]+0x03
+          if start+length > len(data):
+            break
+          if data[start+START_BYTE_0_INDEX] != START_BYTE_0 or data[start+START_BYTE_1_INDEX] != START_BYTE_1:
+            raise ValueError('corrupt capture record at offset '+str(offset))
+          index.write(INDEX_ROW.pack(
+           start, RECORD_TIME.unpack_from(data, offset)[0],
+           (data[start+MSG_ID_MSB_INDEX]<<8)|(data[start+MSG_ID_LSB_INDEX]<<0),
+           (data[start+HWID_MSB_INDEX]<<8)|(data[start+HWID_LSB_INDEX]<<0),
+           data[start+OPCODE_INDEX], data[start+ROUTE_INDEX], length
+          ))
+          offset = start+length
+          count += 1
+        index.seek(0)
+        index.write(INDEX_HEADER.pack(INDEX_MAGIC, len(data)))
+  return count
+
+## True if the index covers the whole capture: by its header, or (while a
+## writer appends) by its last row
+def index_is_current(path):
+  try:
+    size = os.path.getsize(index_path(path))
+  except OSError:
+    return False
+  rows, rest = divmod(size-INDEX_HEADER.size, INDEX_ROW.size)
+  if size < INDEX_HEADER.size or rest != 0:
+    return False
+  capture_size = os.path.getsize(path)
+  with open(index_path(path), 'rb') as f:
+    magic, covered = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+    if magic != INDEX_MAGIC:
+      return False
+    if covered == capture_size:
+      return True
+    if rows == 0:
+      return capture_size == len(CAPTURE_MAGIC)
+    f.seek(-INDEX_ROW.size, os.SEEK_END)
+    offset, _, _, _, _, _, length = INDEX_ROW.unpack(f.read(INDEX_ROW.size))
+  return offset+length == capture_size
+
+## Memory-mapped capture with its index
+##   frame(), frames() and replay() return memoryviews into the map; copy
+##   them with bytes() to keep them after close()
+class Capture:
+  def __init__(self, path):
+    if not index_is_current(path):
+      build_index(path)
+    self.files = [open(path, 'rb'), open(index_path(path), 'rb')]
+    self.capture_map = mmap.mmap(self.files[0].fileno(), 0, access=mmap.ACCESS_READ)
+    self.index = mmap.mmap(self.files[1].fileno(), 0, access=mmap.ACCESS_READ)
+    self.data = memoryview(self.capture_map)
+    if self.capture_map[:len(CAPTURE_MAGIC)] != CAPTURE_MAGIC or self.index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+      self.close()
+      raise ValueError(path+' is not a TAB capture')
+    self.count = (len(self.index)-INDEX_HEADER.size)//INDEX_ROW.size
+
+  def close(self):
+    self.data.release()
+    for m in (self.capture_map, self.index):
+      try:
+        m.close()
+      except BufferError:
+        # the caller still holds frames; the map closes when they are freed
+        pass
+    for f in self.files:
+      f.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def __len__(self):
+    return self.count
+
+  ## Index row i as (offset, t_ns, msg_id, hw_id, opcode, route, length)
+  def row(self, i):
+    return INDEX_ROW.unpack_from(self.index, INDEX_HEADER.size+i*INDEX_ROW.size)
+
+  def time_ns(self, i):
+    return RECORD_TIME.unpack_from(self.index, INDEX_HEADER.size+i*INDEX_ROW.size+8)[0]
+
+  ## Frame i as a memoryview into the capture
+  def frame(self, i):
+    offset, _, _, _, _, _, length = self.row(i)
+    return self.data[offset:offset+length]
+
+  ## First row with a time >= t_ns
+  def _bisect(self, t_ns):
+    lo, hi = 0, self.count
+    while lo < hi:
+      mid = (lo+hi)//2
+      if self.time_ns(mid) < t_ns:
+        lo = mid+1
+      else:
+        hi = mid
+    return lo
+
+  ## Rows [lo, hi) received in [start_ns, end_ns)
+  def rows_between(self, start_ns=None, end_ns=None):
+    lo = 0 if start_ns is None else self._bisect(start_ns)
+    hi = self.count if end_ns is None else self._bisect(end_ns)
+    return lo, max(lo, hi)
+
+  ## Rows of the frames that match every given filter, in capture order
+  ##   opcode, src, dst: values as in tab.py, e.g. APP_TELEM_OPCODE, CDH
+  ##   msg_id, hw_id: a value or an inclusive (first, last) range, which wraps
+  ##    around if first > last
+  ##   start_ns, end_ns: receive time range
+  def select(self, opcode=None, src=None, dst=None, msg_id=None, hw_id=None, start_ns=None, end_ns=None):
+    lo, hi = self.rows_between(start_ns, end_ns)
+    masks = []
+    if opcode is not None:
+      masks.append(byte_mask(self._column(lo, hi, INDEX_OPCODE_COLUMN), lambda v: v == opcode))
+    if src is not None or dst is not None:
+      masks.append(byte_mask(self._column(lo, hi, INDEX_ROUTE_COLUMN), lambda v:
+       (src is None or (v >> 4) & 0x0f == src) and (dst is None or (v >> 0) & 0x0f == dst)))
+    for bounds, column in ((msg_id, INDEX_MSG_ID_COLUMN), (hw_id, INDEX_HW_ID_COLUMN)):
+      if bounds is not None:
+        masks.append(range_mask(self._column(lo, hi, column+0), self._column(lo, hi, column+1), as_range(bounds)))
+    if not masks:
+      yield from range(lo, hi)
+      return
+    mask = masks[0]
+    for m in masks[1:]:
+      mask &= m
+    for i in find_all(mask.to_bytes(hi-lo, 'little'), 0x01):
+      yield lo+i
+
+  ## Byte column of rows [lo, hi) of the index
+  def _column(self, lo, hi, column):
+    start = INDEX_HEADER.size+lo*INDEX_ROW.size+column
+    return self.index[start:INDEX_HEADER.size+hi*INDEX_ROW.size:INDEX_ROW.size]
+
+  ## (t_ns, frame) of the given rows
+  def frames(self, rows):
+    for i in rows:
+      offset, t_ns, _, _, _, _, length = self.row(i)
+      yield t_ns, self.data[offset:offset+length]
+
+  ## Like frames(), but each frame is yielded at its original spacing divided
+  ## by speed, counted from the first one; speed 0 yields without delay
+  def replay(self, rows, speed=1.0):
+    t0 = None
+    for t_ns, frame in self.frames(rows):
+      if speed > 0:
+        if t0 is None:
+          t0, wall0 = t_ns, time.perf_counter()
+        delay = wall0+(t_ns-t0)/1e9/speed-time.perf_counter()
+        if delay > 0:
+          time.sleep(delay)
+      yield t_ns, frame
+
+## Positions of a byte value in data
+def find_all(data, value):
+  value = bytes([value])
+  i = data.find(value)
+  while i >= 0:
+    yield i
+    i = data.find(value, i+1)
+
+## Row mask of a byte column: byte i of the little-endian integer is 1 where
+## predicate(column[i]) holds, else 0, so masks combine with & and |
+def byte_mask(column, predicate):
+  table = bytes(1 if predicate(v) else 0 for v in range(256))
+  return int.from_bytes(column.translate(table), 'little')
+
+## Row mask of a 16-bit column (LSB and MSB byte columns) in an inclusive
+## (first, last) range, which wraps around if first > last
+def range_mask(lsb, msb, bounds):
+  first, last = bounds
+  if first > last:
+    return range_mask(lsb, msb, (first, 0xffff)) | range_mask(lsb, msb, (0x0000, last))
+  first_msb, first_lsb = divmod(first, 0x100)
+  last_msb, last_lsb = divmod(last, 0x100)
+  if first_msb == last_msb:
+    return byte_mask(msb, lambda v: v == first_msb) & byte_mask(lsb, lambda v: first_lsb <= v <= last_lsb)
+  return byte_mask(msb, lambda v: first_msb < v < last_msb) | \
+   (byte_mask(msb, lambda v: v == first_msb) & byte_mask(lsb, lambda v: v >= first_lsb)) | \
+   (byte_mask(msb, lambda v: v == last_msb) & byte_mask(lsb, lambda v: v <= last_lsb))
+
+## None, or a value as a (first, last) range
+def as_range(value):
+  if value is None or isinstance(value, tuple):
+    return value
+  return (value, value)
+
+def in_range(value, bounds):
+  first, last = bounds
+  if first <= last:
+    return first <= value <= last
+  return value >= first or value <= last
+
+## Opcode from a number or a name such as app_telem (the *_OPCODE constants)
+def parse_opcode(text):
+  try:
+    return int(text, 0)
+  except ValueError:
+    pass
+  name = text.upper()+'_OPCODE'
+  if name not in globals():
+    raise argparse.ArgumentTypeError('unknown opcode '+text)
+  return globals()[name]
+
+## Route nibble from gnd, com, cdh or pld
+def parse_route(text):
+  if text.lower() not in ROUTE_NAMES:
+    raise argparse.ArgumentTypeError('unknown node '+text)
+  return ROUTE_NAMES.index(text.lower())
+
+## N or FIRST:LAST
+def parse_range(text):
+  if ':' in text:
+    first, last = text.split(':', 1)
+    return (int(first, 0), int(last, 0))
+  return int(text, 0)
+
+## Rows selected by the filter arguments
+def select_args(capture, args):
+  start_ns = end_ns = None
+  if len(capture) > 0 and (args.start is not None or args.end is not None):
+    t0 = capture.time_ns(0)
+    start_ns = None if args.start is None else t0+int(args.start*1e9)
+    end_ns = None if args.end is None else t0+int(args.end*1e9)
+  return capture.select(opcode=args.opcode, src=args.src, dst=args.dst, msg_id=args.msg_id,
+   hw_id=args.hw_id, start_ns=start_ns, end_ns=end_ns)
+
+## JSON line of a frame with its receive time in seconds
+def frame_to_json(t_ns, frame):
+  return '{"t":'+'{:.6f}'.format(t_ns/1e9)+','+decode_cmd(frame).to_json()[1:]
+
+## Frames of a raw dump, timed by their wire time at baud
+def convert(dump_path, capture_path, baud, chunk_size=1<<20):
+  rx_cmd_buff = RxCmdBuff()
+  wire_ns = 10*1e9/baud
+  wire_bytes = 0
+  with open(dump_path, 'rb') as dump, CaptureWriter(capture_path) as writer:
+    while True:
+      chunk = dump.read(chunk_size)
+      if not chunk:
+        break
+      for frame in rx_cmd_buff.feed(chunk):
+        data = frame.frame()
+        wire_bytes += len(data)
+        writer.append(data, int(wire_bytes*wire_ns))
+    return writer.count
+
+async def record(args):
+  if args.serial:
+    import serial_asyncio
+    reader, writer = await serial_asyncio.open_serial_connection(url=args.serial, baudrate=args.baud)
+  else:
+    host, port = args.tcp.rsplit(':', 1)
+    reader, writer = await asyncio.open_connection(host, int(port))
+  rx_cmd_buff = RxCmdBuff()
+  with CaptureWriter(args.capture) as capture:
+    try:
+      while True:
+        chunk = await reader.read(4096)
+        if not chunk:
+          break
+        t_ns = time.time_ns()
+        for frame in rx_cmd_buff.feed(chunk):
+          capture.append(frame.frame(), t_ns)
+        capture.flush()
+    finally:
+      writer.close()
+      print('{} frames in {}'.format(capture.count, args.capture), file=sys.stderr)
+
+## Sends or prints the selected frames at their recorded timing
+def replay(args):
+  send = None
+  if args.tcp:
+    import socket
+    host, port = args.tcp.rsplit(':', 1)
+    sock = socket.create_connection((host, int(port)))
+    send = sock.sendall
+  elif args.serial:
+    import serial
+    port = serial.Serial(args.serial, args.baud)
+    send = port.write
+  count = 0
+  with Capture(args.capture) as capture:
+    for t_ns, frame in capture.replay(select_args(capture, args), args.speed):
+      if send is None:
+        print(frame_to_json(t_ns, frame))
+      else:
+        send(frame)
+      count += 1
+  print('{} frames replayed'.format(count), file=sys.stderr)
+
+## Synthetic pass of telemetry, acks and debug frames from CDH to GND
+def make_pass(frame_count, seed=0):
+  import random
+  rng = random.Random(seed)
+  kinds = ((APP_TELEM_OPCODE, 0x54-0x06), (COMMON_ACK_OPCODE, 0), (COMMON_DEBUG_OPCODE, 24))
+  t_ns = 0
+  for msg_id in range(frame_count):
+    opcode, pld_len = kinds[0] if rng.random() < 0.7 else rng.choice(kinds[1:])
+    t_ns += rng.randrange(1000000, 20000000)
+    frame = bytes([START_BYTE_0, START_BYTE_1, 0x06+pld_len, 0x12, 0x00,
+     (msg_id >> 0) & 0xff, (msg_id >> 8) & 0xff, (CDH << 4) | (GND << 0), opcode]) + rng.randbytes(pld_len)
+    yield t_ns, frame
+
+## Times "APP_TELEM frames from CDH in a msg_id range" on a capture and by
+## re-parsing the raw dump with RxCmdBuff.feed
+def bench(args):
+  msg_id = (0x1000, 0x1fff)
+  with tempfile.TemporaryDirectory() as tmp:
+    dump_path = os.path.join(tmp, 'pass.bin')
+    capture_path = os.path.join(tmp, 'pass.tabcap')
+    with open(dump_path, 'wb') as dump, CaptureWriter(capture_path) as writer:
+      for t_ns, frame in make_pass(args.frames):
+        dump.write(frame)
+        writer.append(frame, t_ns)
+    size = os.path.getsize(dump_path)
+
+    t0 = time.perf_counter()
+    expected = []
+    rx_cmd_buff = RxCmdBuff()
+    with open(dump_path, 'rb') as dump:
+      while True:
+        chunk = dump.read(1<<20)
+        if not chunk:
+          break
+        for frame in rx_cmd_buff.feed(chunk):
+          data = frame.data
+          if data[OPCODE_INDEX] == APP_TELEM_OPCODE and (data[ROUTE_INDEX] >> 4) == CDH and \
+             in_range((data[MSG_ID_MSB_INDEX]<<8)|(data[MSG_ID_LSB_INDEX]<<0), msg_id):
+            expected.append(bytes(frame.frame()))
+    t_parse = time.perf_counter()-t0
+
+    t0 = time.perf_counter()
+    with Capture(capture_path) as capture:
+      rows = list(capture.select(opcode=APP_TELEM_OPCODE, src=CDH, msg_id=msg_id))
+      t_query = time.perf_counter()-t0
+      if [bytes(frame) for _, frame in capture.frames(rows)] != expected:
+        raise SystemExit('indexed query returned different frames than re-parsing')
+      t0 = time.perf_counter()
+      for _ in capture.replay(capture.select(), speed=0):
+        pass
+      t_iterate = time.perf_counter()-t0
+    os.remove(index_path(capture_path))
+    t0 = time.perf_counter()
+    build_index(capture_path)
+    t_index = time.perf_counter()-t0
+
+  print('dump:        {:.1f} MB, {} frames, {} matches'.format(size/1e6, args.frames, len(expected)))
+  print('re-parse:    {:8.3f} s'.format(t_parse))
+  print('query:       {:8.3f} s  ({:.0f}x)'.format(t_query, t_parse/t_query))
+  print('iterate all: {:8.3f} s {:10.0f} frames/s'.format(t_iterate, args.frames/t_iterate))
+  print('rebuild idx: {:8.3f} s'.format(t_index))
+
+def add_filters(parser):
+  parser.add_argument('--opcode', type=parse_opcode, help='opcode name (e.g. app_telem) or number')
+  parser.add_argument('--src', type=parse_route, help='source node (gnd, com, cdh, pld)')
+  parser.add_argument('--dst', type=parse_route, help='destination node (gnd, com, cdh, pld)')
+  parser.add_argument('--msg-id', type=parse_range, help='msg_id or FIRST:LAST')
+  parser.add_argument('--hw-id', type=parse_range, help='hw_id or FIRST:LAST')
+  parser.add_argument('--start', type=float, help='seconds after the first frame')
+  parser.add_argument('--end', type=float, help='seconds after the first frame')
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Indexed TAB captures')
+  commands = parser.add_subparsers(dest='command', required=True)
+  p = commands.add_parser('record', help='capture received frames')
+  p.add_argument('capture')
+  p.add_argument('--serial', help='serial port or pty')
+  p.add_argument('--tcp', help='host:port')
+  p.add_argument('--baud', type=int, default=38400, help='serial baud rate (default: 38400)')
+  p = commands.add_parser('convert', help='raw serial dump to capture')
+  p.add_argument('dump')
+  p.add_argument('capture')
+  p.add_argument('--baud', type=int, default=38400, help='line rate for the frame times (default: 38400)')
+  p = commands.add_parser('query', help='print matching frames')
+  p.add_argument('capture')
+  p.add_argument('--text', action='store_true', help='print cmd_bytes_to_str text instead of JSON')
+  p.add_argument('--count', action='store_true', help='only print the number of matches')
+  add_filters(p)
+  p = commands.add_parser('replay', help='send matching frames at their recorded timing')
+  p.add_argument('capture')
+  p.add_argument('--tcp', help='host:port to send to')
+  p.add_argument('--serial', help='serial port to send to')
+  p.add_argument('--baud', type=int, default=38400, help='serial baud rate (default: 38400)')
+  p.add_argument('--speed', type=float, default=1.0, help='replay speed-up, 0 for no delay (default: 1.0)')
+  add_filters(p)
+  p = commands.add_parser('bench', help='indexed query vs. re-parsing')
+  p.add_argument('--frames', type=int, default=1000000, help='frames in the synthetic pass (default: 1000000)')
+  args = parser.parse_args()
+
+  if args.command == 'record':
+    if not args.serial and not args.tcp:
+      parser.error('record needs --serial or --tcp')
+    try:
+      asyncio.run(record(args))
+    except KeyboardInterrupt:
+      pass
+  elif args.command == 'convert':
+    print('{} frames in {}'.format(convert(args.dump, args.capture, args.baud), args.capture))
+  elif args.command == 'query':
+    with Capture(args.capture) as capture:
+      rows = select_args(capture, args)
+      if args.count:
+        print(sum(1 for _ in rows))
+      else:
+        for t_ns, frame in capture.frames(rows):
+          print(str(decode_cmd(frame)) if args.text else frame_to_json(t_ns, frame))
+  elif args.command == 'replay':
+    replay(args)
+  else:
+    bench(args)
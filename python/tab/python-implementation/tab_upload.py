@@ -0,0 +1,317 @@
+# tab_upload.py
+#
+# Usage: python3 tab_upload.py FILE --serial /dev/ttyUSB0 [--baud 921600] [--address 0x0]
+#        python3 tab_upload.py FILE --tcp host:port [--manifest ../../../build/flash.json]
+#        python3 tab_upload.py FILE [--baud 921600]
+# Parameters:
+#  FILE: file to write to the external flash, e.g. build/flash.bin from
+#   python/flash_image.py, or models/model.tflite
+#  --serial, --tcp: TAB endpoint with the flash; without either, the upload
+#   goes to an in-process stand-in that emulates the IS25LP128F
+#  --address: flash address of the first byte of FILE
+#  --manifest: flash_image.py manifest; FILE goes to its model_offset. FILE
+#   must be the model the image was built with (the flash header holds its
+#   size and SHA-256); for another model, rebuild and upload the whole flash.bin
+#  --window: write commands in flight
+#  --state: progress file for resuming (default: FILE.upload.json, none for
+#   the stand-in)
+# Output:
+#  Prints progress, the read-back checksum summary and the effective rate
+#  against the line rate
+#
+# Windowed upload over COMMON_ERASE_SECTOR_EXT, COMMON_WRITE_EXT and
+# COMMON_READ_EXT. The upload covers whole 4 KB sectors: bytes of the first
+# and last sector outside FILE are read back first and written again after the
+# erase. Every write carries PLD_MAX_LEN-5 = 244 data bytes (the rest of the
+# payload is the flash ID and address); chunks that are all 0xFF are skipped
+# since the sector is erased. Up to --window erases, writes or reads are in
+# flight at once through TabClient. After the writes, the whole region is read
+# back and compared chunk by chunk and by CRC-32.
+#
+# Progress (erased sectors and the acknowledged prefix of the writes) goes to
+# the --state file. After a link drop the upload reconnects up to --reconnect
+# times, and a rerun of the same command resumes from the last acknowledged
+# address.
+#
+# The endpoint acks erases and writes with COMMON_ACK and answers
+# COMMON_READ_EXT with a COMMON_WRITE_EXT frame carrying the address and the
+# bytes read; FlashEndpoint below does the same.
+#
+# See the top-level LICENSE file for the license.
+
+# import Python modules
+import argparse # argument parsing
+import asyncio  # gather
+import hashlib  # sha256
+import json     # manifest and state files
+import os       # path
+import time     # perf_counter
+import zlib     # crc32
+
+# import TAB
+from tab import *
+from tab_async import StandInEndpoint, TabClient, UART_BITS_PER_BYTE
+
+## IS25LP128F
+SECTOR_SIZE = 4096
+FLASH_SIZE = 16 << 20
+
+## Data bytes per COMMON_WRITE_EXT and COMMON_READ_EXT
+CHUNK_SIZE = PLD_MAX_LEN-0x05
+
+## Bytes on the wire for one full write
+WRITE_FRAME_LEN = 0x0b+CHUNK_SIZE+0x03
+
+## Sector-aligned region [start, end) covering size bytes at address
+def sector_region(address, size):
+  start = address//SECTOR_SIZE*SECTOR_SIZE
+  end = (address+size+SECTOR_SIZE-1)//SECTOR_SIZE*SECTOR_SIZE
+  return start, end
+
+## Upload progress, saved as JSON so an interrupted upload can resume
+class UploadState:
+  def __init__(self, path, digest, address):
+    self.path = path
+    self.digest = digest
+    self.address = address
+    self.head = None
+    self.tail = None
+    self.erased = set()
+    self.written = 0
+    if path and os.path.exists(path):
+      with open(path) as f:
+        saved = json.load(f)
+      if saved.get('sha256') == digest and saved.get('address') == address:
+        self.head = bytes.fromhex(saved['head']) if saved.get('head') is not None else None
+        self.tail = bytes.fromhex(saved['tail']) if saved.get('tail') is not None else None
+        self.erased = set(saved['erased'])
+        self.written = saved['written']
+
+  def save(self):
+    if self.path:
+      with open(self.path, 'w') as f:
+        json.dump({'sha256': self.digest, 'address': self.address,
+                   'head': self.head.hex() if self.head is not None else None,
+                   'tail': self.tail.hex() if self.tail is not None else None,
+                   'erased': sorted(self.erased), 'written': self.written}, f)
+
+## Runs the coroutines concurrently; if one fails, the rest are cancelled
+async def run_all(coros):
+  tasks = [asyncio.ensure_future(c) for c in coros]
+  try:
+    return await asyncio.gather(*tasks)
+  except BaseException:
+    for task in tasks:
+      task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    raise
+
+async def read_ext(client, address, length):
+  cmd = client.cmd(COMMON_READ_EXT_OPCODE)
+  cmd.common_read_ext(address, length)
+  reply = await client.request(cmd)
+  if reply[OPCODE_INDEX] != COMMON_WRITE_EXT_OPCODE or \
+     addr_from_bytes(reply, PLD_START_INDEX+1) != address:
+    raise RuntimeError('bad reply to read at 0x{:08x}: {}'.format(address, cmd_bytes_to_str(reply)))
+  return reply[PLD_START_INDEX+5:reply[MSG_LEN_INDEX]+0x03]
+
+## Reads [start, end) in CHUNK_SIZE reads, window of them in flight
+async def read_region(client, start, end):
+  chunks = await run_all((
+   read_ext(client, a, min(CHUNK_SIZE, end-a)) for a in range(start, end, CHUNK_SIZE)))
+  return b''.join(chunks)
+
+async def expect_ack(client, cmd, what):
+  reply = await client.request(cmd)
+  if reply[OPCODE_INDEX] != COMMON_ACK_OPCODE:
+    raise RuntimeError(what+' failed: '+cmd_bytes_to_str(reply))
+
+## Erases, writes and verifies data at address, resuming from state
+async def upload(client, data, address, state, progress=None):
+  start, end = sector_region(address, len(data))
+  # bytes of the first and last sector outside data survive the erase
+  if state.head is None:
+    state.head = await read_region(client, start, address)
+    state.tail = await read_region(client, address+len(data), end)
+    state.save()
+  image = state.head+bytes(data)+state.tail
+
+  async def erase(sector):
+    cmd = client.cmd(COMMON_ERASE_SECTOR_EXT_OPCODE)
+    cmd.common_erase_sector_ext(sector)
+    await expect_ack(client, cmd, 'erase at 0x{:08x}'.format(sector))
+    state.erased.add(sector)
+  await run_all((erase(s) for s in range(start, end, SECTOR_SIZE) if s not in state.erased))
+  state.save()
+
+  # writes are acknowledged out of order; the state keeps the acknowledged
+  # prefix, which is where a resumed upload starts
+  offsets = list(range(state.written, len(image), CHUNK_SIZE))
+  done = set()
+  written = 0
+  async def write(offset):
+    nonlocal written
+    chunk = image[offset:offset+CHUNK_SIZE]
+    if chunk.count(0xff) != len(chunk):
+      cmd = client.cmd(COMMON_WRITE_EXT_OPCODE)
+      cmd.common_write_ext(start+offset, chunk)
+      await expect_ack(client, cmd, 'write at 0x{:08x}'.format(start+offset))
+      written += len(chunk)
+    done.add(offset)
+    while state.written in done:
+      done.discard(state.written)
+      state.written = min(state.written+CHUNK_SIZE, len(image))
+    if progress:
+      progress(state.written, len(image))
+  t0 = time.perf_counter()
+  try:
+    await run_all((write(o) for o in offsets))
+  finally:
+    state.save()
+  write_s = time.perf_counter()-t0
+
+  readback = await read_region(client, start, end)
+  bad = [start+o for o in range(0, len(image), CHUNK_SIZE)
+         if readback[o:o+CHUNK_SIZE] != image[o:o+CHUNK_SIZE]]
+  return {
+    'start': start,
+    'end': end,
+    'crc32': zlib.crc32(image),
+    'readback_crc32': zlib.crc32(readback),
+    'bad_chunks': bad,
+    'written': written,
+    'write_s': write_s,
+  }
+
+## Stand-in endpoint with an emulated NOR flash: erase sets a sector to 0xFF,
+## writes can only clear bits
+##   close_after: drop the connection after this many commands, 0 never
+class FlashEndpoint(StandInEndpoint):
+  def __init__(self, close_after=0, **kwargs):
+    super().__init__(**kwargs)
+    self.flash = bytearray(b'\xff')*FLASH_SIZE
+    self.close_after = close_after
+
+  def respond(self, cmd, tx_cmd_buff):
+    opcode = cmd.data[OPCODE_INDEX]
+    if opcode not in (COMMON_ERASE_SECTOR_EXT_OPCODE, COMMON_WRITE_EXT_OPCODE, COMMON_READ_EXT_OPCODE):
+      return super().respond(cmd, tx_cmd_buff)
+    if self.close_after and self.received >= self.close_after:
+      self.close_after = 0
+      raise ConnectionResetError('stand-in link drop')
+    tx_cmd_buff.generate_reply(cmd)
+    address = addr_from_bytes(cmd.data, PLD_START_INDEX+1)
+    if opcode == COMMON_ERASE_SECTOR_EXT_OPCODE:
+      sector = address//SECTOR_SIZE*SECTOR_SIZE
+      self.flash[sector:sector+SECTOR_SIZE] = b'\xff'*SECTOR_SIZE
+    elif opcode == COMMON_WRITE_EXT_OPCODE:
+      data = cmd.data[PLD_START_INDEX+5:cmd.get_byte_count()]
+      old = self.flash[address:address+len(data)]
+      self.flash[address:address+len(data)] = bytes(a & b for a, b in zip(old, data))
+    else:
+      data = self.flash[address:address+cmd.data[PLD_START_INDEX+5]]
+      tx_cmd_buff.data[MSG_LEN_INDEX] = 0x0b+len(data)
+      tx_cmd_buff.data[OPCODE_INDEX] = COMMON_WRITE_EXT_OPCODE
+      tx_cmd_buff.data[PLD_START_INDEX:PLD_START_INDEX+5] = cmd.data[PLD_START_INDEX:PLD_START_INDEX+5]
+      tx_cmd_buff.data[PLD_START_INDEX+5:PLD_START_INDEX+5+len(data)] = data
+      return True
+    tx_cmd_buff.data[MSG_LEN_INDEX] = 0x06
+    tx_cmd_buff.data[OPCODE_INDEX] = COMMON_ACK_OPCODE
+    return True
+
+async def connect(args):
+  options = {'window': args.window, 'timeout': args.timeout, 'retries': args.retries}
+  if args.serial:
+    return await TabClient.open_serial(args.serial, args.baud, **options)
+  host, port = args.tcp.rsplit(':', 1)
+  return await TabClient.open_tcp(host, int(port), **options)
+
+async def main(args):
+  with open(args.file, 'rb') as f:
+    data = f.read()
+  address = args.address
+  if args.manifest:
+    with open(args.manifest) as f:
+      manifest = json.load(f)
+    address = manifest['model_offset']
+    rebuild = '; rebuild the image with python/flash_image.py and upload the whole flash.bin'
+    if len(data) > manifest['images_offset']-address:
+      raise SystemExit('{} bytes do not fit the {} byte model section of {}{}'.format(
+       len(data), manifest['images_offset']-address, args.manifest, rebuild))
+    if hashlib.sha256(data).hexdigest() != manifest['model_sha256']:
+      raise SystemExit('{} is not the model in the flash header of {}{}'.format(args.file, args.manifest, rebuild))
+  if address+len(data) > FLASH_SIZE:
+    raise SystemExit('{} bytes at 0x{:08x} do not fit the {} byte flash'.format(len(data), address, FLASH_SIZE))
+  # the stand-in flash starts erased in every run, so it only resumes within
+  # a run unless --state is given
+  stand_in = not args.serial and not args.tcp
+  state_path = args.state or (None if stand_in else args.file+'.upload.json')
+  state = UploadState(state_path, hashlib.sha256(data).hexdigest(), address)
+  if state.written:
+    print('resuming at 0x{:08x}'.format(sector_region(address, 0)[0]+state.written))
+
+  endpoint = None
+  if stand_in:
+    endpoint = FlashEndpoint(latency=args.latency, baud=args.baud, close_after=args.drop_after)
+    host, port = await endpoint.start()
+    args.tcp = '{}:{}'.format(host, port)
+    print('stand-in flash endpoint: {} baud, {:.0f} ms latency'.format(args.baud, 1000*args.latency))
+
+  def progress(written, total):
+    print('\r  wrote {:8d} / {:8d} bytes'.format(written, total), end='', flush=True)
+
+  t0 = time.perf_counter()
+  attempts = 0
+  while True:
+    client = await connect(args)
+    try:
+      result = await upload(client, data, address, state, progress)
+      break
+    except (ConnectionError, TimeoutError) as e:
+      attempts += 1
+      print('\n  link lost at 0x{:08x}: {}'.format(sector_region(address, 0)[0]+state.written, e))
+      if attempts > args.reconnect:
+        raise SystemExit('giving up; rerun the same command to resume')
+      await asyncio.sleep(args.reconnect_delay)
+    finally:
+      await client.close()
+  elapsed = time.perf_counter()-t0
+  print()
+  if endpoint is not None:
+    await endpoint.close()
+
+  ok = not result['bad_chunks'] and result['crc32'] == result['readback_crc32']
+  line_rate = args.baud/UART_BITS_PER_BYTE
+  ceiling = line_rate*CHUNK_SIZE/WRITE_FRAME_LEN
+  print('region:    0x{:08x}-0x{:08x} ({} sectors)'.format(result['start'], result['end'],
+   (result['end']-result['start'])//SECTOR_SIZE))
+  print('crc32:     expected 0x{:08x}, read back 0x{:08x}, {} bad chunks{}'.format(
+   result['crc32'], result['readback_crc32'], len(result['bad_chunks']),
+   ''.join(' 0x{:08x}'.format(a) for a in result['bad_chunks'][:8])))
+  print('time:      {:.2f} s for {} bytes, erase, write and read-back'.format(elapsed, len(data)))
+  print('rate:      {:.0f} B/s overall, {:.0f} B/s while writing; line rate {:.0f} B/s, write ceiling {:.0f} B/s ({:.0f}%)'.format(
+   len(data)/elapsed, result['written']/result['write_s'], line_rate, ceiling,
+   100*result['written']/result['write_s']/ceiling))
+  if not ok:
+    raise SystemExit('verify failed')
+  if state.path and os.path.exists(state.path):
+    os.remove(state.path)
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Windowed upload of a file to the external flash over TAB')
+  parser.add_argument('file', help='file to upload')
+  parser.add_argument('--serial', help='serial port or pty of the TAB endpoint')
+  parser.add_argument('--tcp', help='host:port of the TAB endpoint')
+  parser.add_argument('--baud', type=int, default=921600, help='line rate (default: 921600)')
+  parser.add_argument('--address', type=lambda s: int(s, 0), default=0, help='flash address (default: 0)')
+  parser.add_argument('--manifest', help='flash_image.py manifest; upload to its model_offset')
+  parser.add_argument('--window', type=int, default=8, help='commands in flight (default: 8)')
+  parser.add_argument('--timeout', type=float, default=1.0, help='seconds before a retransmit (default: 1.0)')
+  parser.add_argument('--retries', type=int, default=3, help='retransmits per command (default: 3)')
+  parser.add_argument('--reconnect', type=int, default=3, help='reconnects after a link drop (default: 3)')
+  parser.add_argument('--reconnect-delay', type=float, default=1.0, help='seconds before reconnecting (default: 1.0)')
+  parser.add_argument('--state', help='progress file (default: FILE.upload.json with an endpoint)')
+  parser.add_argument('--latency', type=float, default=0.002, help='stand-in reply latency in seconds (default: 0.002)')
+  parser.add_argument('--drop-after', type=int, default=0, help='stand-in drops the link after this many commands (default: never)')
+  args = parser.parse_args()
+  asyncio.run(main(args))
@@ -0,0 +1,263 @@
+# tflite_model.py
+#
+# Minimal pure-Python reader for .tflite flatbuffers
+#
+# Reads the parts of the TFLite schema the analysis tools need (tensors,
+# operators, builtin options, quantization and constant buffers) with struct
+# alone, so the tools start in milliseconds and do not need TensorFlow or the
+# flatbuffers package. Field numbers follow tensorflow/lite/schema/schema.fbs.
+#
+# Usage: model = read_model('models/model.tflite')
+#        for op in model.operators: print(op.opcode, op.inputs, op.outputs)
+
+import struct
+
+## TensorType -> (name, numpy dtype name, bytes per element)
+TENSOR_TYPES = {
+    0: ('FLOAT32', 'float32', 4),
+    1: ('FLOAT16', 'float16', 2),
+    2: ('INT32', 'int32', 4),
+    3: ('UINT8', 'uint8', 1),
+    4: ('INT64', 'int64', 8),
+    6: ('BOOL', 'bool', 1),
+    7: ('INT16', 'int16', 2),
+    9: ('INT8', 'int8', 1),
+    10: ('FLOAT64', 'float64', 8),
+}
+
+## BuiltinOperator codes 0-126
+BUILTIN_OPERATORS = (
+    'ADD AVERAGE_POOL_2D CONCATENATION CONV_2D DEPTHWISE_CONV_2D DEPTH_TO_SPACE '
+    'DEQUANTIZE EMBEDDING_LOOKUP FLOOR FULLY_CONNECTED HASHTABLE_LOOKUP '
+    'L2_NORMALIZATION L2_POOL_2D LOCAL_RESPONSE_NORMALIZATION LOGISTIC '
+    'LSH_PROJECTION LSTM MAX_POOL_2D MUL RELU RELU_N1_TO_1 RELU6 RESHAPE '
+    'RESIZE_BILINEAR RNN SOFTMAX SPACE_TO_DEPTH SVDF TANH CONCAT_EMBEDDINGS '
+    'SKIP_GRAM CALL CUSTOM EMBEDDING_LOOKUP_SPARSE PAD '
+    'UNIDIRECTIONAL_SEQUENCE_RNN GATHER BATCH_TO_SPACE_ND SPACE_TO_BATCH_ND '
+    'TRANSPOSE MEAN SUB DIV SQUEEZE UNIDIRECTIONAL_SEQUENCE_LSTM STRIDED_SLICE '
+    'BIDIRECTIONAL_SEQUENCE_RNN EXP TOPK_V2 SPLIT LOG_SOFTMAX DELEGATE '
+    'BIDIRECTIONAL_SEQUENCE_LSTM CAST PRELU MAXIMUM ARG_MAX MINIMUM LESS NEG '
+    'PADV2 GREATER GREATER_EQUAL LESS_EQUAL SELECT SLICE SIN TRANSPOSE_CONV '
+    'SPARSE_TO_DENSE TILE EXPAND_DIMS EQUAL NOT_EQUAL LOG SUM SQRT RSQRT SHAPE '
+    'POW ARG_MIN FAKE_QUANT REDUCE_PROD REDUCE_MAX PACK LOGICAL_OR ONE_HOT '
+    'LOGICAL_AND LOGICAL_NOT UNPACK REDUCE_MIN FLOOR_DIV REDUCE_ANY SQUARE '
+    'ZEROS_LIKE FILL FLOOR_MOD RANGE RESIZE_NEAREST_NEIGHBOR LEAKY_RELU '
+    'SQUARED_DIFFERENCE MIRROR_PAD ABS SPLIT_V UNIQUE CEIL REVERSE_V2 ADD_N '
+    'GATHER_ND COS WHERE RANK ELU REVERSE_SEQUENCE MATRIX_DIAG QUANTIZE '
+    'MATRIX_SET_DIAG ROUND HARD_SWISH IF WHILE NON_MAX_SUPPRESSION_V4 '
+    'NON_MAX_SUPPRESSION_V5 SCATTER_ND SELECT_V2 DENSIFY SEGMENT_SUM BATCH_MATMUL'
+).split()
+
+## ActivationFunctionType and Padding enums
+ACTIVATIONS = ('NONE', 'RELU', 'RELU_N1_TO_1', 'RELU6', 'TANH', 'SIGN_BIT')
+PADDINGS = ('SAME', 'VALID')
+
+## Builtin options tables: opcode -> ((field name, struct format, default), ...)
+## in schema field order. Fields named *activation*/padding are decoded to
+## enum names.
+_OPTIONS = {
+    'CONV_2D': (('padding', 'b', 0), ('stride_w', 'i', 0), ('stride_h', 'i', 0),
+                ('fused_activation_function', 'b', 0),
+                ('dilation_w_factor', 'i', 1), ('dilation_h_factor', 'i', 1)),
+    'DEPTHWISE_CONV_2D': (('padding', 'b', 0), ('stride_w', 'i', 0), ('stride_h', 'i', 0),
+                          ('depth_multiplier', 'i', 0), ('fused_activation_function', 'b', 0),
+                          ('dilation_w_factor', 'i', 1), ('dilation_h_factor', 'i', 1)),
+    'AVERAGE_POOL_2D': (('padding', 'b', 0), ('stride_w', 'i', 0), ('stride_h', 'i', 0),
+                        ('filter_width', 'i', 0), ('filter_height', 'i', 0),
+                        ('fused_activation_function', 'b', 0)),
+    'FULLY_CONNECTED': (('fused_activation_function', 'b', 0), ('weights_format', 'b', 0),
+                        ('keep_num_dims', '?', False)),
+    'SOFTMAX': (('beta', 'f', 0.0),),
+}
+_OPTIONS['MAX_POOL_2D'] = _OPTIONS['AVERAGE_POOL_2D']
+
+
+## Read-only view of one flatbuffer table
+class _Table:
+    __slots__ = ('buf', 'pos', 'vtable', 'vtable_len')
+
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        self.vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+        self.vtable_len = struct.unpack_from('<H', buf, self.vtable)[0]
+
+    def _field(self, field):
+        o = 4 + 2*field
+        if o >= self.vtable_len:
+            return 0
+        return struct.unpack_from('<H', self.buf, self.vtable+o)[0]
+
+    def _indirect(self, field):
+        o = self._field(field)
+        if not o:
+            return None
+        p = self.pos + o
+        return p + struct.unpack_from('<I', self.buf, p)[0]
+
+    def has(self, field):
+        return self._field(field) != 0
+
+    def scalar(self, field, fmt, default=0):
+        o = self._field(field)
+        return struct.unpack_from('<'+fmt, self.buf, self.pos+o)[0] if o else default
+
+    def table(self, field):
+        p = self._indirect(field)
+        return None if p is None else _Table(self.buf, p)
+
+    def string(self, field):
+        p = self._indirect(field)
+        if p is None:
+            return ''
+        n = struct.unpack_from('<I', self.buf, p)[0]
+        return bytes(self.buf[p+4:p+4+n]).decode('utf-8', 'replace')
+
+    def vector(self, field, fmt):
+        p = self._indirect(field)
+        if p is None:
+            return ()
+        n = struct.unpack_from('<I', self.buf, p)[0]
+        return struct.unpack_from('<%d%s' % (n, fmt), self.buf, p+4)
+
+    def bytes(self, field):
+        p = self._indirect(field)
+        if p is None:
+            return None
+        n = struct.unpack_from('<I', self.buf, p)[0]
+        return memoryview(self.buf)[p+4:p+4+n]
+
+    def tables(self, field):
+        p = self._indirect(field)
+        if p is None:
+            return []
+        n = struct.unpack_from('<I', self.buf, p)[0]
+        out = []
+        for i in range(n):
+            q = p + 4 + 4*i
+            out.append(_Table(self.buf, q+struct.unpack_from('<I', self.buf, q)[0]))
+        return out
+
+
+class Tensor:
+    __slots__ = ('index', 'name', 'shape', 'type', 'dtype', 'itemsize', 'buffer',
+                 'data', 'scale', 'zero_point', 'quantized_dimension', 'is_variable')
+
+    def __init__(self, index, t, buffers):
+        self.index = index
+        self.name = t.string(3)
+        self.shape = tuple(t.vector(0, 'i'))
+        self.type, self.dtype, self.itemsize = TENSOR_TYPES.get(t.scalar(1, 'b'), ('UNKNOWN', None, 0))
+        self.buffer = t.scalar(2, 'I')
+        self.data = buffers[self.buffer] if self.buffer < len(buffers) else None
+        q = t.table(4)
+        self.scale = q.vector(2, 'f') if q else ()
+        self.zero_point = q.vector(3, 'q') if q else ()
+        self.quantized_dimension = q.scalar(6, 'i') if q else 0
+        self.is_variable = t.scalar(5, '?', False)
+
+    # Constant tensors carry their data in the flatbuffer; the rest need arena
+    # memory at runtime
+    @property
+    def is_constant(self):
+        return self.data is not None and len(self.data) > 0
+
+    @property
+    def size(self):
+        n = 1
+        for d in self.shape:
+            n *= max(d, 1)
+        return n
+
+    @property
+    def nbytes(self):
+        return self.size*self.itemsize
+
+    def __repr__(self):
+        return 'Tensor(%d, %r, %s, %s)' % (self.index, self.name, self.type, list(self.shape))
+
+
+class Operator:
+    __slots__ = ('index', 'opcode', 'inputs', 'outputs', 'options')
+
+    def __init__(self, index, op, opcodes):
+        self.index = index
+        self.opcode = opcodes[op.scalar(0, 'I')]
+        self.inputs = tuple(op.vector(1, 'i'))
+        self.outputs = tuple(op.vector(2, 'i'))
+        self.options = {}
+        spec = _OPTIONS.get(self.opcode)
+        options = op.table(4)
+        if spec and options is not None:
+            for field, (name, fmt, default) in enumerate(spec):
+                value = options.scalar(field, fmt, default)
+                if name == 'padding':
+                    value = PADDINGS[value]
+                elif name == 'fused_activation_function':
+                    value = ACTIVATIONS[value] if value < len(ACTIVATIONS) else str(value)
+                self.options[name] = value
+
+    def __repr__(self):
+        return 'Operator(%d, %s, %s -> %s)' % (self.index, self.opcode, list(self.inputs), list(self.outputs))
+
+
+class Model:
+    __slots__ = ('buf', 'version', 'description', 'tensors', 'operators', 'inputs', 'outputs')
+
+    def __init__(self, buf):
+        if bytes(buf[4:8]) != b'TFL3':
+            raise ValueError('not a TFLite flatbuffer (missing TFL3 identifier)')
+        self.buf = buf
+        root = _Table(buf, struct.unpack_from('<I', buf, 0)[0])
+        self.version = root.scalar(0, 'I')
+        self.description = root.string(3)
+        opcodes = []
+        for oc in root.tables(1):
+            # builtin_code replaced the byte-sized deprecated_builtin_code;
+            # writers fill both for codes below 127
+            code = max(oc.scalar(3, 'i'), oc.scalar(0, 'b'))
+            if code == BUILTIN_OPERATORS.index('CUSTOM'):
+                opcodes.append(oc.string(1) or 'CUSTOM')
+            elif code < len(BUILTIN_OPERATORS):
+                opcodes.append(BUILTIN_OPERATORS[code])
+            else:
+                opcodes.append('BUILTIN_%d' % code)
+        buffers = []
+        for b in root.tables(4):
+            data = b.bytes(0)
+            if data is None and b.scalar(1, 'Q') > 1:
+                # Models over 2 GB keep buffers after the flatbuffer
+                offset, size = b.scalar(1, 'Q'), b.scalar(2, 'Q')
+                data = memoryview(buf)[offset:offset+size]
+            buffers.append(data)
+        subgraphs = root.tables(2)
+        if len(subgraphs) != 1:
+            raise ValueError('expected one subgraph, found %d' % len(subgraphs))
+        sg = subgraphs[0]
+        self.tensors = [Tensor(i, t, buffers) for i, t in enumerate(sg.tables(0))]
+        self.inputs = tuple(sg.vector(1, 'i'))
+        self.outputs = tuple(sg.vector(2, 'i'))
+        self.operators = [Operator(i, op, opcodes) for i, op in enumerate(sg.tables(3))]
+
+
+# Multiply-accumulates of one operator for a batch of one. Pooling counts one
+# per window element, element-wise operators count zero.
+def macs(model, op):
+    out = model.tensors[op.outputs[0]]
+    per_image = out.size // max(out.shape[0], 1) if out.shape else out.size
+    if op.opcode == 'CONV_2D':
+        _, kh, kw, c = model.tensors[op.inputs[1]].shape
+        return per_image*kh*kw*c
+    if op.opcode == 'DEPTHWISE_CONV_2D':
+        _, kh, kw, _ = model.tensors[op.inputs[1]].shape
+        return per_image*kh*kw
+    if op.opcode == 'FULLY_CONNECTED':
+        return per_image*model.tensors[op.inputs[1]].shape[-1]
+    if op.opcode in ('AVERAGE_POOL_2D', 'MAX_POOL_2D'):
+        return per_image*op.options['filter_height']*op.options['filter_width']
+    return 0
+
+
+def read_model(path):
+    with open(path, 'rb') as f:
+        return Model(f.read())
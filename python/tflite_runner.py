@@ -0,0 +1,95 @@
+# tflite_runner.py
+#
+# Batched TFLite inference for the LeNet-5 models
+#
+# One interpreter is reused for a whole image set. The input tensor is resized
+# to the batch size once with resize_tensor_input(), the last partial batch is
+# zero-padded instead of reallocating, and quantized (int8/uint8) inputs and
+# outputs are scaled with the tensor's own quantization parameters.
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+class TFLiteRunner:
+    def __init__(self, model_path=None, model_content=None, batch_size=1, num_threads=None):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, model_content=model_content,
+                                               num_threads=num_threads)
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = 0
+        self.resize(batch_size)
+
+    def resize(self, batch_size):
+        if batch_size != self.batch_size:
+            shape = list(self.input_details['shape'])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self.input_details['index'], shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+            self._input = np.zeros(shape, dtype=self.input_details['dtype'])
+
+    # Copy one batch of images (n <= batch_size) into the input tensor,
+    # quantizing if the model takes integer input
+    def _set_input(self, x):
+        n = len(x)
+        dtype = self.input_details['dtype']
+        if dtype == np.float32:
+            self._input[:n] = x
+        else:
+            scale, zero_point = self.input_details['quantization']
+            info = np.iinfo(dtype)
+            q = np.round(np.asarray(x, dtype=np.float32) / scale) + zero_point
+            self._input[:n] = np.clip(q, info.min, info.max)
+        self._input[n:] = 0
+        self.interpreter.set_tensor(self.input_details['index'], self._input)
+
+    def _get_output(self, n):
+        out = self.interpreter.get_tensor(self.output_details['index'])[:n]
+        if self.output_details['dtype'] != np.float32:
+            scale, zero_point = self.output_details['quantization']
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out
+
+    # Scores for a single batch of at most batch_size images
+    def invoke(self, x):
+        self._set_input(x)
+        self.interpreter.invoke()
+        return self._get_output(len(x))
+
+    # Scores for any number of images
+    #   latencies: optional list that receives the wall time of each batch
+    def predict(self, x, latencies=None):
+        scores = np.empty((len(x), self.output_details['shape'][-1]), dtype=np.float32)
+        for start in range(0, len(x), self.batch_size):
+            t0 = time.perf_counter()
+            batch = x[start:start+self.batch_size]
+            scores[start:start+len(batch)] = self.invoke(batch)
+            if latencies is not None:
+                latencies.append(time.perf_counter() - t0)
+        return scores
+
+
+# Run a whole split through the runner and collect accuracy and timing
+#   reference: optional (N,C) scores from another backend; the argmax
+#   agreement rate with it is reported
+def evaluate(runner, x, y, reference=None):
+    latencies = []
+    start = time.perf_counter()
+    scores = runner.predict(x, latencies)
+    elapsed = time.perf_counter() - start
+    predicted = np.argmax(scores, axis=1)
+    lat_ms = 1000 * np.asarray(latencies)
+    result = {
+        'images': len(x),
+        'batch_size': runner.batch_size,
+        'accuracy': float(np.mean(predicted == np.asarray(y))),
+        'images_per_s': len(x) / elapsed,
+        'batch_p50_ms': float(np.percentile(lat_ms, 50)),
+        'batch_p99_ms': float(np.percentile(lat_ms, 99)),
+    }
+    if reference is not None:
+        result['agreement'] = float(np.mean(predicted == np.argmax(reference, axis=1)))
+    return result, scores
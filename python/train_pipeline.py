@@ -0,0 +1,113 @@
+# train_pipeline.py
+#
+# tf.data input pipeline and timing helpers for lenet_training.py
+#
+# The pipeline caches the raw uint8 images (4x smaller than caching floats),
+# shuffles, batches, converts whole batches to float32 with parallel map calls
+# and prefetches so the input work overlaps with the training step.
+
+import time
+
+import tensorflow as tf
+
+
+# Build a tf.data pipeline over (x, y) numpy arrays
+#   shuffle_buffer: 0 disables shuffling (e.g. for validation data)
+#   parallel_calls: number of parallel map calls, 0 selects AUTOTUNE
+#   stamps: a stamp_queue() for EpochTimer. Each batch then puts the wall time
+#           (tf.timestamp()) at which it is ready for the prefetch buffer into
+#           the queue, in pipeline order.
+def make_dataset(x, y, batch_size=64, shuffle_buffer=0, parallel_calls=0, cache=True, stamps=None):
+    num_parallel_calls = parallel_calls if parallel_calls > 0 else tf.data.AUTOTUNE
+    ds = tf.data.Dataset.from_tensor_slices((x, y))
+    if cache:
+        ds = ds.cache()
+    if shuffle_buffer > 0:
+        ds = ds.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(lambda xb, yb: (tf.cast(xb, tf.float32), yb), num_parallel_calls=num_parallel_calls)
+    if stamps is not None:
+        def stamp(xb, yb):
+            with tf.control_dependencies([stamps.enqueue(tf.timestamp())]):
+                return tf.identity(xb), yb
+        ds = ds.map(stamp)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+# Queue of the times the batches of a make_dataset() pipeline became ready, one
+# float64 per batch. Every training step takes one time out and the prefetch
+# buffer only runs a few batches ahead, so the capacity is never reached.
+def stamp_queue(capacity=4096):
+    return tf.queue.FIFOQueue(capacity, tf.float64, shapes=[])
+
+
+# Records per-epoch wall time, mean training step time and, given the number
+# of training samples per epoch, samples/sec. Given the stamp_queue() of a
+# make_dataset() pipeline, it also sums per epoch the time the steps spent
+# waiting for their batch: a step that starts after its batch was ready did
+# not wait, any other waited until the batch was ready. The first step of the
+# run is left out: the pipeline only starts on its first get_next(), after the
+# training function has been traced.
+class EpochTimer(tf.keras.callbacks.Callback):
+    def __init__(self, samples=None, stamps=None):
+        super().__init__()
+        self.samples = samples
+        self.stamps = stamps
+        self.epochs = []
+
+    def on_train_begin(self, logs=None):
+        self._first_step = True
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._step_total = 0.0
+        self._wait_total = 0.0
+        self._steps = 0
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_wall = time.time()
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._step_total += time.perf_counter() - self._step_start
+        self._steps += 1
+        if self.stamps is not None:
+            ready = float(self.stamps.dequeue())
+            if not self._first_step:
+                self._wait_total += max(ready - self._step_wall, 0.0)
+        self._first_step = False
+
+    def on_epoch_end(self, epoch, logs=None):
+        wall_s = time.perf_counter() - self._epoch_start
+        record = {
+            'epoch': epoch + 1,
+            'wall_s': wall_s,
+            'steps': self._steps,
+            'step_ms': 1000 * self._step_total / max(self._steps, 1),
+        }
+        if self.stamps is not None:
+            record['input_wait_s'] = self._wait_total
+            record['input_ms'] = 1000 * self._wait_total / max(self._steps, 1)
+        if self.samples is not None:
+            record['samples_per_s'] = self.samples / wall_s
+        if logs and 'val_loss' in logs:
+            record['val_loss'] = float(logs['val_loss'])
+        self.epochs.append(record)
+
+    # Print one row per epoch. input_ms is the mean time a step waited for its
+    # batch in that epoch; an input share near 100% means the step is waiting
+    # on input rather than on the math.
+    def report(self):
+        header = '{:>5} {:>9} {:>8} {:>10} {:>10} {:>9}'.format(
+         'epoch', 'wall_s', 'steps', 'step_ms', 'samples/s', 'val_loss')
+        if self.stamps is not None:
+            header += ' {:>11} {:>11}'.format('input_ms', 'input_share')
+        print(header)
+        for e in self.epochs:
+            row = '{:>5} {:>9.2f} {:>8} {:>10.3f} {:>10} {:>9}'.format(
+             e['epoch'], e['wall_s'], e['steps'], e['step_ms'],
+             '%.0f' % e['samples_per_s'] if 'samples_per_s' in e else '-',
+             '%.4f' % e['val_loss'] if 'val_loss' in e else '-')
+            if 'input_ms' in e:
+                row += ' {:>11.3f} {:>10.1f}%'.format(e['input_ms'], 100 * e['input_ms'] / max(e['step_ms'], 1e-9))
+            print(row)
@@ -0,0 +1,37 @@
+#ifndef FLASH_LAYOUT_H
+#define FLASH_LAYOUT_H
+
+#include <stdint.h>
+
+// Layout of the QSPI flash image written by python/flash_image.py. Keep the
+// header in sync with HEADER in that script.
+//
+//   0x000000  flash_image_header_t, rest of the sector erased (0xFF)
+//   labels    image_count bytes, sector aligned
+//   model     model_size bytes of .tflite, sector aligned
+//   images    image_count records of image_size bytes, sector aligned
+
+#define FLASH_IMAGE_MAGIC       0x49464E4Cu // "LNFI" read little endian
+#define FLASH_IMAGE_VERSION     1
+#define FLASH_IMAGE_HEADER_ADDR 0x00000000u
+#define FLASH_SECTOR_SIZE       4096u
+
+typedef struct {
+    uint32_t magic;
+    uint16_t version;
+    uint16_t header_size;
+    uint32_t sector_size;
+    uint32_t total_size;
+    uint32_t model_offset;
+    uint32_t model_size;
+    uint32_t labels_offset;
+    uint32_t images_offset;
+    uint32_t image_count;
+    uint32_t image_size;
+    uint16_t image_rows;
+    uint16_t image_cols;
+    uint8_t  model_sha256[32];
+    uint32_t header_crc32;  // CRC-32 (zlib) of all the fields above
+} flash_image_header_t;
+
+#endif // FLASH_LAYOUT_H
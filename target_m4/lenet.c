@@ -1,3 +1,4 @@
+#include <stddef.h>
 #include <stdio.h>
 #include <stdint.h>
 
@@ -10,6 +11,7 @@
 #include "IS25LP128F.h"
 
 #include "../target_x86/model_data.h"
+#include "flash_layout.h"
 
 
 struct quadspi_command read = {
@@ -92,94 +94,126 @@ int main(void) {
     return 0;
 }
 
-int run_lenet5_cnn(void) {
-    char string[9];
+static void usart_print(const char* s) {
+    while (*s) {
+        usart_send_blocking(USART1, *s++);
+    }
+}
+
+// CRC-32 as computed by zlib.crc32() in python/flash_image.py
+static uint32_t crc32(const uint8_t* data, uint32_t len) {
+    uint32_t crc = 0xFFFFFFFFu;
+    for (uint32_t i = 0; i < len; i++) {
+        crc ^= data[i];
+        for (int k = 0; k < 8; k++) {
+            crc = (crc >> 1) ^ (0xEDB88320u & -(crc & 1u));
+        }
+    }
+    return ~crc;
+}
 
-    read.address.address = 0x0000F004;
+static void flash_read(uint32_t address, uint8_t* data, uint32_t len) {
+    read.address.address = address;
     quadspi_wait_while_busy();
-    //quadspi_read(&read, lenet_model_tflite, lenet_model_tflite_len);
+    quadspi_read(&read, data, len);
+}
+
+static void print_image(const float* input) {
+    char string[9];
+    for(int i = 0; i < 32; i++)
+    {
+        for(int j = 0; j < 32; j++)
+        {
+            sprintf(string, "%3d ", (uint8_t)input[i*32+j]);
+            usart_print(string);
+        }
+        usart_print("\r\n");
+    }
+}
+
+static void print_output(const float* output) {
+    char string[9];
+    usart_print("Output: ");
+    for(int i = 0; i < 10; i++) {
+        sprintf(string, "0.%.6d", (int)(output[i]*1000000));
+        usart_send_blocking(USART1, ' ');
+        usart_print(string);
+    }
+    usart_print("\r\n");
+}
+
+int run_lenet5_cnn(void) {
+    char string[48];
+    flash_image_header_t header;
+
+    // The image layout comes from the header table written by
+    // python/flash_image.py instead of fixed addresses
+    flash_read(FLASH_IMAGE_HEADER_ADDR, (uint8_t*)&header, sizeof(header));
+    if(header.magic != FLASH_IMAGE_MAGIC || header.version != FLASH_IMAGE_VERSION ||
+       header.header_crc32 != crc32((const uint8_t*)&header, offsetof(flash_image_header_t, header_crc32)))
+    {
+        usart_print("ERR flash header\r\n");
+        return 1;
+    }
+    if(header.model_size != lenet_model_tflite_len)
+    {
+        usart_print("WARN flash model differs from linked model\r\n");
+    }
+    //flash_read(header.model_offset, lenet_model_tflite, header.model_size);
 
     // Initialize the TensorFlow Lite Micro interpreter.
     tflm_init(lenet_model_tflite);
 
-    usart_send_blocking(USART1, '\r');
-    usart_send_blocking(USART1, '\n');
+    usart_print("\r\n");
 
-    read.address.address = 0x00000004;
     float* input = tflm_get_input_buffer(0);
     //float input[32*32];
     uint8_t input_data[32*32];
 
-    if(input == NULL)
+    if(input == NULL || header.image_size != sizeof(input_data))
     {
-        usart_send_blocking(USART1, 'E');
-        usart_send_blocking(USART1, 'R');
-        usart_send_blocking(USART1, 'R');
-        usart_send_blocking(USART1, '\r');
-        usart_send_blocking(USART1, '\n');
+        usart_print("ERR\r\n");
         return 1;
     }
 
-    quadspi_wait_while_busy();
-    quadspi_read(&read, input_data, 32*32);
-
-    for (int i = 0; i < 32*32; i++) {
-        input[i] = input_data[i];
-    }
+    uint32_t correct = 0;
+    for (uint32_t n = 0; n < header.image_count; n++) {
+        uint8_t label;
+        flash_read(header.labels_offset + n, &label, 1);
+        flash_read(header.images_offset + n*header.image_size, input_data, sizeof(input_data));
 
-    for(int i = 0; i < 32; i++)
-    {
-        for(int j = 0; j < 32; j++)
-        {
-            uint8_t val = (uint8_t)input[i*32+j];
-            if(val < 10)
-            {
-                sprintf(string, "%.3d", val);
-                usart_send_blocking(USART1, ' ');
-                usart_send_blocking(USART1, ' ');
-                usart_send_blocking(USART1, string[0]);
-            }
-            else if(val < 100)
-            {
-                sprintf(string, "%.3d", val);
-                usart_send_blocking(USART1, ' ');
-                usart_send_blocking(USART1, string[0]);
-                usart_send_blocking(USART1, string[1]);
-            }
-            else
-            {
-                sprintf(string, "%.3d", val);
-                usart_send_blocking(USART1, string[0]);
-                usart_send_blocking(USART1, string[1]);
-                usart_send_blocking(USART1, string[2]);
-            }
-            usart_send_blocking(USART1, ' ');
+        for (int i = 0; i < 32*32; i++) {
+            input[i] = input_data[i];
+        }
+        if (n == 0) {
+            print_image(input);
         }
-        usart_send_blocking(USART1, '\r');
-        usart_send_blocking(USART1, '\n');
-    }
-
-    // Run inference.
-    tflm_invoke();
 
-    // Retrieve output predictions.
-    float* output = tflm_get_output_buffer(0);
+        // Run inference.
+        tflm_invoke();
 
-    sprintf(string, "Output: ");
-    for(int j = 0; j < 8; j++)
-    {
-        usart_send_blocking(USART1, string[j]);
-    }
+        // Retrieve output predictions.
+        float* output = tflm_get_output_buffer(0);
+        if (n == 0) {
+            print_output(output);
+        }
 
-    for(int i = 0; i < 10; i++) {
-        sprintf(string, "0.%.6d", (int)(output[i]*1000000));
-        usart_send_blocking(USART1, ' ');
-        for(int j = 0; j < 8; j++)
-        {
-            usart_send_blocking(USART1, string[j]);
+        int predicted = 0;
+        for (int i = 1; i < 10; i++) {
+            if (output[i] > output[predicted]) {
+                predicted = i;
+            }
+        }
+        if (predicted == label) {
+            correct++;
+        }
+        else {
+            sprintf(string, "image %lu: predicted %d, label %d\r\n", (unsigned long)n, predicted, label);
+            usart_print(string);
         }
     }
-    usart_send_blocking(USART1, '\r');
-    usart_send_blocking(USART1, '\n');
+
+    sprintf(string, "Correct: %lu/%lu\r\n", (unsigned long)correct, (unsigned long)header.image_count);
+    usart_print(string);
     return 0;
 }
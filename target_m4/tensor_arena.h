@@ -0,0 +1,9 @@
+// Generated by python/arena_planner.py from models/model.tflite
+//   planned tensors: 37632 bytes, persistent estimate: 2688 bytes, margin: 2048 bytes
+
+#ifndef TENSOR_ARENA_H
+#define TENSOR_ARENA_H
+
+#define TENSOR_ARENA_SIZE 43008 // 42 KB
+
+#endif // TENSOR_ARENA_H
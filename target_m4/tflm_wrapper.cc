@@ -5,6 +5,7 @@
 #include <tensorflow/lite/micro/system_setup.h>
 
 #include "tflm_wrapper.h"
+#include "tensor_arena.h"
 
 namespace {
   const tflite::Model* model = nullptr;
@@ -12,7 +13,8 @@ namespace {
   TfLiteTensor* input = nullptr;
   TfLiteTensor* output = nullptr;
 
-  constexpr int kTensorArenaSize = 100 * 1024; //  10 KB
+  // Generated by python/arena_planner.py for models/model.tflite
+  constexpr int kTensorArenaSize = TENSOR_ARENA_SIZE;
   __attribute__((aligned(16))) uint8_t tensor_arena[kTensorArenaSize];
 }  // namespace
 
@@ -54,4 +56,8 @@ extern "C" void tflm_invoke() {
     if (interpreter) {
         interpreter->Invoke();
     }
-}
\ No newline at end of file
+}
+
+extern "C" size_t tflm_arena_used_bytes() {
+    return interpreter ? interpreter->arena_used_bytes() : 0;
+}
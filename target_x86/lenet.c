@@ -116,7 +116,9 @@ void run_lenet5_cnn(void) {
 
     // Initialize the TensorFlow Lite Micro interpreter.
     //tflm_init(lenet5_model_data);
+    printf("Model sha256: %s\n", LENET_MODEL_TFLITE_SHA256);
     tflm_init(lenet_model_tflite);
+    printf("Arena used: %u bytes\n", (unsigned int)tflm_arena_used_bytes());
 
     // Prepare input data (28x28 grayscale image for LeNet-5).
     float* input = tflm_get_input_buffer(0);
@@ -1,9 +1,11 @@
-//#include <cstdint>
+// Generated by python/model_to_c.py from models/model.tflite
 
 #ifndef MODEL_DATA_H
 #define MODEL_DATA_H
 
-const unsigned int lenet_model_tflite_len = 251388;
+#define LENET_MODEL_TFLITE_SHA256 "5582b9aef8bf74ab052e615d0422939dbed7ffbf06f1aea2620ffabf9d792214"
+
+const unsigned int lenet_model_tflite_len = 251384;
 extern const unsigned char lenet_model_tflite[];
 
-#endif // MODEL_DATA_H
\ No newline at end of file
+#endif // MODEL_DATA_H
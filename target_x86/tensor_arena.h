@@ -0,0 +1,9 @@
+// Generated by python/arena_planner.py from models/model.tflite
+//   planned tensors: 37632 bytes, persistent estimate: 4224 bytes, margin: 2048 bytes
+
+#ifndef TENSOR_ARENA_H
+#define TENSOR_ARENA_H
+
+#define TENSOR_ARENA_SIZE 44032 // 43 KB
+
+#endif // TENSOR_ARENA_H
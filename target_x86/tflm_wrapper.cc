@@ -4,6 +4,7 @@
 #include <tensorflow/lite/schema/schema_generated.h>
 
 #include "tflm_wrapper.h"
+#include "tensor_arena.h"
 
 
 namespace {
@@ -12,7 +13,8 @@ namespace {
   TfLiteTensor* input = nullptr;
   TfLiteTensor* output = nullptr;
 
-  constexpr int kTensorArenaSize = 41 * 1024; //  10 KB
+  // Generated by python/arena_planner.py for models/model.tflite
+  constexpr int kTensorArenaSize = TENSOR_ARENA_SIZE;
   __attribute__((aligned(16))) uint8_t tensor_arena[kTensorArenaSize];
 }  // namespace
 
@@ -52,4 +54,8 @@ extern "C" void tflm_invoke() {
     if (interpreter) {
         interpreter->Invoke();
     }
-}
\ No newline at end of file
+}
+
+extern "C" size_t tflm_arena_used_bytes() {
+    return interpreter ? interpreter->arena_used_bytes() : 0;
+}
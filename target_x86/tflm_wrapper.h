@@ -1,6 +1,7 @@
 #ifndef TFLM_WRAPPER_H
 #define TFLM_WRAPPER_H
 
+#include <stddef.h>
 #include <stdint.h>
 
 #ifdef __cplusplus
@@ -19,6 +20,9 @@ const float* tflm_get_output_buffer(int index);
 // Invoke the model.
 void tflm_invoke(void);
 
+// Arena bytes actually used after tflm_init(), for checking TENSOR_ARENA_SIZE.
+size_t tflm_arena_used_bytes(void);
+
 #ifdef __cplusplus
 }
 #endif